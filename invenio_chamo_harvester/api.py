@@ -11,6 +11,8 @@
 from __future__ import absolute_import, print_function
 
 import base64
+import hashlib
+import json
 from contextlib import contextmanager
 from copy import deepcopy
 
@@ -25,6 +27,13 @@ from kombu.compat import Consumer
 from lxml import etree
 
 from .dojson.contrib.marc21 import marc21
+from .dojson.contrib.marc21.model import CONTRIBUTION_TAGS
+from .dojson.utils import ConversionWarnings
+from .identifiers import normalize_identifiers
+from .mef import resolve_person_links
+from .models import ChamoRecordDigest
+from .proxies import current_chamo_harvester
+from .writers import WriterPool
 
 XMLParser = etree.XMLParser(remove_blank_text=True, recover=True,
                             resolve_entities=False)
@@ -38,7 +47,8 @@ class ChamoHarvesterProducer(KombuProducer):
 
     def publish(self, data, **kwargs):
         """Validate operation type."""
-        assert data.get('op') in {'harvest', 'create', 'delete', 'update'}
+        assert data.get('op') in {'harvest', 'create', 'delete', 'update',
+                                  'enrich'}
         return super(ChamoHarvesterProducer, self).publish(data, **kwargs)
 
 
@@ -99,10 +109,34 @@ class ChamoRecordHarvester(object):
                       'harvest',
                       current_app.config['CHAMO_HARVESTER_CHAMO_BASE_URL'])
 
+    def bulk_to_delete(self, record_id_iterator):
+        """Bulk delete records.
+
+        :param record_id_iterator: Iterator yielding Chamo bib ids.
+        """
+        self._bulk_op(record_id_iterator,
+                      'delete',
+                      current_app.config['CHAMO_HARVESTER_CHAMO_BASE_URL'])
+
+    def delete_by_id(self, record_id):
+        """Delete a record.
+
+        :param record_id: Chamo bib id of the record.
+        """
+        self.bulk_to_delete([record_id])
+
     def process_bulk_queue(self, bulk_kwargs=None):
         """Process bulk harvesting queue."""
         from .tasks import bulk_records
         count = 0
+        bulk_kwargs = bulk_kwargs or {}
+        if bulk_kwargs.get('profile'):
+            marc21.enable_profiling()
+        marc21.warnings = ConversionWarnings(
+            path=current_app.config['CHAMO_HARVESTER_WARNINGS_PATH'],
+            buffer_size=current_app.config[
+                'CHAMO_HARVESTER_WARNINGS_BUFFER_SIZE']
+        )
         with current_celery_app.pool.acquire(block=True) as conn:
             try:
                 consumer = Consumer(
@@ -112,16 +146,33 @@ class ChamoRecordHarvester(object):
                     routing_key=self.mq_routing_key,
                 )
 
-                count = bulk_records(
-                    self._actionsiter(consumer.iterqueue()),
-                    bulk_kwargs
+                actions = self._actionsiter(
+                    consumer.iterqueue(),
+                    skip_unchanged=not (bulk_kwargs.get('initial_load') or
+                                        bulk_kwargs.get('force'))
                 )
+                writers = bulk_kwargs.pop('writers', None) or \
+                    current_app.config['CHAMO_HARVESTER_WRITERS']
+                if writers > 1:
+                    count = WriterPool(
+                        current_app._get_current_object(),
+                        writers,
+                        bulk_kwargs,
+                        maxsize=current_app.config[
+                            'CHAMO_HARVESTER_WRITERS_QUEUE_SIZE']
+                    ).write(actions)
+                else:
+                    count = bulk_records(actions, bulk_kwargs)
                 consumer.close()
             except Exception as e:
                 click.secho(
                     'Harvester Bulk queue Error: {e}'.format(e=e),
                     fg='red'
                 )
+        marc21.warnings.flush()
+        if marc21.warnings.counts:
+            current_app.logger.info('conversion warnings:\n{summary}'.format(
+                summary=marc21.warnings.summary()))
         return count
 
     @contextmanager
@@ -144,49 +195,168 @@ class ChamoRecordHarvester(object):
         """
         with self.create_producer() as producer:
             for rec in record_id_iterator:
+                rec = str(rec).strip()
                 producer.publish(dict(
-                    id=str(rec),
+                    id=rec,
                     uri='{base_url}/invenio/bib/{id}'.format(base_url=url,
-                                                             id=str(rec)),
+                                                             id=rec),
                     op=op_type
                 ))
 
-    def _actionsiter(self, message_iterator):
+    def _actionsiter(self, message_iterator, skip_unchanged=False):
         """Iterate bulk actions.
 
+        Messages are read by batches: the records of a batch are fetched
+        first so that their MEF links can be resolved together before the
+        conversion.
+
         :param message_iterator: Iterator yielding messages from a queue.
+        :param skip_unchanged: do not convert the records whose digest did
+            not change since the last harvest.
         """
+        size = current_app.config['CHAMO_HARVESTER_CONVERSION_BATCH_SIZE']
+        messages = []
         for message in message_iterator:
+            messages.append(message)
+            if len(messages) >= size:
+                for action in self._batch_actionsiter(messages,
+                                                      skip_unchanged):
+                    yield action
+                messages = []
+        for action in self._batch_actionsiter(messages, skip_unchanged):
+            yield action
+
+    def _batch_actionsiter(self, messages, skip_unchanged=False):
+        """Iterate bulk actions of a batch of messages.
+
+        Each message is acknowledged once its action is taken, or rejected
+        if the writer, processing it in the same thread, marks the action
+        as ``rejected``.
+
+        :param messages: list of messages from a queue.
+        :param skip_unchanged: do not convert the records whose digest did
+            not change since the last harvest.
+        """
+        batch = []
+        actions = []
+        for message in messages:
             payload = message.decode()
+            if payload.get('op') == 'delete':
+                actions.append((message, self._delete_action(payload)))
+                continue
             try:
-                yield self._harvest_action(payload)
-                message.ack()
+                record = ChamoBibRecord.get_record_by_uri(payload['uri'])
+                batch.append((message, payload, record))
             except Exception:
                 message.reject()
                 current_app.logger.error(
                     "Failed to harvest record {0}".format(payload.get('id')),
                     exc_info=True)
+        digests = {}
+        if skip_unchanged:
+            digests = ChamoRecordDigest.get_digests(
+                [payload['id'] for _, payload, _ in batch])
+        if not current_app.config['CHAMO_HARVESTER_MEF_DEFERRED']:
+            self._resolve_person_links([
+                record for _, payload, record in batch
+                if record is not None and not record.isMasked and
+                digests.get(str(payload['id'])) != record.digest
+            ])
+        for message, payload, record in batch:
+            try:
+                actions.append((message, self._harvest_action(
+                    payload, record, digests.get(str(payload['id'])))))
+            except Exception:
+                message.reject()
+                current_app.logger.error(
+                    "Failed to harvest record {0}".format(payload.get('id')),
+                    exc_info=True)
+        marc21.warnings.flush()
+        for message, action in actions:
+            yield action
+            if action.get('rejected'):
+                # rolled back by the writer, not harvested
+                message.reject()
+            else:
+                message.ack()
+
+    @staticmethod
+    def _resolve_person_links(records):
+        """Resolve the MEF links of all contributions of some records.
 
-    def _harvest_action(self, payload):
+        The links are stored in the MEF link cache used by the conversion.
+
+        :param records: list of :class:`ChamoBibRecord`.
+        """
+        viaf_pids = set()
+        for record in records:
+            try:
+                viaf_pids.update(record.viaf_pids)
+            except Exception:
+                current_app.logger.warning(
+                    'Failed to read VIAF pids of record {id}'.format(
+                        id=record.data.get('_id')), exc_info=True)
+        try:
+            resolve_person_links(
+                viaf_pids,
+                current_chamo_harvester.mef_cache,
+                current_app.config['CHAMO_HARVESTER_MEF_BATCH_SIZE']
+            )
+        except Exception:
+            # conversion falls back to one MEF request per contribution
+            current_app.logger.warning('MEF batch resolution failed',
+                                       exc_info=True)
+
+    def _harvest_action(self, payload, record=None, digest=None):
         """Bulk index action.
 
         :param payload: Decoded message body.
+        :param record: The already fetched :class:`ChamoBibRecord`.
+        :param digest: Digest of the last harvested version of the record,
+            an unchanged record gives a 'skip' action without conversion.
         :returns: Dictionary defining an Elasticsearch bulk 'index' action.
         """
-        
-        record = ChamoBibRecord.get_record_by_uri(payload['uri'])
-        data = self._prepare_record(record)     
-        
+        if record is None:
+            record = ChamoBibRecord.get_record_by_uri(payload['uri'])
+        if record.isMasked:
+            return self._delete_action(payload)
+        if digest is not None and digest == record.digest:
+            return {
+                '_op_type': 'skip',
+                '_id': str(payload['id'])
+            }
+        data = self._prepare_record(record)
+
         action = {
             '_op_type': 'harvest',
             '_id': str(payload['id']),
+            'digest': record.digest,
+            'size': record.size,
             'frbr': record.isFrbr,
             'document': data.get('document'),
             'items': data.get('items'),
-            'holdings': data.get('holdings')
+            'holdings': data.get('holdings'),
+            'links': data.get('links')
         }
         return action
 
+    @staticmethod
+    def _delete_action(payload):
+        """Bulk delete action.
+
+        The pid of the document is the Chamo bib id, like the ``001`` of
+        the MARC record without its ``vtls`` prefix.
+
+        :param payload: Decoded message body.
+        :returns: Dictionary defining a 'delete' action.
+        """
+        bib_id = str(payload['id']).strip()
+        return {
+            '_op_type': 'delete',
+            '_id': bib_id,
+            'pid': bib_id.lstrip('0')
+        }
+
     @staticmethod
     def _prepare_record(record):
         """Prepare record data for indexing.
@@ -194,17 +364,96 @@ class ChamoRecordHarvester(object):
         :param record: The record to prepare.
         :returns: The record metadata.
         """
-        rec = create_record(record.xml)
-        rec = marc21.do(rec)
+        rec = record.document
 
         data = {
             'document': rec,
             'items': record.items,
-            'holdings': record.holdings
+            'holdings': record.holdings,
+            'links': marc21.pending_links
         }
         return data
 
 
+class ContributionLinkEnricher(ChamoRecordHarvester):
+    """Add the deferred MEF links to the contributions of documents.
+
+    When ``CHAMO_HARVESTER_MEF_DEFERRED`` is set, documents are stored with
+    the local data of their contributions and the MEF links to resolve are
+    published in a dedicated queue. This class consumes that queue by
+    batches and patches the documents.
+    """
+
+    @property
+    def mq_queue(self):
+        """Message Queue queue.
+
+        :returns: The Message Queue queue.
+        """
+        return self._queue or current_app.config[
+            'CHAMO_HARVESTER_ENRICH_MQ_QUEUE']
+
+    @property
+    def mq_routing_key(self):
+        """Message Queue routing key.
+
+        :returns: The Message Queue routing key.
+        """
+        return (self._routing_key or
+                current_app.config['CHAMO_HARVESTER_ENRICH_MQ_ROUTING_KEY'])
+
+    def bulk_to_enrich(self, documents_links, retries=0):
+        """Queue documents contributions to enrich.
+
+        :param documents_links: Iterator yielding ``(pid, links)`` tuples
+            where ``links`` is the ``pending_links`` list of the conversion.
+        :param retries: number of previous attempts to resolve the links.
+        """
+        with self.create_producer() as producer:
+            for pid, links in documents_links:
+                producer.publish(dict(
+                    id=str(pid),
+                    links=links,
+                    op='enrich',
+                    retries=retries
+                ))
+
+    def process_bulk_queue(self, bulk_kwargs=None):
+        """Process the enrichment queue.
+
+        :returns: number of enriched documents.
+        """
+        from .tasks import bulk_enrich_documents
+        count = 0
+        with current_celery_app.pool.acquire(block=True) as conn:
+            try:
+                consumer = Consumer(
+                    connection=conn,
+                    queue=self.mq_queue.name,
+                    exchange=self.mq_exchange.name,
+                    routing_key=self.mq_routing_key,
+                )
+                # one pass over the queued messages: the documents
+                # published again are enriched by the next run
+                _, limit, _ = self.mq_queue(conn.default_channel) \
+                    .queue_declare(passive=True)
+                size = current_app.config['CHAMO_HARVESTER_BULK_SIZE']
+                messages = []
+                for message in consumer.iterqueue(limit=limit):
+                    messages.append(message)
+                    if len(messages) >= size:
+                        count += bulk_enrich_documents(messages)
+                        messages = []
+                count += bulk_enrich_documents(messages)
+                consumer.close()
+            except Exception as e:
+                click.secho(
+                    'Enrichment Bulk queue Error: {e}'.format(e=e),
+                    fg='red'
+                )
+        return count
+
+
 class BulkChamoRecordHarvester(ChamoRecordHarvester):
     """Provide an interface to retrieve id from chamo rest API."""
 
@@ -251,11 +500,42 @@ class ChamoBibRecord(object):
         xml = base64.b64decode(self.data.get('marcXmlData', {}).get('raw', {}))
         return etree.XML(xml, parser=XMLParser)
 
+    @property
+    def size(self):
+        """Size of the fetched MARC data, in bytes."""
+        return len(self.data.get('marcXmlData', {}).get('raw') or '')
+
+    @property
+    def digest(self):
+        """Digest of the MARC data, items and holdings of the record."""
+        content = json.dumps([
+            self.data.get('marcXmlData', {}).get('raw'),
+            self.items,
+            self.holdings
+        ], sort_keys=True)
+        return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+    @property
+    def viaf_pids(self):
+        """VIAF pids ($0) of the contribution fields."""
+        pids = set()
+        for field in self.xml.iter('{*}datafield'):
+            if field.get('tag') not in CONTRIBUTION_TAGS or \
+                    field.get('ind2') == '2':
+                continue
+            for subfield in field.iter('{*}subfield'):
+                if subfield.get('code') == '0' and subfield.text:
+                    pids.add(subfield.text.strip())
+        return pids
+
     @property
     def document(self):
         """Do json converted bibliographic record."""
         rec = create_record(self.xml)
-        return marc21.do(rec)
+        rec = marc21.do(rec)
+        if current_app.config['CHAMO_HARVESTER_NORMALIZE_IDENTIFIERS']:
+            normalize_identifiers([rec])
+        return rec
 
     @property
     def items(self):
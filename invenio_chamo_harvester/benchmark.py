@@ -0,0 +1,350 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2019 UCLouvain.
+#
+# Invenio-Chamo-Harvester is free software; you can redistribute it and/or
+# modify it under the terms of the MIT License; see LICENSE file for more
+# details.
+
+"""Offline benchmark of the Chamo record conversion.
+
+A corpus is a JSON file holding recorded Chamo bib payloads and the MEF
+links of their contributions::
+
+    {
+        "mef": {"<viaf_pid>": "<mef link or null>"},
+        "records": [<Chamo REST bib payload>, ...]
+    }
+
+The conversion is run with a MEF link cache seeded from the corpus, so no
+network access is needed. Latencies are also given as ratios to the decoding
+of the same records (base64, MARC XML parsing and ``create_record``), which
+makes thresholds on these ratios independent of the machine speed.
+
+A baseline run can be saved and later runs compared to it: each ratio and
+memory statistic may exceed its baseline value by a relative tolerance::
+
+    {
+        "tolerance": 0.25,
+        "stats": {"p50_ratio": 20.5, "rss_increase_mb": 3.2, ...}
+    }
+"""
+
+from __future__ import absolute_import, print_function
+
+import json
+import math
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+from dojson.contrib.marc21.utils import create_record
+from flask import current_app
+
+from .api import ChamoBibRecord, ChamoRecordHarvester
+from .mef import MefLinkCache, resolve_person_links
+from .proxies import current_chamo_harvester
+
+try:
+    import resource
+except ImportError:  # pragma: no cover
+    resource = None
+
+BASELINE_STATS = ('p50_ratio', 'p90_ratio', 'p99_ratio', 'peak_alloc_mb',
+                  'rss_increase_mb')
+"""Statistics compared with a baseline run, independent of the machine."""
+
+DEFAULT_TOLERANCE = 0.25
+"""Relative increase over a baseline run allowed by default."""
+
+
+def load_corpus(path):
+    """Load a benchmark corpus.
+
+    :param path: path of the corpus JSON file.
+    :returns: the corpus dictionary.
+    """
+    with open(path) as corpus_file:
+        return json.load(corpus_file)
+
+
+def record_corpus(bib_ids):
+    """Record a benchmark corpus from the Chamo REST API and MEF.
+
+    :param bib_ids: iterable of Chamo bib identifiers, for example the
+        content of ``data/serials.pid``.
+    :returns: the corpus dictionary.
+    """
+    records = []
+    for bib_id in bib_ids:
+        bib_id = str(bib_id).strip()
+        if not bib_id:
+            continue
+        record = ChamoBibRecord.get_record_by_id(bib_id)
+        if record is not None:
+            records.append(record.data)
+    cache = MefLinkCache()
+    viaf_pids = set()
+    for data in records:
+        viaf_pids.update(ChamoBibRecord(data).viaf_pids)
+    resolve_person_links(
+        viaf_pids, cache, current_app.config['CHAMO_HARVESTER_MEF_BATCH_SIZE'])
+    return {
+        'mef': {viaf_pid: cache.get(viaf_pid) for viaf_pid in viaf_pids},
+        'records': records
+    }
+
+
+@contextmanager
+def offline_mef(links):
+    """Replace the MEF link cache by one seeded with recorded links.
+
+    :param links: dictionary of MEF links by VIAF pid.
+    """
+    ext = current_chamo_harvester._get_current_object()
+    previous = ext.__dict__.get('mef_cache')
+    cache = MefLinkCache(size=len(links) + 1)
+    cache.set_many(links)
+    ext.mef_cache = cache
+    try:
+        yield cache
+    finally:
+        if previous is None:
+            del ext.__dict__['mef_cache']
+        else:
+            ext.mef_cache = previous
+
+
+def percentile(values, percent):
+    """Nearest-rank percentile of a list of values."""
+    if not values:
+        return 0.0
+    values = sorted(values)
+    rank = int(math.ceil(percent / 100.0 * len(values))) - 1
+    return values[min(max(rank, 0), len(values) - 1)]
+
+
+def peak_rss():
+    """Peak resident set size of the current process in megabytes."""
+    if resource is None:  # pragma: no cover
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def measure_rss(func, *args):
+    """Peak resident set size of a call, made in a forked process.
+
+    On Linux, the peak resident set size of a forked process starts at its
+    current size, so the increase during the call can be measured whatever
+    the memory used before by the parent process.
+
+    :param func: function to call with ``args`` in the child process.
+    :returns: the peak and its increase during the call in megabytes, or
+        ``(None, None)`` if they can not be measured.
+    """
+    if resource is None or not hasattr(os, 'fork') or \
+            not sys.platform.startswith('linux'):
+        return None, None
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        status = 1
+        try:
+            start = peak_rss()
+            func(*args)
+            end = peak_rss()
+            os.write(write_fd, json.dumps([end, end - start]).encode())
+            status = 0
+        finally:
+            os._exit(status)
+    os.close(write_fd)
+    with os.fdopen(read_fd, 'rb') as pipe:
+        output = pipe.read()
+    _, status = os.waitpid(pid, 0)
+    if status or not output:
+        return None, None
+    return tuple(json.loads(output.decode()))
+
+
+def peak_allocated(func, *args):
+    """Peak of the memory allocated while calling a function.
+
+    Only the allocations made during the call are counted, whatever the
+    memory already used by the process.
+
+    :param func: function to call with ``args``.
+    :returns: the peak in megabytes.
+    """
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    try:
+        baseline = tracemalloc.get_traced_memory()[0]
+        if hasattr(tracemalloc, 'reset_peak'):  # Python >= 3.9
+            tracemalloc.reset_peak()
+        func(*args)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        if not tracing:
+            tracemalloc.stop()
+    return max(peak - baseline, 0) / (1024.0 * 1024.0)
+
+
+def _convert(records):
+    """Convert records, returning the number of errors."""
+    errors = 0
+    for data in records:
+        try:
+            ChamoRecordHarvester._prepare_record(ChamoBibRecord(data))
+        except Exception:
+            errors += 1
+    return errors
+
+
+def _decode(records):
+    """Decode records up to the input of the MARC21 conversion."""
+    for data in records:
+        try:
+            create_record(ChamoBibRecord(data).xml)
+        except Exception:
+            pass
+
+
+def _latencies(func, records, repeat):
+    """Latency of each call of ``func`` with a single record."""
+    latencies = []
+    for _ in range(repeat):
+        for data in records:
+            start = time.perf_counter()
+            func([data])
+            latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def run_benchmark(corpus, repeat=1):
+    """Convert the records of a corpus and measure the conversion.
+
+    Each record goes through the full decode and convert path of
+    :meth:`ChamoRecordHarvester._prepare_record`. The memory is measured
+    on separate conversions of the corpus, so that tracing allocations
+    does not slow down the timed conversions: the peak allocated by
+    Python, and the peak resident set size of a forked process.
+
+    :param corpus: corpus dictionary, see :func:`load_corpus`.
+    :param repeat: number of conversions of the whole corpus.
+    :returns: dictionary of statistics.
+    """
+    records = corpus['records']
+    links = {}
+    for data in records:
+        links.update(dict.fromkeys(ChamoBibRecord(data).viaf_pids))
+    links.update(corpus.get('mef', {}))
+    with offline_mef(links):
+        errors = _convert(records) * repeat
+        decoded = _latencies(_decode, records, repeat)
+        start = time.perf_counter()
+        latencies = _latencies(_convert, records, repeat)
+        duration = time.perf_counter() - start
+        peak_alloc_mb = peak_allocated(_convert, records)
+        peak_rss_mb, rss_increase_mb = measure_rss(_convert, records)
+    stats = {
+        'records': len(latencies),
+        'errors': errors,
+        'duration': duration,
+        'records_per_sec': len(latencies) / duration if duration else 0.0,
+        'peak_alloc_mb': peak_alloc_mb,
+        'peak_rss_mb': peak_rss_mb,
+        'rss_increase_mb': rss_increase_mb
+    }
+    for rank in (50, 90, 99):
+        latency = percentile(latencies, rank)
+        reference = percentile(decoded, rank)
+        stats['p{0}_ms'.format(rank)] = 1000 * latency
+        stats['p{0}_ratio'.format(rank)] = \
+            latency / reference if reference else 0.0
+    return stats
+
+
+def check_regressions(stats, thresholds):
+    """Compare benchmark statistics with thresholds.
+
+    :param stats: statistics returned by :func:`run_benchmark`.
+    :param thresholds: dictionary of bounds named ``min_<stat>`` or
+        ``max_<stat>``, for example ``max_errors``. Compare the latencies
+        and the memory to a baseline run instead, see
+        :func:`compare_to_baseline`.
+    :returns: list of regression messages, empty if none.
+    """
+    regressions = []
+    for name, value in sorted(thresholds.items()):
+        bound, key = name.split('_', 1)
+        measured = stats.get(key)
+        if measured is None:
+            continue
+        if bound == 'min' and measured < value or \
+                bound == 'max' and measured > value:
+            regressions.append(
+                '{key}: {measured:.2f} ({bound} {value})'.format(
+                    key=key, measured=measured, bound=bound, value=value))
+    return regressions
+
+
+def save_baseline(stats, baseline_file, tolerance=None):
+    """Save the statistics of a baseline run.
+
+    :param stats: statistics returned by :func:`run_benchmark`.
+    :param baseline_file: file object to write the baseline to.
+    :param tolerance: relative increase allowed by later runs, by default
+        :data:`DEFAULT_TOLERANCE`.
+    """
+    json.dump({
+        'tolerance': DEFAULT_TOLERANCE if tolerance is None else tolerance,
+        'stats': {key: stats[key] for key in BASELINE_STATS
+                  if stats.get(key) is not None}
+    }, baseline_file, indent=2, sort_keys=True)
+
+
+def compare_to_baseline(stats, baseline, tolerance=None):
+    """Compare benchmark statistics with a baseline run.
+
+    Only the statistics which do not depend on the machine speed are
+    compared, see :data:`BASELINE_STATS`; higher values are worse.
+
+    :param stats: statistics returned by :func:`run_benchmark`.
+    :param baseline: baseline dictionary, see :func:`save_baseline`.
+    :param tolerance: relative increase allowed, by default the one of the
+        baseline.
+    :returns: list of regression messages, empty if none.
+    """
+    if tolerance is None:
+        tolerance = baseline.get('tolerance', DEFAULT_TOLERANCE)
+    regressions = []
+    for key in BASELINE_STATS:
+        reference = baseline['stats'].get(key)
+        measured = stats.get(key)
+        if reference is None or measured is None:
+            continue
+        if measured > reference * (1 + tolerance):
+            regressions.append(
+                '{key}: {measured:.2f} (baseline {reference:.2f} '
+                '+{percent:.0f}%)'.format(
+                    key=key, measured=measured, reference=reference,
+                    percent=100 * tolerance))
+    return regressions
+
+
+def format_stats(stats):
+    """Format benchmark statistics for display."""
+    rss = 'peak RSS {0:.1f}MB (+{1:.1f}MB)'.format(
+        stats['peak_rss_mb'], stats['rss_increase_mb']) \
+        if stats.get('peak_rss_mb') is not None else 'peak RSS unknown'
+    return (
+        '{records} records ({errors} errors) in {duration:.3f}s: '
+        '{records_per_sec:.1f} records/s, latency p50 {p50_ms:.2f}ms '
+        'p90 {p90_ms:.2f}ms p99 {p99_ms:.2f}ms (x{p50_ratio:.1f}, '
+        'x{p90_ratio:.1f}, x{p99_ratio:.1f} the decoding), '
+        'peak allocated {peak_alloc_mb:.1f}MB, {rss}'
+    ).format(rss=rss, **stats)
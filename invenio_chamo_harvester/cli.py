@@ -19,12 +19,21 @@ from celery.messaging import establish_connection
 from flask import current_app
 from flask.cli import with_appcontext
 from invenio_circulation.api import get_loan_for_item
-from invenio_chamo_harvester.api import ChamoRecordHarvester, ChamoBibRecord
+from invenio_chamo_harvester.api import ChamoRecordHarvester, \
+    ChamoBibRecord, ContributionLinkEnricher
+from invenio_chamo_harvester.benchmark import check_regressions, \
+    compare_to_baseline, format_stats, load_corpus, record_corpus, \
+    run_benchmark, save_baseline
+from invenio_chamo_harvester.dojson.contrib.marc21 import marc21
+from invenio_chamo_harvester.export import FORMATS, iter_records, \
+    open_export, write_records
+from invenio_chamo_harvester.schemas import DOCUMENT_SCHEMA, schema_url
 from invenio_chamo_harvester.tasks import (process_bulk_queue,
+                                           process_enrich_queue,
+                                           queue_records_to_delete,
                                            queue_records_to_harvest,
                                            bulk_record)
 from invenio_chamo_harvester.utils import get_max_record_pid
-from invenio_jsonschemas import current_jsonschemas
 from invenio_pidstore.models import PersistentIdentifier, PIDStatus,\
     RecordIdentifier
 from invenio_records.api import Record
@@ -62,9 +71,16 @@ def export():
               help='PID type of records to export.')
 @click.option('-d', '--directory', 'directory', default='export_data/',
               help='Directory destination.')
+@click.option('-f', '--format', 'fmt', type=click.Choice(FORMATS),
+              default='json',
+              help='JSON array or one JSON record per line (ndjson).')
+@click.option('-z', '--gzip', 'compress', is_flag=True, default=False,
+              help='Compress the export file.')
+@click.option('-c', '--chunk-size', type=int, default=1000,
+              help='Number of records loaded at once.')
 @click.option('-v', '--verbose', is_flag=True, default=False)
 @with_appcontext
-def records_export(pid_type, directory,  verbose):
+def records_export(pid_type, directory, fmt, compress, chunk_size, verbose):
     """Export records."""
     record_class = get_record_class_from_schema_or_pid_type(pid_type=pid_type)
     if not record_class:
@@ -74,34 +90,25 @@ def records_export(pid_type, directory,  verbose):
     if not os.path.exists(directory):
         os.makedirs(directory)
 
-    records = []
-    # get records from DB
-    for recid in record_class.get_all_pids():
-        if verbose:
-            click.secho('process recid: {recid}'.format(
-                recid=recid
-            ), fg='green')
-        try:
-            records.append(record_class.get_record_by_pid(recid).dumps())
-        except Exception as e:
-            if verbose:
-                current_app.logger.error(
-                    'Error exporting record [{id}] : {e}'.format(
-                        id=str(recid).strip(),
-                        e=str(e)
-                    ), exc_info=True
-                )
-            pass
-
     # prepare export file
-    filename = os.path.join(directory, '{name}.json'.format(
-        name=record_class.provider.pid_type))
+    filename = os.path.join(directory, '{name}.{ext}{gz}'.format(
+        name=record_class.provider.pid_type, ext=fmt,
+        gz='.gz' if compress else ''))
+
+    def records():
+        """Records streamed from the DB."""
+        for data in iter_records(record_class, pid_type, chunk_size):
+            if verbose:
+                click.secho('process recid: {recid}'.format(
+                    recid=data.get('pid')
+                ), fg='green')
+            yield data
 
-    with open(filename, 'w') as outfile:
-        json.dump(records, outfile, indent=4)
+    with open_export(filename, compress) as outfile:
+        count = write_records(records(), outfile, fmt)
 
     click.secho('{nb_records} records exported ({pid_type})'.format(
-        nb_records=len(records),
+        nb_records=count,
         pid_type=pid_type
     ), fg='green')
 
@@ -190,6 +197,45 @@ def harvest_chamo(size, next_id, modified_since, verbose, file):
             fg='red'
         )
 
+
+@chamo.command("delete")
+@click.option('-s', '--size', type=int, default=1000)
+@click.option('-v', '--verbose', is_flag=True, default=False)
+@click.option('--yes-i-know', is_flag=True, callback=abort_if_false,
+              expose_value=False,
+              prompt='Do you really want to delete the records removed '
+                     'from Chamo?')
+@click.option('-f', '--file', type=click.File('r'), default=None)
+@click.option('-r', '--max-ratio', type=float, default=None,
+              help='Maximum fraction of the harvested records to delete.')
+@with_appcontext
+def delete_chamo(size, verbose, file, max_ratio):
+    """Queue the records deleted from Chamo."""
+    try:
+        if file:
+            click.secho('Reading records file to deletion queue ...',
+                        fg='green')
+            records = [pid.strip() for pid in file if pid.strip()]
+            ChamoRecordHarvester().bulk_to_delete(records)
+            count = len(records)
+        else:
+            click.secho('Sending deleted records to harvesting queue ...',
+                        fg='green')
+            count = queue_records_to_delete(size=size, verbose=verbose,
+                                            max_ratio=max_ratio)
+        click.secho(
+            'Records queued: {count}'.format(count=count),
+            fg='blue'
+        )
+        click.secho('Execute "run" command to process the queue!',
+                    fg='red')
+    except Exception as e:
+        click.secho(
+            'Deletion Error: {e}'.format(e=e),
+            fg='red'
+        )
+
+
 @chamo.command("run")
 @click.option('--initial', '-i', is_flag=True,
               help='Run harvesting in background.')
@@ -199,15 +245,31 @@ def harvest_chamo(size, next_id, modified_since, verbose, file):
               help='Number of concurrent harvesting tasks to start.')
 @click.option('--bulk-index', '-b', is_flag=True,
               help='Do bulk index.')
+@click.option('--force', '-f', is_flag=True,
+              help='Convert records even if unchanged since last harvest.')
+@click.option('--profile', '-p', is_flag=True,
+              help='Report the time spent in each conversion rule.')
+@click.option('--bulk-load', '-l', is_flag=True,
+              help='Write new records with bulk inserts (with --initial).')
+@click.option('--writers', '-w', default=None, type=int,
+              help='Number of database writers of each harvesting task.')
+@click.option('--bounded-memory', '-m', is_flag=True,
+              help='Keep the memory flat during long harvests.')
 @with_appcontext
-def run(initial, delayed, concurrency, bulk_index):
+def run(initial, delayed, concurrency, bulk_index, force, profile,
+        bulk_load, writers, bounded_memory):
     """Run bulk record harvesting."""
     if delayed:
         celery_kwargs = {
             'kwargs': {
                 'bulk_kwargs': {
                     'initial_load': initial,
-                    'bulk_index': bulk_index
+                    'bulk_index': bulk_index,
+                    'force': force,
+                    'profile': profile,
+                    'bulk_load': bulk_load,
+                    'writers': writers,
+                    'bounded_memory': bounded_memory
                 }
             }
         }
@@ -221,9 +283,91 @@ def run(initial, delayed, concurrency, bulk_index):
         ChamoRecordHarvester().process_bulk_queue(
             bulk_kwargs={
                 'initial_load': initial,
-                'bulk_index': bulk_index
+                'bulk_index': bulk_index,
+                'force': force,
+                'profile': profile,
+                'bulk_load': bulk_load,
+                'writers': writers,
+                'bounded_memory': bounded_memory
             }
         )
+        if profile:
+            click.echo(marc21.disable_profiling().report())
+
+
+@chamo.command("enrich")
+@click.option('--delayed', '-d', is_flag=True,
+              help='Run enrichment in background.')
+@click.option('--concurrency', '-c', default=1, type=int,
+              help='Number of concurrent enrichment tasks to start.')
+@with_appcontext
+def enrich(delayed, concurrency):
+    """Add the deferred MEF links to documents contributions."""
+    if delayed:
+        click.secho(
+            'Starting {0} tasks for enriching documents...'.format(
+                concurrency),
+            fg='green')
+        for c in range(0, concurrency):
+            process_enrich_queue.delay()
+    else:
+        click.secho('Retrieve queued contribution links...', fg='green')
+        count = ContributionLinkEnricher().process_bulk_queue()
+        click.secho('Documents enriched: {count}'.format(count=count),
+                    fg='blue')
+
+
+@chamo.command("corpus")
+@click.argument('infile', type=click.File('r'))
+@click.argument('outfile', type=click.File('w'))
+@with_appcontext
+def corpus(infile, outfile):
+    """Record a conversion benchmark corpus.
+
+    infile: file of Chamo bib ids, for example data/serials.pid.
+    """
+    data = record_corpus(infile)
+    json.dump(data, outfile, indent=2, sort_keys=True)
+    click.secho('{count} records recorded'.format(
+        count=len(data['records'])), fg='green')
+
+
+@chamo.command("benchmark")
+@click.argument('corpus_file', type=click.Path(exists=True))
+@click.option('--repeat', '-r', default=1, type=int,
+              help='Number of conversions of the whole corpus.')
+@click.option('--profile', '-p', is_flag=True,
+              help='Report the time spent in each conversion rule.')
+@click.option('--thresholds', '-t', type=click.File('r'), default=None,
+              help='JSON file of thresholds failing the benchmark.')
+@click.option('--baseline', '-b', type=click.File('r'), default=None,
+              help='Baseline run failing the benchmark if exceeded.')
+@click.option('--save-baseline', '-s', 'baseline_out', type=click.File('w'),
+              default=None, help='Save this run as a baseline.')
+@click.option('--tolerance', type=float, default=None,
+              help='Relative increase allowed over the baseline.')
+@with_appcontext
+def benchmark(corpus_file, repeat, profile, thresholds, baseline,
+              baseline_out, tolerance):
+    """Benchmark the conversion of a recorded corpus."""
+    if profile:
+        marc21.enable_profiling()
+    stats = run_benchmark(load_corpus(corpus_file), repeat=repeat)
+    click.echo(format_stats(stats))
+    if profile:
+        click.echo(marc21.disable_profiling().report())
+    if baseline_out:
+        save_baseline(stats, baseline_out, tolerance)
+    regressions = []
+    if thresholds:
+        regressions += check_regressions(stats, json.load(thresholds))
+    if baseline:
+        regressions += compare_to_baseline(
+            stats, json.load(baseline), tolerance)
+    for regression in regressions:
+        click.secho('Regression {msg}'.format(msg=regression), fg='red')
+    if regressions:
+        raise click.exceptions.Exit(1)
 
 
 @chamo.command("record")
@@ -246,8 +390,7 @@ def record(bibid):
 def document(bibid):
     """Run transform to invenio record."""
     if bibid > 0:
-        record_schema = current_jsonschemas.path_to_url(
-            'documents/document-v0.0.1.json')
+        record_schema = schema_url(DOCUMENT_SCHEMA)
         record = ChamoBibRecord.get_record_by_id(bibid)
         document = record.document
         document['$schema'] = record_schema
@@ -32,6 +32,15 @@ CHAMO_HARVESTER_MQ_QUEUE = Queue(
 CHAMO_HARVESTER_MQ_ROUTING_KEY = 'chamo_harvester'
 """Default routing key for message queue."""
 
+CHAMO_HARVESTER_ENRICH_MQ_QUEUE = Queue(
+    'chamo_harvester_enrich',
+    exchange=CHAMO_HARVESTER_MQ_EXCHANGE,
+    routing_key='chamo_harvester_enrich')
+"""Queue of the contribution MEF links to add to the documents."""
+
+CHAMO_HARVESTER_ENRICH_MQ_ROUTING_KEY = 'chamo_harvester_enrich'
+"""Routing key of the contribution MEF links queue."""
+
 CHAMO_HARVESTER_BULK_REQUEST_TIMEOUT = 10
 """Request timeout to use in Bulk indexing."""
 
@@ -41,3 +50,236 @@ CHAMO_HARVESTER_RECORD_TO_HARVEST = \
 
 CHAMO_HARVESTER_BEFORE_CREATION_HOOKS = []
 """List of automatically connected hooks (function or importable string)."""
+
+CHAMO_HARVESTER_MEF_CACHE_PATH = None
+"""SQLite file of the persistent MEF link cache.
+
+``None`` stores it in the application instance folder, an empty string
+disables the persistent tier.
+"""
+
+CHAMO_HARVESTER_MEF_CACHE_SIZE = 50000
+"""Number of MEF links kept in memory by each worker."""
+
+CHAMO_HARVESTER_MEF_CACHE_TTL = 30 * 24 * 3600
+"""Time to live in seconds of a cached MEF link."""
+
+CHAMO_HARVESTER_MEF_CACHE_MISS_TTL = 24 * 3600
+"""Time to live in seconds of a VIAF pid unknown to MEF."""
+
+CHAMO_HARVESTER_CONVERSION_BATCH_SIZE = 100
+"""Number of records fetched from Chamo before being converted together."""
+
+CHAMO_HARVESTER_MEF_BATCH_SIZE = 50
+"""Maximum number of VIAF pids resolved by a single MEF request."""
+
+CHAMO_HARVESTER_MEF_DEFERRED = False
+"""Store contributions without waiting for MEF.
+
+Contributions with a VIAF pid missing from the MEF link cache keep their
+local data and their links are queued for ``flask chamo enrich``.
+"""
+
+CHAMO_HARVESTER_NORMALIZE_IDENTIFIERS = False
+"""Convert the ISBN and EAN identifiers of the documents to bare EAN-13.
+
+The identifiers are normalized by the conversion of every record, and each
+distinct value is converted once per process. Identifiers marked invalid or
+cancelled are never normalized. The bibs whose content did not change are
+not converted again, so changing this setting only applies to the existing
+documents after a harvest with ``--force``.
+"""
+
+CHAMO_HARVESTER_WARNINGS_PATH = None
+"""File the conversion warnings are appended to.
+
+``None`` sends them to the application log.
+"""
+
+CHAMO_HARVESTER_WARNINGS_BUFFER_SIZE = 1000
+"""Number of conversion warnings kept in memory before being written."""
+
+CHAMO_HARVESTER_ITEM_TYPES = {
+    '1': '1',
+    '2': '2',
+    '3': '2',
+    '4': '4',
+    '5': '5',
+    '6': '6',
+    '101': '2',
+    '102': '8',
+    '103': '9',
+    '104': '2',
+    '105': '2',
+    '106': '2',
+    '110': '13',
+    '250': '17',
+    '251': '18',
+    '252': '19',
+    '253': '20',
+    '254': '21',
+    '255': '22',
+    '256': '22',
+    '257': '22',
+    '258': '22',
+    '259': '22',
+    '260': '27',
+    '261': '28',
+    '262': '29',
+    '300': '30',
+    '301': '15',
+    '303': '31',
+    '304': '32',
+    '305': '33',
+    '306': '34',
+    '308': '35',
+    '309': '36',
+    '310': '37',
+    '777': '14',
+    '999': '16'
+}
+"""RERO ILS item type pid of each Chamo item type code.
+
+Can also be the path of a JSON file holding the same mapping.
+"""
+
+# location 200000 can be removed after production correction
+CHAMO_HARVESTER_LOCATIONS = {
+    '100000': '1',
+    '100001': '2',
+    '100002': '3',
+    '100003': '4',
+    '200000': '5',
+    '200002': '5',
+    '200003': '6',
+    '200004': '7',
+    '200005': '8',
+    '200006': '9',
+    '200007': '10',
+    '200008': '11',
+    '200009': '12',
+    '200010': '13',
+    '300000': '14',
+    '300001': '15',
+    '300002': '16',
+    '300003': '17',
+    '400000': '18',
+    '400001': '19',
+    '400002': '20',
+    '400003': '21',
+    '400004': '22',
+    '400005': '23',
+    '410000': '72',
+    '500000': '24',
+    '500001': '25',
+    '500002': '26',
+    '500003': '27',
+    '500004': '28',
+    '600000': '29',
+    '600009': '30',
+    '600010': '31',
+    '600014': '33',
+    '600019': '36',  # BST-ELIA
+    '600021': '29',  # BST-MATH => UPDATE NEW LOC_PID
+    '700000': '37',
+    '700009': '38',
+    '700010': '39',
+    '800000': '41',
+    '900000': '42',
+    '1020000': '43',
+    '600020': '44',  # BST-INGI
+    '1040000': '45',
+    '1050000': '46',
+    '1050001': '46',
+    '1050002': '47',
+    '1050003': '48',
+    '1050004': '49',
+    '1060000': '50',
+    '1060002': '52',
+    '11000000': '53',
+    '20600000': '54',
+    '20700001': '55',
+    '20700002': '56',
+    '20700003': '57',
+    '20700004': '58',
+    '21000000': '59',
+    '21000001': '59',
+    '21000002': '60',
+    '21000003': '61',
+    '21000004': '62',
+    '21000006': '63',
+    '21000008': '64',
+    '21000009': '65',
+    '30100000': '66',
+    '30100001': '67',
+    '30100002': '68',
+    '30200000': '69',
+    '30300000': '70',
+    '30400000': '71',
+    '200011': '73'
+}
+"""RERO ILS location pid of each Chamo location code.
+
+Can also be the path of a JSON file holding the same mapping.
+"""
+
+CHAMO_HARVESTER_INDEXING_QUEUE_SIZE = 2
+"""Number of committed batches waiting for the background indexing.
+
+With ``--bulk-index``, the harvest blocks when more batches are waiting.
+"""
+
+CHAMO_HARVESTER_INDEX_FROM_MEMORY = False
+"""Index the harvested records from the data just written.
+
+Records are not read again from the database: references to records of
+the same batch are resolved from the batch, the other ones are cached.
+"""
+
+CHAMO_HARVESTER_FLUSH_BYTES = 64 * 1024 * 1024
+"""Size of the fetched MARC data committed at once, 0 to disable.
+
+Records are also committed every ``CHAMO_HARVESTER_BULK_SIZE`` processed
+records and every ``CHAMO_HARVESTER_FLUSH_INTERVAL`` seconds.
+"""
+
+CHAMO_HARVESTER_FLUSH_INTERVAL = 60
+"""Maximum number of seconds between two commits, 0 to disable."""
+
+CHAMO_HARVESTER_WRITERS = 1
+"""Number of threads writing the harvested records to the database.
+
+Records are fetched and converted by the harvesting task, then
+partitioned across the writers by Chamo record id. Each writer has its own
+database session and commits its own batches. Several writers with
+``--bulk-load`` require PostgreSQL, where pids are taken from sequences.
+"""
+
+CHAMO_HARVESTER_WRITERS_QUEUE_SIZE = 1000
+"""Number of converted records waiting for each writer."""
+
+CHAMO_HARVESTER_DEFERRED_VALIDATION = False
+"""Validate the converted documents of each conversion batch at once.
+
+Invalid documents are rejected before any write, the valid ones are
+created without being validated again. Documents are always validated with
+validators compiled once per process.
+"""
+
+CHAMO_HARVESTER_BOUNDED_MEMORY = False
+"""Keep the memory of long harvests flat.
+
+Records are committed between two conversion batches only, then removed
+from the database session, and a single committed batch waits for the
+background indexing.
+"""
+
+CHAMO_HARVESTER_DELETE_MAX_RATIO = 0.05
+"""Maximum fraction of the harvested records queued for deletion at once.
+
+``chamo delete`` refuses to queue more deletions, which usually come from
+an incomplete listing of the Chamo Rest API.
+"""
+
+CHAMO_HARVESTER_ENRICH_MAX_RETRIES = 5
+"""Number of enrichment runs that retry the unresolved MEF links."""
@@ -38,8 +38,11 @@ from isbnlib import EAN13, clean, to_isbn13
 from flask import current_app
 
 from invenio_chamo_harvester.dojson.utils import CustomReroIlsMarc21Overdo
+from invenio_chamo_harvester.mef import MEF_LINK_HOST, MEF_SEARCH_HOST, \
+    MISSING, mef_link_from_hit
+from invenio_chamo_harvester.proxies import current_chamo_harvester
 from rero_ils.dojson.utils import \
-    TitlePartList, add_note, error_print, \
+    TitlePartList, add_note, \
     extract_subtitle_and_parallel_titles_from_field_245_b, get_field_items, \
     get_field_link_data, make_year, not_repetitive, \
     remove_trailing_punctuation
@@ -71,7 +74,7 @@ _ISSUANCE_SUBTYPE_PER_SERIAL_TYPE = {
     'p': 'periodical'
 }
 
-_CONTRIBUTION_ROLE = [
+_CONTRIBUTION_ROLE = frozenset([
     'aut', 'cmp', 'ctb', 'edt', 'hnr', 'ill', 'pht', 'prf', 'trl', 'abr',
     'act', 'adi', 'adp', 'aft', 'anm', 'ann', 'ape', 'apl', 'aqt', 'arc',
     'arr', 'art', 'ato', 'auc', 'aui', 'aus', 'bkd', 'bnd', 'brd', 'brl',
@@ -87,8 +90,141 @@ _CONTRIBUTION_ROLE = [
     'rcd', 'rce', 'rcp', 'rdd', 'res', 'rpc', 'rsp', 'rsr', 'scl', 'sds',
     'sgd', 'sll', 'sng', 'spk', 'spn', 'srv', 'stl', 'tch', 'tld', 'tlp',
     'trc', 'vac', 'vdg', 'wac', 'wal', 'wat', 'win', 'wpr', 'wst'
+])
+
+CONTRIBUTION_TAGS = frozenset(['100', '700', '710', '711'])
+"""MARC fields converted to contributions with a MEF link."""
+
+_PID_PREFIX_REGEXP = re.compile(r'^vtls[0]+')
+
+_END_WITH_EQUAL_REGEXP = re.compile(r'\s*=\s*$')
+
+_COPYRIGHT_DATE_REGEXP = re.compile(r'^([©℗])+\s*(\d{4}.*)')
+
+_UNKNOWN_DATA_REGEXP = re.compile(r'\[\s?(s|S)\.(d|D|n|N|l|e)\.?\]')
+
+_EDITION_KEY_PER_CODE = {
+    'a': 'editionDesignation',
+    'b': 'responsibility'
+}
+
+_PROVISION_AGENT_TYPE_PER_CODE = {
+    'a': 'bf:Place',
+    'b': 'bf:Agent'
+}
+
+_PROVISION_TYPE_PER_IND2 = {
+    '_': 'bf:Publication',
+    '0': 'bf:Production',
+    '1': 'bf:Publication',
+    '2': 'bf:Distribution',
+    '3': 'bf:Manufacture'
+}
+
+_ISBN_QUALIFIER_REGEXP = re.compile(r'^(.+?)\s*\((.+)\)$')
+
+_ISSN_STATUS_PER_CODE = {
+    'm': 'cancelled',
+    'y': 'invalid'
+}
+
+_ISSN_TYPE_PER_CODE = {
+    'a': 'bf:Issn',
+    'l': 'bf:IssnL',
+    'm': 'bf:IssnL',
+    'y': 'bf:Issn'
+}
+
+_SNL_PERMALINK_REGEXP = re.compile(r'permalink\.snl\.ch', re.IGNORECASE)
+
+_BNF_ARK_REGEXP = re.compile(r'bnf\.fr/ark', re.IGNORECASE)
+
+_IDENTIFIER_QUALIFIER_REGEXP = re.compile(r'^(.+?)\s*\((.*)\)$')
+
+_IDENTIFIER_PER_SUBFIELD_2 = [
+    (re.compile(pattern, re.IGNORECASE), identifier)
+    for pattern, identifier in (
+        ('doi', {'type': 'bf:Doi'}),
+        ('urn', {'type': 'bf:Urn'}),
+        ('nipo', {'type': 'bf:Local', 'source': 'NIPO'}),
+        ('danacode', {'type': 'bf:Local', 'source': 'danacode'}),
+        ('vd18', {'type': 'bf:Local', 'source': 'vd18'}),
+        ('gtin-14', {'type': 'bf:Gtin14Number'})
+    )
 ]
 
+_IDENTIFIER_TYPE_PER_024_IND1 = {
+    '0': {'type': 'bf:Isrc'},
+    '1': {'type': 'bf:Upc'},
+    '2': {
+        'pattern': re.compile(r'^(M|9790|979-0)'),
+        'matching_type': 'bf:Ismn'
+    },
+    '3': {
+        'pattern': re.compile(r'^97'),
+        'matching_type': 'bf:Ean'
+    },
+    '8': {
+        # 33 chars example: 0000-0002-A3B1-0000-0-0000-0000-2
+        'pattern': re.compile(r'^(.{24}|.{26}|(.{4}-){4}.-(.{4}\-){2}.)$'),
+        'matching_type': 'bf:Isan'
+    }
+}
+
+_IDENTIFIER_TYPE_PER_028_IND1 = {
+    '0': 'bf:AudioIssueNumber',
+    '1': 'bf:MatrixNumber',
+    '2': 'bf:MusicPlate',
+    '3': 'bf:MusicPublisherNumber',
+    '4': 'bf:VideoRecordingNumber',
+    '5': 'bf:PublisherNumber',
+    '6': 'bf:MusicDistributorNumber'
+}
+
+_ELECTRONIC_LOCATOR_TYPE = {
+    '0': 'resource',
+    '1': 'versionOfResource',
+    '2': 'relatedResource',
+    '8': 'hiddenUrl'
+}
+
+_ELECTRONIC_LOCATOR_CONTENT = frozenset([
+    'poster',
+    'audio',
+    'postcard',
+    'addition',
+    'debriefing',
+    'exhibitionDocumentation',
+    'erratum',
+    'bookplate',
+    'extract',
+    'educationalSheet',
+    'illustrations',
+    'coverImage',
+    'deliveryInformation',
+    'biographicalInformation',
+    'introductionPreface',
+    'classReading',
+    'teachersKit',
+    'publishersNote',
+    'noteOnContent',
+    'titlePage',
+    'photography',
+    'summarization',
+    'onlineResourceViaRERODOC',
+    'pressReview',
+    'webSite',
+    'tableOfContents',
+    'fullText',
+    'video'
+])
+
+_BE_LNBOR_PREFIX_REGEXP = re.compile(r'^\(BE-LnBOR\)')
+
+_TRAILING_DASH_REGEXP = re.compile(r'\. -$')
+
+_SOURCE_PREFIX_REGEXP = re.compile(r'^\((.+?)\)\s*(.*)$')
+
 marc21 = CustomReroIlsMarc21Overdo()
 
 
@@ -113,11 +249,18 @@ def remove_punctuation(data, with_dot=False):
 
 
 def get_person_link(bibid, id, key, value):
-    """Get MEF person link."""
+    """Get MEF person link.
+
+    Links and misses are kept in the MEF link cache so that an author is
+    requested only once.
+    """
     # https://mef.test.rero.ch/api/mef/?q=viaf_pid:67752559
-    prod_host = 'mef.rero.ch'
-    test_host = 'mef.test.rero.ch'
+    prod_host = MEF_LINK_HOST
+    test_host = MEF_SEARCH_HOST
     mef_url = 'https://{host}/api/'.format(host=test_host)
+    mef_link = current_chamo_harvester.mef_cache.get(id)
+    if mef_link is not MISSING:
+        return mef_link
     mef_link = None
     try:
         url = "{mef}/?q=viaf_pid:{viaf_pid}&size=1".format(
@@ -126,35 +269,19 @@ def get_person_link(bibid, id, key, value):
         )
         request = requests.get(url=url)
         if request.status_code == requests.codes.ok:
-            pid = None
             data = request.json()
             hits = data.get('hits', {}).get('hits')
             if hits:
-                idref = hits[0].get('metadata', {}).get('idref')
-                gnd = hits[0].get('metadata', {}).get('gnd')
-                rero = hits[0].get('metadata', {}).get('rero')
-                if idref:
-                    pid_type = 'idref'
-                    pid = idref['pid']
-                elif gnd:
-                    pid_type = 'gnd'
-                    pid = gnd['pid']
-                elif rero:
-                    pid_type = 'rero'
-                    pid = rero['pid']
-            if pid:
-                mef_link = "{url}{pid_type}/{pid}".format(
-                    url=mef_url,
-                    pid_type=pid_type,
-                    pid=pid
-                )
+                mef_link = mef_link_from_hit(hits[0], mef_url)
+            if mef_link:
                 mef_link = mef_link.replace(test_host, prod_host)
+            current_chamo_harvester.mef_cache.set(id, mef_link)
         else:
-            error_print('ERROR MEF REQUEST:', bibid, url,
-                        request.status_code)
+            marc21.warnings.warn('ERROR MEF REQUEST', bibid, url,
+                                 request.status_code)
 
     except Exception as err:
-        error_print('WARNING NOT MEF REF:', bibid, id, key, value)
+        marc21.warnings.warn('WARNING NOT MEF REF', bibid, id, key, value)
     return mef_link
 
 
@@ -230,8 +357,9 @@ def marc21_to_type_and_issuance(self, key, value):
             error = True
             sub_type = 'updatingWebsite'
     if error:
-        error_print('WARNING ISSUANCE:', marc21.bib_id, marc21.rero_id,
-                    main_type, sub_type, marc21.bib_level, marc21.serial_type)
+        marc21.warnings.warn('WARNING ISSUANCE', marc21.bib_id,
+                             marc21.rero_id, main_type, sub_type,
+                             marc21.bib_level, marc21.serial_type)
     self['issuance'] = {'main_type': main_type, 'subtype': sub_type}
 
 
@@ -243,7 +371,7 @@ def marc21_to_pid(self, key, value):
     """
     pid = None
     if(value.startswith('vtls')):
-        pid = re.sub('^vtls[0]+', '', value)
+        pid = _PID_PREFIX_REGEXP.sub('', value)
     return pid
 
 @marc21.over('language', '^008')
@@ -303,10 +431,7 @@ def marc21_to_title(self, key, value):
             subfield_245_a = subfields_245_a[0]
         if subfields_245_b:
             subfield_245_b = subfields_245_b[0]
-    field_245_a_end_with_equal = re.search(r'\s*=\s*$', subfield_245_a)
-    field_245_a_end_with_colon = re.search(r'\s*:\s*$', subfield_245_a)
-    field_245_a_end_with_semicolon = re.search(r'\s*;\s*$', subfield_245_a)
-    field_245_b_contains_equal = re.search(r'=', subfield_245_b)
+    field_245_a_end_with_equal = _END_WITH_EQUAL_REGEXP.search(subfield_245_a)
 
     fields_246 = marc21.get_fields(tag='246')
     subfield_246_a = ''
@@ -400,12 +525,20 @@ def marc21_to_titlesProper(self, key, value):
 @utils.ignore_value
 def marc21_to_contribution(self, key, value):
     """Get contribution."""
-    if not key[4] == '2' and key[:3] in ['100', '700', '710', '711']:
+    if not key[4] == '2' and key[:3] in CONTRIBUTION_TAGS:
         agent = {}
+        deferred_link = None
         if value.get('0'):
-            ref = get_person_link(marc21.bib_id, value.get('0'), key, value)
-            if ref:
-                agent['$ref'] = ref
+            if current_app.config.get('CHAMO_HARVESTER_MEF_DEFERRED') and \
+                    current_chamo_harvester.mef_cache.get(
+                        value.get('0')) is MISSING:
+                # the link will be added later by the enrichment task
+                deferred_link = value.get('0')
+            else:
+                ref = get_person_link(
+                    marc21.bib_id, value.get('0'), key, value)
+                if ref:
+                    agent['$ref'] = ref
         # we do not have a $ref
         if not agent.get('$ref'):
             agent = {'type': 'bf:Person'}
@@ -501,18 +634,19 @@ def marc21_to_contribution(self, key, value):
             roles = []
             for role in utils.force_list(value.get('4')):
                 if len(role) != 3:
-                    error_print('WARNING CONTRIBUTION ROLE LENGTH:',
-                                marc21.bib_id, marc21.rero_id, role)
+                    marc21.warnings.warn('WARNING CONTRIBUTION ROLE LENGTH',
+                                         marc21.bib_id, marc21.rero_id, role)
                     role = role[:3]
                 if role == 'sce':
-                    error_print('WARNING CONTRIBUTION ROLE SCE:',
-                                marc21.bib_id, marc21.rero_id,
-                                'sce --> aus')
+                    marc21.warnings.warn('WARNING CONTRIBUTION ROLE SCE',
+                                         marc21.bib_id, marc21.rero_id,
+                                         'sce --> aus')
                     role = 'aus'
                 role = role.lower()
                 if role not in _CONTRIBUTION_ROLE:
-                    error_print('WARNING CONTRIBUTION ROLE DEFINITION:',
-                                marc21.bib_id, marc21.rero_id, role)
+                    marc21.warnings.warn(
+                        'WARNING CONTRIBUTION ROLE DEFINITION',
+                        marc21.bib_id, marc21.rero_id, role)
                     role = 'ctb'
                 roles.append(role)
         else:
@@ -523,6 +657,11 @@ def marc21_to_contribution(self, key, value):
             else:
                 roles = ['ctb']
         if agent:
+            if deferred_link:
+                marc21.pending_links.append({
+                    'viaf_pid': deferred_link,
+                    'agent': agent
+                })
             return {
                 'agent': agent,
                 'role': list(set(roles))
@@ -537,7 +676,7 @@ def marc21_to_copyright_date(self, key, value):
     copyrights_date = utils.force_list(value.get('c'))
     if copyrights_date:
         for copyright_date in copyrights_date:
-            match = re.search(r'^([©℗])+\s*(\d{4}.*)', copyright_date)
+            match = _COPYRIGHT_DATE_REGEXP.search(copyright_date)
             if match:
                 copyright_date = ' '.join((
                     match.group(1),
@@ -556,11 +695,6 @@ def marc21_to_edition_statement(self, key, value):
     editionDesignation: 250 [$a non repetitive] (without trailing /)
     responsibility: 250 [$b non repetitive]
     """
-    key_per_code = {
-        'a': 'editionDesignation',
-        'b': 'responsibility'
-    }
-
     tag_link, link = get_field_link_data(value)
     items = get_field_items(value)
     index = 1
@@ -569,7 +703,7 @@ def marc21_to_edition_statement(self, key, value):
     for blob_key, blob_value in items:
         if blob_key in subfield_selection:
             subfield_selection.remove(blob_key)
-            edition_data[key_per_code[blob_key]] = \
+            edition_data[_EDITION_KEY_PER_CODE[blob_key]] = \
                 marc21.build_value_with_alternate_graphic(
                     '250', blob_key, blob_value, index, link, ',.', ':;/-=')
         if blob_key != '__order__':
@@ -589,21 +723,12 @@ def marc21_to_provisionActivity(self, key, value):
     def build_statement(field_value, ind2):
 
         def build_agent_data(code, label, index, link):
-            type_per_code = {
-                'a': 'bf:Place',
-                'b': 'bf:Agent'
-            }
-            default_per_code = {
-                'a': '[S.l.]',
-                'b': '[s.n.]'
-            }
             label = remove_trailing_punctuation(label)
-            if not label or re.match(r'\[\s?(s|S)\.(d|D|n|N|l|e)\.?\]', label):
+            if not label or _UNKNOWN_DATA_REGEXP.match(label):
                 return None
-                # label = default_per_code[code]
 
             agent_data = {
-                'type': type_per_code[code],
+                'type': _PROVISION_AGENT_TYPE_PER_CODE[code],
                 'label': [{'value': remove_punctuation(label)}]
             }
             try:
@@ -638,7 +763,7 @@ def marc21_to_provisionActivity(self, key, value):
     def build_place():
         place = {}
         if marc21.country:
-            if re.match(r'\[\s?(s|S)\.(d|D|n|N|l|e)\.?\]', marc21.country):
+            if _UNKNOWN_DATA_REGEXP.match(marc21.country):
                 return place
             place['country'] = marc21.country
         if place:
@@ -647,15 +772,8 @@ def marc21_to_provisionActivity(self, key, value):
 
     # the function marc21_to_provisionActivity start here
     ind2 = key[4]
-    type_per_ind2 = {
-        '_': 'bf:Publication',
-        '0': 'bf:Production',
-        '1': 'bf:Publication',
-        '2': 'bf:Distribution',
-        '3': 'bf:Manufacture'
-    }
     publication = {
-        'type': type_per_ind2[ind2],
+        'type': _PROVISION_TYPE_PER_IND2[ind2],
         'statement': [],
     }
 
@@ -832,7 +950,7 @@ def marc21_to_identifiedBy_from_field_020(self, key, value):
             identifier['qualifier'] = \
                 ', '.join(utils.force_list(value.get('q')))
 
-        match = re.search(r'^(.+?)\s*\((.+)\)$', subfield_data)
+        match = _ISBN_QUALIFIER_REGEXP.search(subfield_data)
         if match:
             # match.group(2) : parentheses content
             identifier['qualifier'] = ', '.join(
@@ -863,19 +981,8 @@ def marc21_to_identifiedBy_from_field_020(self, key, value):
 @utils.ignore_value
 def marc21_to_identifiedBy_from_field_022(self, key, value):
     """Get identifier from field 022."""
-    status_for = {
-        'm': 'cancelled',
-        'y': 'invalid'
-    }
-    type_for = {
-        'a': 'bf:Issn',
-        'l': 'bf:IssnL',
-        'm': 'bf:IssnL',
-        'y': 'bf:Issn'
-    }
-
     identifiedBy = self.get('identifiedBy', [])
-    for subfield_code in ['a', 'l', 'm', 'y']:
+    for subfield_code in ('a', 'l', 'm', 'y'):
         subfields_data = value.get(subfield_code)
         if subfields_data:
             if isinstance(subfields_data, str):
@@ -883,10 +990,10 @@ def marc21_to_identifiedBy_from_field_022(self, key, value):
             for subfield_data in subfields_data:
                 subfield_data = subfield_data.strip()
                 identifier = {}
-                identifier['type'] = type_for[subfield_code]
+                identifier['type'] = _ISSN_TYPE_PER_CODE[subfield_code]
                 identifier['value'] = subfield_data
-                if subfield_code in status_for:
-                    identifier['status'] = status_for[subfield_code]
+                if subfield_code in _ISSN_STATUS_PER_CODE:
+                    identifier['status'] = _ISSN_STATUS_PER_CODE[subfield_code]
                 identifiedBy.append(identifier)
     return identifiedBy or None
 
@@ -908,48 +1015,6 @@ def marc21_to_identifiedBy_from_field_024(self, key, value):
             identifier['qualifier'] = \
                 ', '.join(utils.force_list(value.get('q')))
 
-    subfield_2_regexp = {
-        'doi': {
-            'type': 'bf:Doi'
-        },
-        'urn': {
-            'type': 'bf:Urn'
-        },
-        'nipo': {
-            'type': 'bf:Local',
-            'source': 'NIPO'
-        },
-        'danacode': {
-            'type': 'bf:Local',
-            'source': 'danacode'
-        },
-        'vd18': {
-            'type': 'bf:Local',
-            'source': 'vd18'
-        },
-        'gtin-14': {
-            'type': 'bf:Gtin14Number'
-        }
-    }
-
-    type_for_ind1 = {
-        '0': {'type': 'bf:Isrc'},
-        '1': {'type': 'bf:Upc'},
-        '2': {
-            'pattern': r'^(M|9790|979-0)',
-            'matching_type': 'bf:Ismn'
-        },
-        '3': {
-            'pattern': r'^97',
-            'matching_type': 'bf:Ean'
-        },
-        '8': {
-            # 33 chars example: 0000-0002-A3B1-0000-0-0000-0000-2
-            'pattern': r'^(.{24}|.{26}|(.{4}-){4}.-(.{4}\-){2}.)$',
-            'matching_type': 'bf:Isan'
-        }
-    }
-
     identifier = {}
     identifiedBy = None
     subfield_a = not_repetitive(
@@ -957,13 +1022,13 @@ def marc21_to_identifiedBy_from_field_024(self, key, value):
     subfield_2 = not_repetitive(
         marc21.bib_id, marc21.bib_id, key, value, '2', default='').strip()
     if subfield_a:
-        if re.search(r'permalink\.snl\.ch', subfield_a, re.IGNORECASE):
+        if _SNL_PERMALINK_REGEXP.search(subfield_a):
             identifier.update({
                 'value': subfield_a,
                 'type': 'uri',
                 'source': 'SNL'
             })
-        elif re.search(r'bnf\.fr/ark', subfield_a, re.IGNORECASE):
+        elif _BNF_ARK_REGEXP.search(subfield_a):
             identifier.update({
                 'value': subfield_a,
                 'type': 'uri',
@@ -972,14 +1037,14 @@ def marc21_to_identifiedBy_from_field_024(self, key, value):
         elif subfield_2:
             identifier['value'] = subfield_a
             populate_acquisitionTerms_note_qualifier(identifier)
-            for pattern in subfield_2_regexp:
-                if re.search(pattern, subfield_2, re.IGNORECASE):
-                    identifier.update(subfield_2_regexp[pattern])
+            for regexp, subfield_2_identifier in _IDENTIFIER_PER_SUBFIELD_2:
+                if regexp.search(subfield_2):
+                    identifier.update(subfield_2_identifier)
         else:  # without subfield $2
             ind1 = key[3]  # indicateur_1
             if ind1 in ('0', '1', '2', '3', '8'):
                 populate_acquisitionTerms_note_qualifier(identifier)
-                match = re.search(r'^(.+?)\s*\((.*)\)$', subfield_a)
+                match = _IDENTIFIER_QUALIFIER_REGEXP.search(subfield_a)
                 if match:
                     # match.group(2) : parentheses content
                     identifier['qualifier'] = ', '.join(
@@ -992,15 +1057,15 @@ def marc21_to_identifiedBy_from_field_024(self, key, value):
                     identifier['value'] = match.group(1)
                 else:
                     identifier['value'] = subfield_a
-                if 'type' in type_for_ind1[ind1]:  # ind1 0,1
-                    identifier['type'] = type_for_ind1[ind1]['type']
+                type_for_ind1 = _IDENTIFIER_TYPE_PER_024_IND1[ind1]
+                if 'type' in type_for_ind1:  # ind1 0,1
+                    identifier['type'] = type_for_ind1['type']
                 else:  # ind1 in (2, 3, 8)
                     data = subfield_a
                     if ind1 == '8':
                         data = identifier['value']
-                    if re.search(type_for_ind1[ind1]['pattern'], data):
-                        identifier['type'] = \
-                            type_for_ind1[ind1]['matching_type']
+                    if type_for_ind1['pattern'].search(data):
+                        identifier['type'] = type_for_ind1['matching_type']
                     else:
                         identifier['type'] = 'bf:Identifier'
             else:  # ind1 not in (0, 1, 2, 3, 8)
@@ -1019,16 +1084,6 @@ def marc21_to_identifiedBy_from_field_024(self, key, value):
 @utils.ignore_value
 def marc21_to_identifiedBy_from_field_028(self, key, value):
     """Get identifier from field 028."""
-    type_for_ind1 = {
-        '0': 'bf:AudioIssueNumber',
-        '1': 'bf:MatrixNumber',
-        '2': 'bf:MusicPlate',
-        '3': 'bf:MusicPublisherNumber',
-        '4': 'bf:VideoRecordingNumber',
-        '5': 'bf:PublisherNumber',
-        '6': 'bf:MusicDistributorNumber'
-    }
-
     identifier = {}
     subfield_a = not_repetitive(
         marc21.bib_id, marc21.bib_id, key, value, 'a', default='').strip()
@@ -1042,7 +1097,8 @@ def marc21_to_identifiedBy_from_field_028(self, key, value):
         if subfield_b:
             identifier['source'] = subfield_b
         # key[3] is the indicateur_1
-        identifier['type'] = type_for_ind1.get(key[3], 'bf:Identifier')
+        identifier['type'] = _IDENTIFIER_TYPE_PER_028_IND1.get(
+            key[3], 'bf:Identifier')
         identifiedBy = self.get('identifiedBy', [])
         identifiedBy.append(identifier)
     return identifiedBy or None
@@ -1069,52 +1125,15 @@ def marc21_to_notes(self, key, value):
 @utils.ignore_value
 def marc21_to_electronicLocator_from_field_856(self, key, value):
     """Get electronicLocator from field 856."""
-    electronic_locator_type = {
-        '0': 'resource',
-        '1': 'versionOfResource',
-        '2': 'relatedResource',
-        '8': 'hiddenUrl'
-    }
-    electronic_locator_content = [
-        'poster',
-        'audio',
-        'postcard',
-        'addition',
-        'debriefing',
-        'exhibitionDocumentation',
-        'erratum',
-        'bookplate',
-        'extract',
-        'educationalSheet',
-        'illustrations',
-        'coverImage',
-        'deliveryInformation',
-        'biographicalInformation',
-        'introductionPreface',
-        'classReading',
-        "teachersKit",
-        "publishersNote",
-        'noteOnContent',
-        'titlePage',
-        'photography',
-        'summarization'
-        "summarization",
-        "onlineResourceViaRERODOC",
-        "pressReview",
-        "webSite",
-        "tableOfContents",
-        "fullText",
-        "video"
-    ]
     indicator2 = key[4]
     electronic_locator = {
         'url': value.get('u'),
-        'type': electronic_locator_type.get(indicator2, 'noInfo')
+        'type': _ELECTRONIC_LOCATOR_TYPE.get(indicator2, 'noInfo')
     }
     content = value.get('3')
     public_note = []
     if content:
-        if content in electronic_locator_content:
+        if content in _ELECTRONIC_LOCATOR_CONTENT:
             electronic_locator['content'] = content
         else:
             public_note.append(content)
@@ -1140,6 +1159,92 @@ def marc21_to_subjects(self, key, value):
     return None
 
 
+class Numbering(object):
+    """The purpose of this class is to build the `Numbering` data."""
+
+    _year_regexp = re.compile(r'^\d{4}')
+    _integer_regexp = re.compile(r'^\d+$')
+    _pages_regexp = re.compile(r'^\d+(-\d+)?$')
+    _pattern_per_key = {
+        'year': _year_regexp,
+        'pages': _pages_regexp,
+        'issue': _integer_regexp,
+        'volume': _integer_regexp
+    }
+
+    def __init__(self):
+        """Constructor method."""
+        self._numbering = {}
+
+    def add_numbering_value(self, key, value):
+        """Add numbering `key: value` to `Numbering` data.
+
+        The `Numbering` object is progressively build with the data col-
+        lected by the succesive calls of the method `add_numbering_value`.
+
+        :param key: key code of data to be added
+        :type key: str
+        :param value: value data to be associated the given `key`
+        :type value: str
+        """
+        if self._pattern_per_key[key].search(value):
+            if key in ('issue', 'volume'):
+                value = int(value)
+            self._numbering[key] = value
+        elif key != 'year':
+            self._numbering['discard'] = True
+
+    def has_year(self):
+        """Check if `year` key is present in `Numbering` data."""
+        return 'year' in self._numbering
+
+    def is_valid(self):
+        """Check if `Numbering` data is valid."""
+        return self._numbering and 'discard' not in self._numbering
+
+    def get(self):
+        """Get the  `Numbering` data object."""
+        return self._numbering
+
+
+def add_author_to_subfield_t(value):
+    """Get author from subfield_t and add it to subfield_t.
+
+    The form 'lastname, firstname' of the author form subfield a
+    is a appended to the subfield_t in the following form:
+    ' / firstname lastname'
+    """
+    items = get_field_items(value)
+    new_data = []
+    author = None
+    pending_g_values = []
+    pending_v_values = []
+    subfield_selection = {'a', 't', 'g', 'v'}
+    for blob_key, blob_value in items:
+        if blob_key in subfield_selection:
+            if blob_key == 'a':
+                # remove the trailing '. -'
+                author = _TRAILING_DASH_REGEXP.sub('', blob_value)
+                # reverse first name and last name
+                author_parts = author.split(',')
+                author = ' '.join(reversed(author_parts)).strip()
+                subfield_selection.remove('a')
+            elif blob_key == 't':
+                subfield_t = blob_value
+                if author:
+                    subfield_t += ' / ' + author
+                new_data.append(('t', subfield_t))
+            elif blob_key == 'g':
+                pending_g_values.append(blob_value)
+            elif blob_key == 'v':
+                pending_v_values.append(blob_value)
+    for g_value in pending_g_values:
+        new_data.append(('g', g_value))
+    for v_value in pending_v_values:
+        new_data.append(('v', v_value))
+    return GroupableOrderedDict(tuple(new_data))
+
+
 @marc21.over('part_of', '^(773|800|830)..')
 @utils.for_each_value
 @utils.ignore_value
@@ -1166,97 +1271,12 @@ def marc21_to_part_of(self, key, value):
     and for the fields 800 and 830 if a field 490 exists
     """
 
-    class Numbering(object):
-        """The purpose of this class is to build the `Numbering` data."""
-
-        def __init__(self):
-            """Constructor method."""
-            self._numbering = {}
-            self._year_regexp = re.compile(r'^\d{4}')
-            self._integer_regexp = re.compile(r'^\d+$')
-            self._pages_regexp = re.compile(r'^\d+(-\d+)?$')
-            self._pattern_per_key = {
-                'year': self._year_regexp,
-                'pages': self._pages_regexp,
-                'issue': self._integer_regexp,
-                'volume': self._integer_regexp
-            }
-
-        def add_numbering_value(self, key, value):
-            """Add numbering `key: value` to `Numbering` data.
-
-            The `Numbering` object is progressively build with the data col-
-            lected by the succesive calls of the method `add_numbering_value`.
-
-            :param key: key code of data to be added
-            :type key: str
-            :param value: value data to be associated the given `key`
-            :type value: str
-            """
-            if self._pattern_per_key[key].search(value):
-                if key in ('issue', 'volume'):
-                    value = int(value)
-                self._numbering[key] = value
-            elif key != 'year':
-                self._numbering['discard'] = True
-
-        def has_year(self):
-            """Check if `year` key is present in `Numbering` data."""
-            return 'year' in self._numbering
-
-        def is_valid(self):
-            """Check if `Numbering` data is valid."""
-            return self._numbering and 'discard' not in self._numbering
-
-        def get(self):
-            """Get the  `Numbering` data object."""
-            return self._numbering
-
-    def add_author_to_subfield_t(value):
-        """Get author from subfield_t and add it to subfield_t.
-
-        The form 'lastname, firstname' of the author form subfield a
-        is a appended to the subfield_t in the following form:
-        ' / firstname lastname'
-        """
-        items = get_field_items(value)
-        new_data = []
-        author = None
-        pending_g_values = []
-        pending_v_values = []
-        match = re.compile(r'\. -$')  # match the trailing '. -'
-        subfield_selection = {'a', 't', 'g', 'v'}
-        for blob_key, blob_value in items:
-            if blob_key in subfield_selection:
-                if blob_key == 'a':
-                    # remove the trailing '. -'
-                    author = match.sub('', blob_value)
-                    # reverse first name and last name
-                    author_parts = author.split(',')
-                    author = ' '.join(reversed(author_parts)).strip()
-                    subfield_selection.remove('a')
-                elif blob_key == 't':
-                    subfield_t = blob_value
-                    if author:
-                        subfield_t += ' / ' + author
-                    new_data.append(('t', subfield_t))
-                elif blob_key == 'g':
-                    pending_g_values.append(blob_value)
-                elif blob_key == 'v':
-                    pending_v_values.append(blob_value)
-        for g_value in pending_g_values:
-            new_data.append(('g', g_value))
-        for v_value in pending_v_values:
-            new_data.append(('v', v_value))
-        return GroupableOrderedDict(tuple(new_data))
-
     part_of = {}
     numbering_list = []
     subfield_w = not_repetitive(
         marc21.bib_id, marc21.bib_id, key, value, 'w', default='').strip()
     if subfield_w and 'NL-LeOCL' not in subfield_w:
-        match = re.compile(r'^\(BE-LnBOR\)')
-        pid = match.sub('', subfield_w).lstrip('0')
+        pid = _BE_LNBOR_PREFIX_REGEXP.sub('', subfield_w).lstrip('0')
         if pid:
             host = current_app.config.get('RERO_ILS_APP_URL')
             part_of['document'] = {
@@ -1335,7 +1355,7 @@ def marc21_to_identifiedBy_from_field_930(self, key, value):
         marc21.bib_id, marc21.bib_id, key, value, 'a', default='').strip()
     if subfield_a:
         identifier = {}
-        match = re.search(r'^\((.+?)\)\s*(.*)$', subfield_a)
+        match = _SOURCE_PREFIX_REGEXP.search(subfield_a)
         if match:
             # match.group(1) : parentheses content
             identifier['source'] = match.group(1)
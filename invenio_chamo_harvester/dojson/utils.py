@@ -2,21 +2,161 @@
 
 """Dojson utils."""
 
-import re
+import time
+from collections import Counter
+from functools import wraps
 
+from dojson.errors import IgnoreKey
+from flask import current_app
 from rero_ils.dojson.utils import ReroIlsMarc21Overdo, \
-    TitlePartList, add_note, build_responsibility_data, error_print, \
+    TitlePartList, add_note, build_responsibility_data, \
     extract_subtitle_and_parallel_titles_from_field_245_b, get_field_items, \
     get_field_link_data, make_year, not_repetitive, \
     remove_trailing_punctuation, join_alternate_graphic_data
 
 
+class ConversionWarnings(object):
+    """Buffered collector of the conversion warnings.
+
+    Warnings are kept in memory, counted by code and written by batches
+    either to a file or to the application log.
+    """
+
+    def __init__(self, path=None, buffer_size=1000):
+        """Initialize collector.
+
+        :param path: file the warnings are appended to, ``None`` sends them
+            to the application log.
+        :param buffer_size: number of warnings kept before a flush.
+        """
+        self.path = path
+        self.buffer_size = buffer_size
+        self.counts = Counter()
+        self._buffer = []
+
+    def warn(self, code, bib_id, *details):
+        """Add a warning.
+
+        :param code: warning code, for example 'WARNING ISSUANCE'.
+        :param bib_id: identifier of the converted record.
+        :param details: values describing the warning.
+        """
+        self.counts[code] += 1
+        self._buffer.append(' '.join(
+            [code + ':', str(bib_id)] + [str(detail) for detail in details]))
+        if len(self._buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        """Write the buffered warnings."""
+        if not self._buffer:
+            return
+        lines, self._buffer = self._buffer, []
+        if self.path:
+            with open(self.path, 'a') as warnings_file:
+                warnings_file.write('\n'.join(lines) + '\n')
+        else:
+            current_app.logger.warning('\n'.join(lines))
+
+    def summary(self):
+        """Build a text summary of the warning counts by code."""
+        return '\n'.join(
+            '{code}: {count}'.format(code=code, count=count)
+            for code, count in sorted(self.counts.items()))
+
+
+class RuleProfiler(object):
+    """Call count, cumulative time and errors of the conversion rules."""
+
+    def __init__(self):
+        """Initialize profiler."""
+        self.records = 0
+        self.total_time = 0.0
+        self.rules = {}
+        self.tags = {}
+        self._creators = {}
+
+    def wrap(self, creator):
+        """Return the timed version of a rule creator."""
+        timed_creator = self._creators.get(creator)
+        if timed_creator is None:
+            @wraps(creator)
+            def timed_creator(output, key, value):
+                start = time.perf_counter()
+                error = False
+                try:
+                    return creator(output, key, value)
+                except IgnoreKey:
+                    raise
+                except Exception:
+                    error = True
+                    raise
+                finally:
+                    duration = time.perf_counter() - start
+                    self._add(self.rules, creator.__name__, duration, error)
+                    self._add(self.tags, key[:3], duration, error)
+            self._creators[creator] = timed_creator
+        return timed_creator
+
+    def add_record(self, duration):
+        """Count a converted record."""
+        self.records += 1
+        self.total_time += duration
+
+    def report(self, limit=None):
+        """Build a text report sorted by cumulative time.
+
+        :param limit: maximum number of rules and tags to list.
+        """
+        lines = ['{records} records converted in {time:.3f}s'.format(
+            records=self.records, time=self.total_time)]
+        for title, stats in (('rule', self.rules), ('tag', self.tags)):
+            lines.append('{title:<45} {calls:>9} {total:>10} {mean:>10} '
+                         '{errors:>7}'.format(title=title, calls='calls',
+                                              total='total (s)',
+                                              mean='mean (ms)',
+                                              errors='errors'))
+            ordered = sorted(stats.items(), key=lambda item: -item[1][1])
+            for name, (calls, total, errors) in ordered[:limit]:
+                lines.append('{name:<45} {calls:>9} {total:>10.3f} '
+                             '{mean:>10.3f} {errors:>7}'.format(
+                                 name=name, calls=calls, total=total,
+                                 mean=1000 * total / calls, errors=errors))
+        return '\n'.join(lines)
+
+    @staticmethod
+    def _add(stats, name, duration, error):
+        """Add a rule call to statistics."""
+        calls, total, errors = stats.get(name, (0, 0.0, 0))
+        stats[name] = (calls + 1, total + duration, errors + int(error))
+
+
+class ProfiledIndex(object):
+    """Rules index returning timed rule creators."""
+
+    def __init__(self, index, profiler):
+        """Initialize index."""
+        self.index = index
+        self.profiler = profiler
+
+    def query(self, key):
+        """Get the rule matching a key."""
+        result = self.index.query(key)
+        if result:
+            name, creator = result
+            return name, self.profiler.wrap(creator)
+        return result
+
+
 class CustomReroIlsMarc21Overdo(ReroIlsMarc21Overdo):
 
     def __init__(self, bases=None, entry_point_group=None):
         """Reroilsmarc21overdo init."""
         super(CustomReroIlsMarc21Overdo, self).__init__(
             bases=bases, entry_point_group=entry_point_group)
+        self.pending_links = []
+        self.profiler = None
+        self.warnings = ConversionWarnings()
         self.extract_series_statement_subfield = {
             '440': {
                 'series_title': 'a',
@@ -40,6 +180,52 @@ class CustomReroIlsMarc21Overdo(ReroIlsMarc21Overdo):
             }
         }
 
+    def do(self, blob, ignore_missing=True, exception_handlers=None):
+        """Translate blob values and collect the deferred MEF links.
+
+        After the conversion, ``pending_links`` lists the contributions
+        whose MEF link has to be resolved later, see
+        ``CHAMO_HARVESTER_MEF_DEFERRED``.
+        """
+        self.pending_links = []
+        if self.profiler is None:
+            return super(CustomReroIlsMarc21Overdo, self).do(
+                blob,
+                ignore_missing=ignore_missing,
+                exception_handlers=exception_handlers
+            )
+        if self.index is None:
+            self.build()
+        index = self.index
+        self.index = ProfiledIndex(index, self.profiler)
+        start = time.perf_counter()
+        try:
+            return super(CustomReroIlsMarc21Overdo, self).do(
+                blob,
+                ignore_missing=ignore_missing,
+                exception_handlers=exception_handlers
+            )
+        finally:
+            self.index = index
+            self.profiler.add_record(time.perf_counter() - start)
+
+    def enable_profiling(self):
+        """Record the statistics of the rules of the next conversions.
+
+        :returns: the :class:`RuleProfiler` collecting them.
+        """
+        if self.profiler is None:
+            self.profiler = RuleProfiler()
+        return self.profiler
+
+    def disable_profiling(self):
+        """Stop recording rules statistics.
+
+        :returns: the :class:`RuleProfiler` with the collected statistics.
+        """
+        profiler, self.profiler = self.profiler, None
+        return profiler
+
     def build_variant_title_data(self, string_set):
         """Build variant title data form fields 246.
 
@@ -207,15 +393,15 @@ class CustomReroIlsMarc21Overdo(ReroIlsMarc21Overdo):
                 index += 1
 
         error_msg = ''
-        regexp = re.compile(r'^[^{}]'.format(series_title_subfield_code))
-        if regexp.search(subfield_visited):
+        if subfield_visited and \
+                not subfield_visited.startswith(series_title_subfield_code):
             error_msg = \
                 'missing leading subfield ${code} in field {tag}'.format(
                     code=series_title_subfield_code,
                     tag=tag
                 )
-            error_print('ERROR BAD FIELD FORMAT:', self.bib_id, self.rero_id,
-                        error_msg)
+            self.warnings.warn('ERROR BAD FIELD FORMAT', self.bib_id,
+                               self.rero_id, error_msg)
         else:
             if subseries:
                 series['subseriesStatement'] = subseries
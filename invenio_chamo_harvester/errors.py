@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2019 UCLouvain.
+#
+# Invenio-Chamo-Harvester is free software; you can redistribute it and/or
+# modify it under the terms of the MIT License; see LICENSE file for more
+# details.
+
+"""Errors for Invenio-Chamo-Harvester."""
+
+from __future__ import absolute_import, print_function
+
+
+class ChamoHarvesterError(Exception):
+    """Base exception for Invenio-Chamo-Harvester."""
+
+
+class UnknownCodeError(ChamoHarvesterError):
+    """Chamo code missing from a mapping table."""
+
+    def __init__(self, kind, code):
+        """Initialize exception.
+
+        :param kind: kind of the code, for example 'location'.
+        :param code: the unknown Chamo code.
+        """
+        super(UnknownCodeError, self).__init__(
+            'Unknown Chamo {kind} code: {code}, add it to the mapping '
+            'configuration'.format(kind=kind, code=code))
+        self.kind = kind
+        self.code = code
+
+
+class ChamoApiError(ChamoHarvesterError):
+    """Unexpected response of the Chamo Rest API."""
+
+
+class IndexingError(ChamoHarvesterError):
+    """The background indexing of the harvested records stopped."""
+
+    def __init__(self, cause):
+        """Initialize exception.
+
+        :param cause: the exception stopping the indexing.
+        """
+        super(IndexingError, self).__init__(
+            'The indexing of the harvested records stopped: {cause}'.format(
+                cause=cause))
+        self.cause = cause
+
+
+class TooManyDeletionsError(ChamoHarvesterError):
+    """More records to delete than the configured fraction of the catalogue.
+    """
+
+    def __init__(self, count, total, max_ratio):
+        """Initialize exception.
+
+        :param count: number of records to delete.
+        :param total: number of harvested records.
+        :param max_ratio: maximum fraction of records to delete.
+        """
+        super(TooManyDeletionsError, self).__init__(
+            '{count} of {total} harvested records are no longer listed by '
+            'Chamo, more than the maximum ratio of {max_ratio}: check the '
+            'Chamo Rest API or raise the ratio'.format(
+                count=count, total=total, max_ratio=max_ratio))
+        self.count = count
+        self.total = total
+        self.max_ratio = max_ratio
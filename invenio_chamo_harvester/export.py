@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2019 UCLouvain.
+#
+# Invenio-Chamo-Harvester is free software; you can redistribute it and/or
+# modify it under the terms of the MIT License; see LICENSE file for more
+# details.
+
+"""Streaming export of records."""
+
+from __future__ import absolute_import, print_function
+
+import gzip
+import json
+
+from flask import current_app
+from invenio_db import db
+from invenio_pidstore.models import PersistentIdentifier, PIDStatus
+
+from .utils import get_records_by_pids
+
+FORMATS = ('json', 'ndjson')
+"""Export formats: a JSON array or one JSON record per line."""
+
+
+def iter_pid_chunks(pid_type, chunk_size=1000):
+    """Iterate the pids of the registered records of a type by chunks.
+
+    Chunks are read by ranges of the pidstore primary key, so each query
+    reads an index range whatever the table size.
+
+    :param pid_type: persistent identifier type.
+    :param chunk_size: number of pids of each chunk.
+    """
+    last_id = 0
+    while True:
+        rows = db.session.query(
+            PersistentIdentifier.id, PersistentIdentifier.pid_value
+        ).filter(
+            PersistentIdentifier.pid_type == pid_type,
+            PersistentIdentifier.status == PIDStatus.REGISTERED,
+            PersistentIdentifier.id > last_id
+        ).order_by(PersistentIdentifier.id).limit(chunk_size).all()
+        if not rows:
+            return
+        last_id = rows[-1][0]
+        yield [pid for _, pid in rows]
+
+
+def iter_records(record_cls, pid_type, chunk_size=1000):
+    """Iterate the dumps of all the records of a type.
+
+    The records of each chunk of pids are loaded with a single query, then
+    removed from the database session.
+
+    :param record_cls: record class, for example :class:`Document`.
+    :param pid_type: persistent identifier type of the records.
+    :param chunk_size: number of records loaded at once.
+    """
+    for pids in iter_pid_chunks(pid_type, chunk_size):
+        records = get_records_by_pids(record_cls, pid_type, pids)
+        for pid in pids:
+            record = records.get(pid)
+            if record is None:
+                continue
+            try:
+                data = record.dumps()
+            except Exception as e:
+                current_app.logger.error(
+                    'Error exporting record [{id}] : {e}'.format(
+                        id=pid, e=str(e)), exc_info=True)
+                continue
+            yield data
+        db.session.expunge_all()
+
+
+def open_export(filename, compress=False):
+    """Open an export file for writing text.
+
+    :param filename: path of the file.
+    :param compress: write a gzip file.
+    """
+    if compress:
+        return gzip.open(filename, 'wt', encoding='utf-8')
+    return open(filename, 'w', encoding='utf-8')
+
+
+def write_records(records, outfile, fmt='json'):
+    """Write records to a file, one at a time.
+
+    :param records: iterator of record data.
+    :param outfile: text file object.
+    :param fmt: one of :data:`FORMATS`.
+    :returns: number of written records.
+    """
+    count = 0
+    if fmt == 'ndjson':
+        for data in records:
+            outfile.write(json.dumps(data))
+            outfile.write('\n')
+            count += 1
+        return count
+    outfile.write('[')
+    for data in records:
+        outfile.write(',\n' if count else '\n')
+        outfile.write(json.dumps(data))
+        count += 1
+    outfile.write('\n]\n' if count else ']\n')
+    return count
@@ -10,11 +10,15 @@
 
 from __future__ import absolute_import, print_function
 
+import os
+
 import six
 from flask import current_app
 from werkzeug.utils import cached_property, import_string
 
 from . import config
+from .mef import MefLinkCache
+from .utils import build_ref_table
 
 
 class InvenioChamoHarvester(object):
@@ -34,6 +38,7 @@ class InvenioChamoHarvester(object):
         :param app: The Flask application.
         """
         self.init_config(app)
+        self.app = app
         app.extensions['invenio-chamo-harvester'] = self
 
     def init_config(self, app):
@@ -41,6 +46,33 @@ class InvenioChamoHarvester(object):
 
         :param app: The Flask application.
         """
-        for k in dir(app.config):
+        for k in dir(config):
             if k.startswith('CHAMO_HARVESTER_'):
-                app.config.setdefault(k, getattr(app.config, k))
+                app.config.setdefault(k, getattr(config, k))
+
+    @cached_property
+    def mef_cache(self):
+        """MEF link cache shared by the conversions of this application."""
+        path = self.app.config['CHAMO_HARVESTER_MEF_CACHE_PATH']
+        if path is None:
+            path = os.path.join(self.app.instance_path, 'chamo_mef_cache.db')
+        return MefLinkCache(
+            path=path or None,
+            size=self.app.config['CHAMO_HARVESTER_MEF_CACHE_SIZE'],
+            ttl=self.app.config['CHAMO_HARVESTER_MEF_CACHE_TTL'],
+            miss_ttl=self.app.config['CHAMO_HARVESTER_MEF_CACHE_MISS_TTL']
+        )
+
+    @cached_property
+    def item_type_refs(self):
+        """RERO ILS item type references by Chamo item type code."""
+        return build_ref_table(
+            self.app.config['CHAMO_HARVESTER_ITEM_TYPES'], 'item_types',
+            self.app.config.get('RERO_ILS_APP_URL'))
+
+    @cached_property
+    def location_refs(self):
+        """RERO ILS location references by Chamo location code."""
+        return build_ref_table(
+            self.app.config['CHAMO_HARVESTER_LOCATIONS'], 'locations',
+            self.app.config.get('RERO_ILS_APP_URL'))
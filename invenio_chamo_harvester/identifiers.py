@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2019 UCLouvain.
+#
+# Invenio-Chamo-Harvester is free software; you can redistribute it and/or
+# modify it under the terms of the MIT License; see LICENSE file for more
+# details.
+
+"""Normalization of the document identifiers."""
+
+from __future__ import absolute_import, print_function
+
+from functools import lru_cache
+
+from isbnlib import EAN13, clean, to_isbn13
+
+
+@lru_cache(maxsize=100000)
+def normalize_isbn(value):
+    """Convert an ISBN-10 or ISBN-13 to a bare ISBN-13.
+
+    :param value: ISBN as found in the record.
+    :returns: the ISBN-13 or ``None`` if the value is not a valid ISBN.
+    """
+    return to_isbn13(clean(value)) or None
+
+
+@lru_cache(maxsize=100000)
+def normalize_ean(value):
+    """Validate an EAN-13.
+
+    :param value: EAN as found in the record.
+    :returns: the bare EAN-13 or ``None`` if the value is not valid.
+    """
+    return EAN13(clean(value)) or None
+
+
+NORMALIZER_PER_TYPE = {
+    'bf:Isbn': normalize_isbn,
+    'bf:Ean': normalize_ean
+}
+"""Normalization function of each identifier type."""
+
+
+def normalize_identifiers(documents):
+    """Normalize the ISBN and EAN identifiers of a batch of documents.
+
+    Identifiers are grouped by type and value so that each distinct value
+    is converted only once for the whole batch. Valid values are replaced
+    in place by their normalized form, invalid ones are left untouched.
+    Identifiers with a status, the ones MARC marks as invalid or cancelled
+    like ``020 $z``, are kept as catalogued.
+
+    :param documents: iterable of converted documents.
+    :returns: number of distinct values converted.
+    """
+    identifiers = {}
+    for document in documents:
+        for identifier in (document or {}).get('identifiedBy', []):
+            id_type = identifier.get('type')
+            value = identifier.get('value')
+            if id_type in NORMALIZER_PER_TYPE and value and \
+                    not identifier.get('status'):
+                identifiers.setdefault((id_type, value), []).append(
+                    identifier)
+    for (id_type, value), matches in identifiers.items():
+        normalized = NORMALIZER_PER_TYPE[id_type](value)
+        if normalized:
+            for identifier in matches:
+                identifier['value'] = normalized
+    return len(identifiers)
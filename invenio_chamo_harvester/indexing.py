@@ -0,0 +1,303 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2019 UCLouvain.
+#
+# Invenio-Chamo-Harvester is free software; you can redistribute it and/or
+# modify it under the terms of the MIT License; see LICENSE file for more
+# details.
+
+"""Background indexing of the harvested records."""
+
+from __future__ import absolute_import, print_function
+
+import queue
+import threading
+import time
+from copy import deepcopy
+from datetime import datetime
+
+import pytz
+from elasticsearch.helpers import bulk
+from flask import current_app
+from invenio_db import db
+from invenio_indexer.proxies import current_record_to_index
+from invenio_indexer.signals import before_record_index
+from invenio_records.api import Record
+from invenio_records.models import RecordMetadata
+from invenio_search import current_search_client
+from rero_ils.modules.api import IlsRecordsIndexer
+from rero_ils.modules.documents.api import Document
+from rero_ils.modules.holdings.api import Holding
+from rero_ils.modules.items.api import Item
+from sqlalchemy.orm.util import identity_key
+
+from .errors import IndexingError
+
+DOC_TYPES = ('hold', 'item', 'doc')
+"""Indexing order: holdings and items before their documents."""
+
+RECORD_CLASSES = {'doc': Document, 'hold': Holding, 'item': Item}
+"""Record class of each doc type."""
+
+RESOURCES = {'doc': 'documents', 'hold': 'holdings', 'item': 'items'}
+"""RERO ILS API resource of each doc type."""
+
+
+def batch_entries(holding_ids, item_ids, record_ids):
+    """Build the indexing entries of a batch of record uuids."""
+    return [
+        {'doc_type': doc_type, 'id': record_id}
+        for doc_type, ids in (('hold', holding_ids), ('item', item_ids),
+                              ('doc', record_ids))
+        for record_id in ids
+    ]
+
+
+def snapshot_entries(entries, written=None, records=None):
+    """Add the record data to indexing entries.
+
+    The data is read from the records written through the record API, or
+    from the models still loaded in the database session, so this must be
+    called after a flush and before the commit expires them. The session
+    only keeps weak references to the models once flushed, the written
+    records should be given in ``records``.
+
+    :param entries: indexing entries, see :func:`batch_entries`.
+    :param written: dictionary of record data by uuid of the records
+        written without the ORM, by the bulk loader.
+    :param records: dictionary of the records written through the record
+        API by uuid.
+    :returns: the entries.
+    """
+    written = written or {}
+    records = records or {}
+    now = datetime.utcnow()
+    for entry in entries:
+        record = records.get(entry['id'])
+        model = record.model if record is not None else \
+            db.session.identity_map.get(
+                identity_key(RecordMetadata, entry['id']))
+        if model is not None:
+            entry.update({
+                'revision': model.version_id - 1,
+                'created': model.created,
+                'updated': model.updated,
+                'data': deepcopy(model.json)
+            })
+        elif entry['id'] in written:
+            entry.update({
+                'revision': 0,
+                'created': now,
+                'updated': now,
+                'data': deepcopy(written[entry['id']])
+            })
+    return entries
+
+
+def unindex_records(entries):
+    """Remove records from Elasticsearch with a single bulk request.
+
+    :param entries: list of (index, doc_type, uuid) of the records.
+    :returns: number of removed records.
+    """
+    if not entries:
+        return 0
+    success, _ = bulk(current_search_client, [
+        {
+            '_op_type': 'delete',
+            '_index': index,
+            '_type': doc_type,
+            '_id': str(record_id)
+        }
+        for index, doc_type, record_id in entries
+    ], raise_on_error=False, stats_only=True)
+    return success
+
+
+class RecordIdsIndexer(object):
+    """Index records by uuid, reading them from the database."""
+
+    def __init__(self):
+        """Initialize indexer."""
+        self.indexer = IlsRecordsIndexer()
+
+    def index(self, entries):
+        """Index a batch of entries."""
+        for doc_type in DOC_TYPES:
+            ids = [entry['id'] for entry in entries
+                   if entry['doc_type'] == doc_type]
+            if ids:
+                self.indexer.bulk_index(ids, doc_type=doc_type)
+                self.indexer.process_bulk_queue()
+
+
+class MemoryIndexer(object):
+    """Index records from the data written by the harvest.
+
+    References to records of the same batch are resolved from the batch,
+    the other ones, like locations or item types, are resolved once and
+    cached.
+    """
+
+    def __init__(self):
+        """Initialize indexer."""
+        self.url_api = '{host}/api/{{resource}}/{{pid}}'.format(
+            host=current_app.config.get('RERO_ILS_APP_URL'))
+        self._refs = {}
+
+    def index(self, entries):
+        """Index a batch of entries with a single bulk request.
+
+        The entries without data are indexed from the database.
+        """
+        missing = [entry for entry in entries if 'data' not in entry]
+        if missing:
+            current_app.logger.warning(
+                'Indexing {count} records without data from the '
+                'database: {ids}'.format(
+                    count=len(missing),
+                    ids=[str(entry['id']) for entry in missing]))
+            RecordIdsIndexer().index(missing)
+        batch_refs = {}
+        for entry in entries:
+            if 'data' in entry:
+                pid = entry['data'].get('pid')
+                batch_refs[self.url_api.format(
+                    resource=RESOURCES[entry['doc_type']], pid=pid)] = {
+                        'pid': pid}
+        actions = [self.action(entry, batch_refs) for entry in entries
+                   if 'data' in entry]
+        if actions:
+            bulk(current_search_client, actions, stats_only=True)
+
+    def action(self, entry, batch_refs):
+        """Build the Elasticsearch bulk action of an entry."""
+        data = self.resolve_refs(entry['data'], batch_refs)
+        record = RECORD_CLASSES[entry['doc_type']](data)
+        index, doc_type = current_record_to_index(record)
+        data['_created'] = pytz.utc.localize(entry['created']).isoformat()
+        data['_updated'] = pytz.utc.localize(entry['updated']).isoformat()
+        before_record_index.send(
+            current_app._get_current_object(),
+            json=data,
+            record=record,
+            index=index,
+            doc_type=doc_type
+        )
+        return {
+            '_op_type': 'index',
+            '_index': index,
+            '_type': doc_type,
+            '_id': str(entry['id']),
+            '_version': entry['revision'],
+            '_version_type': 'external_gte',
+            '_source': data
+        }
+
+    def resolve_refs(self, data, batch_refs):
+        """Replace the ``$ref`` of some record data by their values."""
+        if isinstance(data, list):
+            return [self.resolve_refs(value, batch_refs) for value in data]
+        if not isinstance(data, dict):
+            return data
+        url = data.get('$ref')
+        if url is None:
+            return {
+                key: self.resolve_refs(value, batch_refs)
+                for key, value in data.items()
+            }
+        if url in batch_refs:
+            return deepcopy(batch_refs[url])
+        resolved = self._refs.get(url)
+        if resolved is None:
+            resolved = deepcopy(
+                Record({'ref': {'$ref': url}}).replace_refs())['ref']
+            # cache the shared records only, like locations or item types
+            if url.split('/')[-2] not in RESOURCES.values():
+                self._refs[url] = resolved
+        return deepcopy(resolved)
+
+
+class IndexingWorker(threading.Thread):
+    """Index committed batches of records in a background thread.
+
+    Batches are taken from a bounded queue: when Elasticsearch is slower
+    than the database writes, :meth:`submit` blocks until a batch has been
+    indexed.
+    """
+
+    def __init__(self, app, maxsize=2, indexer_cls=RecordIdsIndexer):
+        """Initialize worker.
+
+        :param app: the Flask application.
+        :param maxsize: maximum number of batches waiting to be indexed.
+        :param indexer_cls: class indexing the batches,
+            :class:`RecordIdsIndexer` or :class:`MemoryIndexer`.
+        """
+        super(IndexingWorker, self).__init__(name='chamo-harvester-indexer')
+        self.daemon = True
+        self.app = app
+        self.indexer_cls = indexer_cls
+        self.batches = queue.Queue(maxsize=maxsize)
+        self.n_batches = 0
+        self.n_errors = 0
+        self.failed = None
+
+    @property
+    def from_memory(self):
+        """Whether batches are indexed from the record data."""
+        return self.indexer_cls is MemoryIndexer
+
+    def submit(self, entries):
+        """Queue a batch of committed records.
+
+        :param entries: indexing entries, see :func:`batch_entries`.
+        :raises IndexingError: if the worker could not start.
+        """
+        if entries:
+            self._put(entries)
+
+    def close(self):
+        """Wait for the queued batches to be indexed.
+
+        :raises IndexingError: if the worker could not start.
+        """
+        self._put(None)
+        self.join()
+
+    def _put(self, entries):
+        """Queue a batch, unless the worker stopped."""
+        while True:
+            if self.failed is not None:
+                raise IndexingError(self.failed)
+            try:
+                self.batches.put(entries, timeout=1)
+                return
+            except queue.Full:
+                continue
+
+    def run(self):
+        """Index the queued batches until :meth:`close` is called."""
+        with self.app.app_context():
+            try:
+                indexer = self.indexer_cls()
+            except Exception as e:
+                self.failed = e
+                self.app.logger.error('Failed to start the indexing',
+                                      exc_info=True)
+                return
+            while True:
+                entries = self.batches.get()
+                if entries is None:
+                    break
+                start = time.time()
+                try:
+                    indexer.index(entries)
+                except Exception:
+                    self.n_errors += 1
+                    self.app.logger.error('Failed to index a batch',
+                                          exc_info=True)
+                self.n_batches += 1
+                self.app.logger.info(
+                    'indexed {count} records in {duration:.3f}s'.format(
+                        count=len(entries), duration=time.time() - start))
@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2019 UCLouvain.
+#
+# Invenio-Chamo-Harvester is free software; you can redistribute it and/or
+# modify it under the terms of the MIT License; see LICENSE file for more
+# details.
+
+"""Bulk loader of harvested records for initial loads.
+
+The records are written with SQLAlchemy Core multi-row inserts, bypassing
+the ORM and the record API. Two things done by
+:meth:`invenio_records.api.Record.create` are therefore skipped: no row is
+written to the version table of the record metadata, the records start
+without history, and the ``before_record_insert`` and
+``after_record_insert`` signals are not sent.
+"""
+
+from __future__ import absolute_import, print_function
+
+import uuid
+
+from flask import current_app
+from invenio_db import db
+from invenio_pidstore.models import PersistentIdentifier, PIDStatus
+from invenio_records.models import RecordMetadata
+from rero_ils.modules.documents.models import DocumentIdentifier
+from rero_ils.modules.holdings.models import HoldingIdentifier
+from rero_ils.modules.items.models import ItemIdentifier
+from sqlalchemy import func, text
+
+from .models import ChamoHoldingKey
+from .schemas import DOCUMENT_SCHEMA, HOLDING_SCHEMA, ITEM_SCHEMA, \
+    schema_url
+from .schemas import validate as validate_record
+from .utils import build_holding, build_item, chamo_holding_key, \
+    holding_key, item_holding_key
+
+
+def mint_pids(identifier_cls, count):
+    """Reserve a block of record identifiers.
+
+    On PostgreSQL the identifiers are taken from the sequence of the
+    identifier table with a single query, other databases continue after
+    the highest identifier.
+
+    :param identifier_cls: a :class:`RecordIdentifier` subclass.
+    :param count: number of identifiers to reserve.
+    :returns: list of identifiers.
+    """
+    if not count:
+        return []
+    if db.engine.dialect.name == 'postgresql':
+        return [row[0] for row in db.session.execute(
+            text('SELECT nextval(:sequence) FROM generate_series(1, :count)'),
+            {
+                'sequence': '{table}_recid_seq'.format(
+                    table=identifier_cls.__tablename__),
+                'count': count
+            })]
+    max_recid = db.session.query(func.max(identifier_cls.recid)).scalar()
+    start = (max_recid or 0) + 1
+    return list(range(start, start + count))
+
+
+class BulkRecordLoader(object):
+    """Write documents, holdings and items with bulk inserts.
+
+    Records are built in memory by :meth:`add` and written by
+    :meth:`flush` with one multi-row insert per table: record metadata,
+    persistent identifiers and record identifiers. Holding pids are minted
+    by blocks, document and item pids come from the Chamo records and are
+    registered in their identifier tables, like the records created one by
+    one. The Chamo keys of the holdings are stored for the later updates,
+    see :class:`ChamoHoldingKey`.
+
+    Only new records can be loaded: the loader is used by initial loads.
+    """
+
+    def __init__(self, validate_documents=True):
+        """Initialize loader.
+
+        :param validate_documents: validate the documents, ``False`` when
+            they were validated with their batch.
+        """
+        self.document_schema = schema_url(DOCUMENT_SCHEMA)
+        self.holding_schema = schema_url(HOLDING_SCHEMA)
+        self.item_schema = schema_url(ITEM_SCHEMA)
+        self.validate_documents = validate_documents
+        self.url_api = '{host}/api/{{doc_type}}/{{pid}}'.format(
+            host=current_app.config.get('RERO_ILS_APP_URL'))
+        self._records = []
+        self.written = {}
+        self.rejected = []
+
+    def __len__(self):
+        """Number of documents waiting to be written."""
+        return len(self._records)
+
+    def add(self, document, holdings, items, key=None):
+        """Add a record to the next bulk insert.
+
+        The holdings and items are converted to RERO ILS records right
+        away, their pids and the item holding references are set by
+        :meth:`flush`.
+
+        :param document: converted document, with its pid.
+        :param holdings: Chamo holdings of the record.
+        :param items: Chamo items of the record.
+        :param key: identifier of the record reported if it is rejected,
+            the document pid by default.
+        """
+        document['$schema'] = self.document_schema
+        uri_document = self.url_api.format(doc_type='documents',
+                                           pid=document.get('pid'))
+        new_holdings = []
+        holding_idx = {}
+        for holding in holdings:
+            holding_idx[holding_key(holding)] = len(new_holdings)
+            new_holdings.append((
+                build_holding(holding, uri_document, self.holding_schema),
+                chamo_holding_key(holding)))
+        new_items = [
+            (build_item(item, uri_document, self.item_schema),
+             holding_idx.get(item_holding_key(item)))
+            for item in items
+        ]
+        self._records.append((
+            key if key is not None else document.get('pid'),
+            document, new_holdings, new_items))
+
+    def flush(self):
+        """Write the added records.
+
+        Records are written in a savepoint. When it fails, the records are
+        split in two halves written separately, down to the single records
+        which are rejected. The keys and document pids of the rejected
+        records are kept in ``rejected`` and the data of the written
+        records in ``written``, until the next flush.
+
+        :returns: dictionary of the written record uuids by doc type,
+            'doc', 'hold' and 'item', to be indexed.
+        """
+        records, self._records = self._records, []
+        self.rejected = []
+        self.written = {}
+        rows = {'doc': [], 'hold': [], 'item': []}
+        self._bisect(records, rows)
+        self.written = {
+            record_id: data
+            for doc_rows in rows.values() for record_id, data in doc_rows
+        }
+        return {
+            doc_type: [record_id for record_id, _ in doc_rows]
+            for doc_type, doc_rows in rows.items()
+        }
+
+    def _bisect(self, records, rows):
+        """Write records, bisecting on failure.
+
+        :param records: list of added records.
+        :param rows: dictionary of the written rows by doc type.
+        """
+        if not records:
+            return
+        try:
+            with db.session.begin_nested():
+                written = self._write(records)
+        except Exception as e:
+            if len(records) == 1:
+                self.rejected.append(
+                    (records[0][0], records[0][1].get('pid')))
+                current_app.logger.error(
+                    'Error loading record [{key}] : {e}'.format(
+                        key=records[0][0], e=e), exc_info=True)
+                return
+            half = len(records) // 2
+            self._bisect(records[:half], rows)
+            self._bisect(records[half:], rows)
+            return
+        for doc_type, doc_rows in written.items():
+            rows[doc_type].extend(doc_rows)
+
+    def _write(self, records):
+        """Mint the holding pids of some records and insert their rows.
+
+        Items without a Chamo pid get one from the item sequence.
+        """
+        holding_pids = iter(mint_pids(
+            HoldingIdentifier,
+            sum(len(holdings) for _, _, holdings, _ in records)))
+        item_pids = iter(mint_pids(
+            ItemIdentifier,
+            sum(1 for _, _, _, items in records for item, _ in items
+                if not item.get('pid'))))
+        rows = {'doc': [], 'hold': [], 'item': []}
+        holding_keys = []
+        for _, document, holdings, items in records:
+            rows['doc'].append(
+                self._row(document, validate=self.validate_documents))
+            holding_refs = []
+            for holding, key in holdings:
+                holding['pid'] = str(next(holding_pids))
+                holding_keys.append({'holding_pid': holding['pid'],
+                                     'key': key})
+                holding_refs.append(self.url_api.format(
+                    doc_type='holdings', pid=holding['pid']))
+                rows['hold'].append(self._row(holding))
+            for item, idx in items:
+                if not item.get('pid'):
+                    item['pid'] = str(next(item_pids))
+                item['pid'] = str(item['pid'])
+                item['holding'] = {
+                    '$ref': holding_refs[idx] if idx is not None else
+                    self.url_api.format(doc_type='holdings', pid=None)
+                }
+                rows['item'].append(self._row(item))
+        for doc_type, identifier_cls in (('doc', DocumentIdentifier),
+                                         ('hold', HoldingIdentifier),
+                                         ('item', ItemIdentifier)):
+            self._insert(doc_type, identifier_cls, rows[doc_type])
+        if holding_keys:
+            db.session.execute(ChamoHoldingKey.__table__.insert(),
+                               holding_keys)
+        return rows
+
+    @staticmethod
+    def _row(data, validate=True):
+        """Validate a record and give its uuid and data."""
+        if validate:
+            validate_record(data)
+        return uuid.uuid4(), data
+
+    @staticmethod
+    def _insert(pid_type, identifier_cls, rows):
+        """Insert the rows of a record type.
+
+        :param pid_type: persistent identifier type.
+        :param identifier_cls: a :class:`RecordIdentifier` subclass.
+        :param rows: list of (uuid, data) tuples.
+        """
+        if not rows:
+            return
+        db.session.execute(identifier_cls.__table__.insert(), [
+            {'recid': int(data['pid'])} for _, data in rows
+        ])
+        db.session.execute(RecordMetadata.__table__.insert(), [
+            {'id': record_id, 'json': data, 'version_id': 1}
+            for record_id, data in rows
+        ])
+        db.session.execute(PersistentIdentifier.__table__.insert(), [
+            {
+                'pid_type': pid_type,
+                'pid_value': data['pid'],
+                'status': PIDStatus.REGISTERED,
+                'object_type': 'rec',
+                'object_uuid': record_id
+            }
+            for record_id, data in rows
+        ])
@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2019 UCLouvain.
+#
+# Invenio-Chamo-Harvester is free software; you can redistribute it and/or
+# modify it under the terms of the MIT License; see LICENSE file for more
+# details.
+
+"""MEF link lookups and cache."""
+
+from __future__ import absolute_import, print_function
+
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+
+import requests
+
+MISSING = object()
+"""Marker returned by :meth:`MefLinkCache.get` for unknown VIAF pids."""
+
+MEF_SEARCH_HOST = 'mef.test.rero.ch'
+"""MEF host queried for VIAF pids."""
+
+MEF_LINK_HOST = 'mef.rero.ch'
+"""MEF host used in the stored links."""
+
+
+class MefLinkCache(object):
+    """Two tier cache of MEF links keyed by VIAF pid.
+
+    The first tier is an in-memory LRU bounded to ``size`` entries, the
+    second one is a SQLite database shared by every worker process and kept
+    between runs. Misses (VIAF pids unknown to MEF) are cached as ``None``
+    with their own, usually shorter, time to live.
+    """
+
+    def __init__(self, path=None, size=10000, ttl=2592000, miss_ttl=86400):
+        """Initialize cache.
+
+        :param path: SQLite database file, ``None`` disables the persistent
+            tier.
+        :param size: maximum number of entries kept in memory.
+        :param ttl: time to live of a MEF link in seconds.
+        :param miss_ttl: time to live of a miss in seconds.
+        """
+        self.path = path
+        self.size = size
+        self.ttl = ttl
+        self.miss_ttl = miss_ttl
+        self._memory = OrderedDict()
+        self._connection = None
+        self._connection_pid = None
+
+    @property
+    def connection(self):
+        """SQLite connection of the current process.
+
+        Connections can not be shared with forked workers, a new one is
+        opened whenever the process id changes.
+        """
+        if not self.path:
+            return None
+        if self._connection is None or self._connection_pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory and not os.path.exists(directory):
+                os.makedirs(directory)
+            connection = sqlite3.connect(self.path, timeout=30,
+                                         isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS mef_links ('
+                'viaf_pid TEXT PRIMARY KEY, link TEXT, expires REAL)')
+            self._connection = connection
+            self._connection_pid = os.getpid()
+        return self._connection
+
+    def get(self, viaf_pid):
+        """Get the cached MEF link of a VIAF pid.
+
+        :param viaf_pid: VIAF identifier.
+        :returns: the MEF link, ``None`` for a cached miss or ``MISSING``.
+        """
+        viaf_pid = str(viaf_pid)
+        now = time.time()
+        entry = self._memory.get(viaf_pid)
+        if entry is not None:
+            link, expires = entry
+            if expires > now:
+                self._memory.move_to_end(viaf_pid)
+                return link
+            del self._memory[viaf_pid]
+        if self.connection is None:
+            return MISSING
+        row = self.connection.execute(
+            'SELECT link, expires FROM mef_links WHERE viaf_pid = ?',
+            (viaf_pid,)).fetchone()
+        if row is None or row[1] <= now:
+            return MISSING
+        self._remember(viaf_pid, row[0], row[1])
+        return row[0]
+
+    def set(self, viaf_pid, link):
+        """Cache the MEF link of a VIAF pid.
+
+        :param viaf_pid: VIAF identifier.
+        :param link: MEF link or ``None`` if MEF does not know the pid.
+        """
+        self.set_many({viaf_pid: link})
+
+    def set_many(self, links):
+        """Cache several MEF links at once.
+
+        :param links: dictionary of MEF links (or ``None``) by VIAF pid.
+        """
+        now = time.time()
+        rows = []
+        for viaf_pid, link in links.items():
+            expires = now + (self.ttl if link else self.miss_ttl)
+            self._remember(str(viaf_pid), link, expires)
+            rows.append((str(viaf_pid), link, expires))
+        if rows and self.connection is not None:
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO mef_links (viaf_pid, link, expires) '
+                'VALUES (?, ?, ?)', rows)
+
+    def purge(self):
+        """Remove expired entries from the persistent tier."""
+        self._memory.clear()
+        if self.connection is not None:
+            self.connection.execute(
+                'DELETE FROM mef_links WHERE expires <= ?', (time.time(),))
+
+    def _remember(self, viaf_pid, link, expires):
+        """Store an entry in the in-memory tier."""
+        self._memory[viaf_pid] = (link, expires)
+        self._memory.move_to_end(viaf_pid)
+        while len(self._memory) > self.size:
+            self._memory.popitem(last=False)
+
+
+def mef_link_from_hit(hit, mef_url):
+    """Build a MEF link from a MEF search hit.
+
+    :param hit: MEF search hit.
+    :param mef_url: MEF API base url.
+    :returns: the MEF link or ``None``.
+    """
+    metadata = hit.get('metadata', {})
+    for pid_type in ('idref', 'gnd', 'rero'):
+        source = metadata.get(pid_type)
+        if source:
+            return '{url}{pid_type}/{pid}'.format(
+                url=mef_url,
+                pid_type=pid_type,
+                pid=source['pid']
+            )
+    return None
+
+
+def resolve_person_links(viaf_pids, cache, batch_size=50):
+    """Resolve several VIAF pids with a few MEF requests.
+
+    Pids already in ``cache`` are not requested. The other ones are sent by
+    batches of ``batch_size`` in a single ``viaf_pid`` OR query and the
+    results, misses included, are stored in ``cache``.
+
+    :param viaf_pids: iterable of VIAF identifiers.
+    :param cache: a :class:`MefLinkCache` instance.
+    :param batch_size: maximum number of pids per MEF request.
+    :returns: number of MEF requests sent.
+    """
+    mef_url = 'https://{host}/api/'.format(host=MEF_SEARCH_HOST)
+    unknown = sorted({
+        str(viaf_pid) for viaf_pid in viaf_pids
+        if cache.get(viaf_pid) is MISSING
+    })
+    n_requests = 0
+    for idx in range(0, len(unknown), batch_size):
+        batch = unknown[idx:idx + batch_size]
+        url = '{mef}mef/?q=viaf_pid:({pids})&size={size}'.format(
+            mef=mef_url,
+            pids=' OR '.join(batch),
+            size=len(batch)
+        )
+        n_requests += 1
+        request = requests.get(url=url)
+        if request.status_code != requests.codes.ok:
+            continue
+        links = dict.fromkeys(batch)
+        for hit in request.json().get('hits', {}).get('hits', []):
+            viaf_pid = str(hit.get('metadata', {}).get('viaf_pid'))
+            if viaf_pid in links:
+                link = mef_link_from_hit(hit, mef_url)
+                if link:
+                    link = link.replace(MEF_SEARCH_HOST, MEF_LINK_HOST)
+                links[viaf_pid] = link
+        cache.set_many(links)
+    return n_requests
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2019 UCLouvain.
+#
+# Invenio-Chamo-Harvester is free software; you can redistribute it and/or
+# modify it under the terms of the MIT License; see LICENSE file for more
+# details.
+
+"""Database models for Chamo harvester."""
+
+from __future__ import absolute_import, print_function
+
+from invenio_db import db
+from sqlalchemy_utils.models import Timestamp
+
+
+class ChamoRecordDigest(db.Model, Timestamp):
+    """Digest of the last harvested version of a Chamo bib."""
+
+    __tablename__ = 'chamo_harvester_digest'
+
+    bib_id = db.Column(db.String(255), primary_key=True)
+    """Chamo bib identifier."""
+
+    digest = db.Column(db.String(64), nullable=False)
+    """Digest of the MARC, items and holdings of the bib."""
+
+    @classmethod
+    def get_digests(cls, bib_ids):
+        """Get the stored digests of several bibs.
+
+        :param bib_ids: list of Chamo bib identifiers.
+        :returns: dictionary of digests by bib identifier.
+        """
+        if not bib_ids:
+            return {}
+        query = db.session.query(cls.bib_id, cls.digest).filter(
+            cls.bib_id.in_([str(bib_id) for bib_id in bib_ids]))
+        return dict(query)
+
+    @classmethod
+    def set_digests(cls, digests):
+        """Store the digests of several bibs in the current transaction.
+
+        :param digests: dictionary of digests by bib identifier.
+        """
+        if not digests:
+            return
+        cls.query.filter(cls.bib_id.in_(list(digests))).delete(
+            synchronize_session=False)
+        db.session.bulk_insert_mappings(cls, [
+            {'bib_id': bib_id, 'digest': digest}
+            for bib_id, digest in digests.items()
+        ])
+
+    @classmethod
+    def delete_digests(cls, bib_ids):
+        """Delete the digests of several bibs in the current transaction.
+
+        :param bib_ids: list of Chamo bib identifiers.
+        """
+        if not bib_ids:
+            return
+        cls.query.filter(cls.bib_id.in_([str(bib_id) for bib_id in bib_ids])
+                         ).delete(synchronize_session=False)
+
+    @classmethod
+    def get_bib_ids(cls):
+        """Iterate the identifiers of all harvested bibs."""
+        query = db.session.query(cls.bib_id).yield_per(10000)
+        for bib_id, in query:
+            yield bib_id
+
+
+class ChamoHoldingKey(db.Model):
+    """Chamo key of a harvested holding.
+
+    Several Chamo locations and circulation categories are mapped to the
+    same RERO ILS ones, the holdings of a document are matched by their
+    Chamo ``location#cica`` key instead.
+    """
+
+    __tablename__ = 'chamo_harvester_holding'
+
+    holding_pid = db.Column(db.String(255), primary_key=True)
+    """RERO ILS holding pid."""
+
+    key = db.Column(db.String(255), nullable=False)
+    """Chamo ``location#cica`` key of the holding."""
+
+    @classmethod
+    def get_keys(cls, holding_pids):
+        """Get the Chamo keys of several holdings.
+
+        :param holding_pids: list of holding pids.
+        :returns: dictionary of keys by holding pid.
+        """
+        if not holding_pids:
+            return {}
+        query = db.session.query(cls.holding_pid, cls.key).filter(
+            cls.holding_pid.in_([str(pid) for pid in holding_pids]))
+        return dict(query)
+
+    @classmethod
+    def set_keys(cls, keys):
+        """Store the Chamo keys of several holdings.
+
+        The keys are written in the current transaction.
+
+        :param keys: dictionary of keys by holding pid.
+        """
+        if not keys:
+            return
+        cls.delete_keys(list(keys))
+        db.session.bulk_insert_mappings(cls, [
+            {'holding_pid': str(pid), 'key': key}
+            for pid, key in keys.items()
+        ])
+
+    @classmethod
+    def delete_keys(cls, holding_pids):
+        """Delete the Chamo keys of several holdings.
+
+        The keys are deleted in the current transaction.
+
+        :param holding_pids: list of holding pids.
+        """
+        if not holding_pids:
+            return
+        cls.query.filter(
+            cls.holding_pid.in_([str(pid) for pid in holding_pids])
+        ).delete(synchronize_session=False)
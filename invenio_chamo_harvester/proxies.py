@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2019 UCLouvain.
+#
+# Invenio-Chamo-Harvester is free software; you can redistribute it and/or
+# modify it under the terms of the MIT License; see LICENSE file for more
+# details.
+
+"""Proxy objects for easier access to application objects."""
+
+from __future__ import absolute_import, print_function
+
+from flask import current_app
+from werkzeug.local import LocalProxy
+
+current_chamo_harvester = LocalProxy(
+    lambda: current_app.extensions['invenio-chamo-harvester'])
+"""Proxy to the current Invenio-Chamo-Harvester extension."""
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2019 UCLouvain.
+#
+# Invenio-Chamo-Harvester is free software; you can redistribute it and/or
+# modify it under the terms of the MIT License; see LICENSE file for more
+# details.
+
+"""Cached JSON schemas and validators of the harvested records."""
+
+from __future__ import absolute_import, print_function
+
+from functools import lru_cache
+
+from invenio_jsonschemas import current_jsonschemas
+from jsonschema.validators import validator_for
+
+DOCUMENT_SCHEMA = 'documents/document-v0.0.1.json'
+"""Path of the RERO ILS document JSON schema."""
+
+HOLDING_SCHEMA = 'holdings/holding-v0.0.1.json'
+"""Path of the RERO ILS holding JSON schema."""
+
+ITEM_SCHEMA = 'items/item-v0.0.1.json'
+"""Path of the RERO ILS item JSON schema."""
+
+
+@lru_cache(maxsize=None)
+def schema_url(path):
+    """URL of a JSON schema, computed once per process.
+
+    :param path: path of the schema, for example :data:`DOCUMENT_SCHEMA`.
+    """
+    return current_jsonschemas.path_to_url(path)
+
+
+@lru_cache(maxsize=None)
+def get_validator(url):
+    """Validator of a JSON schema, compiled once per process.
+
+    The references of the schema are resolved when it is loaded, records
+    are then validated without any schema lookup.
+
+    :param url: URL of the schema, the ``$schema`` of a record.
+    """
+    schema = current_jsonschemas.get_schema(
+        current_jsonschemas.url_to_path(url), with_refs=True, resolved=True)
+    return validator_for(schema)(schema)
+
+
+def validate(data):
+    """Validate record data against its ``$schema``.
+
+    :raises jsonschema.ValidationError: if the data is not valid.
+    """
+    get_validator(data['$schema']).validate(data)
+
+
+def validate_batch(records):
+    """Validate the data of several records.
+
+    :param records: iterable of record data.
+    :returns: list of the validation errors, ``None`` for valid records.
+    """
+    errors = []
+    for data in records:
+        try:
+            validate(data)
+            errors.append(None)
+        except Exception as e:
+            errors.append(e)
+    return errors
+
+
+class CachedValidator(object):
+    """Validator class using the compiled validator of a record schema.
+
+    Given as ``validator`` to the creation of records, it replaces the
+    validator built by Invenio-Records with a new reference resolver for
+    each record.
+    """
+
+    def __init__(self, schema, *args, **kwargs):
+        """Initialize validator.
+
+        :param schema: the ``{'$ref': url}`` schema given by
+            Invenio-Records.
+        """
+        self.schema = schema
+
+    @classmethod
+    def check_schema(cls, schema):
+        """The schema was checked when compiled."""
+
+    def iter_errors(self, instance):
+        """Iterate the validation errors of a record."""
+        return get_validator(self.schema['$ref']).iter_errors(instance)
+
+    def validate(self, instance):
+        """Validate a record."""
+        get_validator(self.schema['$ref']).validate(instance)
+
+
+class ValidatedBatch(CachedValidator):
+    """Validator class of records already validated with their batch."""
+
+    def iter_errors(self, instance):
+        """No error, see :func:`validate_batch`."""
+        return iter(())
+
+    def validate(self, instance):
+        """Nothing to validate, see :func:`validate_batch`."""
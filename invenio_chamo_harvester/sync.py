@@ -0,0 +1,270 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2019 UCLouvain.
+#
+# Invenio-Chamo-Harvester is free software; you can redistribute it and/or
+# modify it under the terms of the MIT License; see LICENSE file for more
+# details.
+
+"""Update and deletion of the harvested documents, holdings and items."""
+
+from __future__ import absolute_import, print_function
+
+from copy import deepcopy
+
+from flask import current_app
+from invenio_db import db
+from invenio_indexer.proxies import current_record_to_index
+from rero_ils.modules.documents.api import Document
+from rero_ils.modules.holdings.api import Holding
+from rero_ils.modules.items.api import Item
+from rero_ils.modules.items.models import ItemIdentifier
+
+from .models import ChamoHoldingKey
+from .schemas import HOLDING_SCHEMA, ITEM_SCHEMA, CachedValidator, \
+    schema_url
+from .utils import build_holding, build_item, chamo_holding_key, \
+    get_records_by_document_refs, get_records_by_pids, holding_key, \
+    item_holding_key
+
+
+def record_key(record):
+    """Key of a RERO ILS holding: its location and circulation category."""
+    return (record.get('location', {}).get('$ref'),
+            record.get('circulation_category', {}).get('$ref'))
+
+
+def item_key(item):
+    """Key of an item: its barcode, or its Chamo pid without barcode."""
+    return item.get('barcode') or 'pid:{pid}'.format(pid=item.get('pid'))
+
+
+def has_changed(record, data):
+    """Check if a record differs from new data.
+
+    Only the keys of ``data`` are compared, the properties managed by
+    RERO ILS, like the circulation status of items, are kept.
+    """
+    return any(record.get(key) != value for key, value in data.items())
+
+
+class HoldingsItemsSync(object):
+    """Create, replace or delete the holdings and items of documents.
+
+    Holdings are matched by their Chamo ``location#cica`` key, stored
+    when they are created, items by barcode, or by pid when they have
+    none. Holdings harvested before their key was stored are matched by
+    location and circulation category. Only the records that changed
+    are written. Records no longer in Chamo are deleted unless RERO ILS
+    gives reasons not to, like the loans of an item.
+    """
+
+    def __init__(self):
+        """Initialize synchronization."""
+        self.holding_schema = schema_url(HOLDING_SCHEMA)
+        self.item_schema = schema_url(ITEM_SCHEMA)
+        self.url_api = '{host}/api/{{doc_type}}/{{pid}}'.format(
+            host=current_app.config.get('RERO_ILS_APP_URL'))
+        self._holdings = {}
+        self._items = {}
+        self._keys = {}
+
+    def document_ref(self, document_pid):
+        """The ``$ref`` url of a document."""
+        return self.url_api.format(doc_type='documents', pid=document_pid)
+
+    def prefetch(self, document_pids):
+        """Load the holdings and items of several documents.
+
+        :param document_pids: pids of the documents of a batch.
+        """
+        refs = [self.document_ref(pid) for pid in document_pids]
+        self._holdings = get_records_by_document_refs(Holding, 'hold', refs)
+        self._items = get_records_by_document_refs(Item, 'item', refs)
+        self._keys = ChamoHoldingKey.get_keys([
+            record.get('pid')
+            for records in self._holdings.values() for record in records
+        ])
+
+    def sync(self, document_pid, holdings, items):
+        """Synchronize the holdings and items of a document.
+
+        :param document_pid: pid of the document.
+        :param holdings: Chamo holdings of the record.
+        :param items: Chamo items of the record.
+        :returns: dictionary of the record uuids to index by doc type,
+            'hold' and 'item', the written records in 'records', the number
+            of deleted records and the list of (index, doc_type, uuid) of
+            the deleted records in 'unindex', to remove from Elasticsearch
+            once committed.
+        """
+        document_ref = self.document_ref(document_pid)
+        changes = {'hold': [], 'item': [], 'records': [], 'deleted': 0,
+                   'unindex': []}
+
+        # HOLDINGS
+        existing = {}
+        unkeyed = []
+        for record in self._holdings.pop(document_ref, []):
+            key = self._keys.get(record.get('pid'))
+            if key is None:
+                unkeyed.append(record)
+            else:
+                existing.setdefault(key, []).append(record)
+        holding_refs = {}
+        new_keys = {}
+        for holding in holdings:
+            data = build_holding(holding, document_ref, self.holding_schema)
+            key = chamo_holding_key(holding)
+            record = existing[key].pop(0) if existing.get(key) else None
+            if record is None:
+                # holding harvested before its Chamo key was stored
+                record = next((
+                    record for record in unkeyed
+                    if record_key(record) == record_key(data)), None)
+                if record is not None:
+                    unkeyed.remove(record)
+                    new_keys[record.get('pid')] = key
+            if record is None:
+                record = Holding.create(data, dbcommit=False, reindex=False,
+                                        validator=CachedValidator)
+                new_keys[record.get('pid')] = key
+                changes['hold'].append(record.id)
+                changes['records'].append(record)
+            elif has_changed(record, data):
+                new_data = deepcopy(dict(record))
+                new_data.update(data)
+                record = record.replace(new_data, dbcommit=False,
+                                        reindex=False)
+                changes['hold'].append(record.id)
+                changes['records'].append(record)
+            holding_refs[holding_key(holding)] = self.url_api.format(
+                doc_type='holdings', pid=record.get('pid'))
+        ChamoHoldingKey.set_keys(new_keys)
+        removed_holdings = unkeyed + [
+            record for records in existing.values() for record in records]
+
+        # ITEMS
+        existing_items = {
+            item_key(record): record
+            for record in self._items.pop(document_ref, [])
+        }
+        for item in items:
+            data = build_item(item, document_ref, self.item_schema)
+            data['holding'] = {
+                '$ref': holding_refs.get(
+                    item_holding_key(item),
+                    self.url_api.format(doc_type='holdings', pid=None))
+            }
+            record = existing_items.pop(item_key(item), None)
+            if record is None:
+                record = Item.create(data, dbcommit=False, reindex=False,
+                                     validator=CachedValidator)
+                db.session.add(ItemIdentifier(recid=record.get('pid')))
+                changes['item'].append(record.id)
+                changes['records'].append(record)
+            elif has_changed(record, data):
+                new_data = deepcopy(dict(record))
+                new_data.update(data)
+                record = record.replace(new_data, dbcommit=False,
+                                        reindex=False)
+                changes['item'].append(record.id)
+                changes['records'].append(record)
+
+        # DELETIONS, items first as they are linked to the holdings
+        deleted_holdings = []
+        for record in list(existing_items.values()) + removed_holdings:
+            reasons = record.reasons_not_to_delete()
+            if reasons:
+                current_app.logger.warning(
+                    'Not deleting {pid_type} {pid} of document {document}: '
+                    '{reasons}'.format(
+                        pid_type=record.provider.pid_type,
+                        pid=record.get('pid'), document=document_pid,
+                        reasons=reasons))
+                continue
+            changes['unindex'].append(
+                current_record_to_index(record) + (record.id,))
+            record.delete(dbcommit=False, delindex=False)
+            if record.provider.pid_type == 'hold':
+                deleted_holdings.append(record.get('pid'))
+            changes['deleted'] += 1
+        ChamoHoldingKey.delete_keys(deleted_holdings)
+        return changes
+
+
+def reasons_not_to_delete(record):
+    """Reasons not to delete a harvested record with its document.
+
+    The links of a document to its holdings and of a holding to its items
+    are not reasons: they are deleted together. The links of an item, its
+    loans, are.
+    """
+    reasons = dict(record.reasons_not_to_delete() or {})
+    if record.provider.pid_type != 'item':
+        reasons.pop('links', None)
+    return reasons
+
+
+def delete_documents(document_pids):
+    """Delete documents with their holdings and items.
+
+    The records of the whole batch are loaded with a few queries. A
+    document is kept, with all its holdings and items, when RERO ILS gives
+    reasons not to delete one of them, like the loans of an item. The
+    others are deleted in the current transaction, each one in its own
+    savepoint.
+
+    :param document_pids: pids of the documents to delete.
+    :returns: the number of deleted documents, the pids of the kept
+        documents and the list of (index, doc_type, uuid) of the deleted
+        records, to remove from Elasticsearch once committed.
+    """
+    documents = get_records_by_pids(Document, 'doc', document_pids)
+    if not documents:
+        return 0, [], []
+    url_api = '{host}/api/documents/{{pid}}'.format(
+        host=current_app.config.get('RERO_ILS_APP_URL'))
+    refs = {pid: url_api.format(pid=pid) for pid in documents}
+    linked = {}
+    for record_cls, pid_type in ((Item, 'item'), (Holding, 'hold')):
+        for ref, records in get_records_by_document_refs(
+                record_cls, pid_type, list(refs.values())).items():
+            linked.setdefault(ref, []).extend(records)
+    n_deleted = 0
+    kept = []
+    entries = []
+    for pid, document in documents.items():
+        # items first as they are linked to the holdings
+        records = linked.get(refs[pid], []) + [document]
+        blocked = {}
+        for record in records:
+            reasons = reasons_not_to_delete(record)
+            if reasons:
+                blocked['{pid_type} {pid}'.format(
+                    pid_type=record.provider.pid_type,
+                    pid=record.get('pid'))] = reasons
+        if blocked:
+            current_app.logger.warning(
+                'Not deleting document {pid}: {blocked}'.format(
+                    pid=pid, blocked=blocked))
+            kept.append(pid)
+            continue
+        try:
+            with db.session.begin_nested():
+                for record in records:
+                    record.delete(dbcommit=False, delindex=False)
+                ChamoHoldingKey.delete_keys([
+                    record.get('pid') for record in records
+                    if record.provider.pid_type == 'hold'])
+        except Exception as e:
+            current_app.logger.error(
+                'Error deleting document {pid} : {e}'.format(pid=pid, e=e),
+                exc_info=True)
+            kept.append(pid)
+            continue
+        entries.extend(
+            current_record_to_index(record) + (record.id,)
+            for record in records)
+        n_deleted += 1
+    return n_deleted, kept, entries
@@ -23,7 +23,6 @@ from copy import deepcopy
 from flask import current_app
 from invenio_db import db
 from rero_ils.modules.api import IlsRecordsIndexer
-from invenio_jsonschemas import current_jsonschemas
 from invenio_pidstore.models import PersistentIdentifier
 from rero_ils.modules.documents.api import Document, DocumentsSearch
 from rero_ils.modules.documents.models import DocumentIdentifier
@@ -31,10 +30,24 @@ from rero_ils.modules.holdings.api import Holding
 from rero_ils.modules.holdings.models import HoldingIdentifier
 from rero_ils.modules.items.api import Item
 from rero_ils.modules.items.models import ItemIdentifier
-from .utils import get_max_record_pid
 
-from .api import ChamoRecordHarvester
-from .utils import extract_records_id, map_item_type, map_locations
+from .api import ChamoRecordHarvester, ContributionLinkEnricher
+from .benchmark import peak_rss
+from .dojson.contrib.marc21 import marc21
+from .errors import ChamoApiError, TooManyDeletionsError
+from .indexing import IndexingWorker, MemoryIndexer, RecordIdsIndexer, \
+    batch_entries, snapshot_entries, unindex_records
+from .loader import BulkRecordLoader
+from .mef import MISSING, resolve_person_links
+from .models import ChamoHoldingKey, ChamoRecordDigest
+from .proxies import current_chamo_harvester
+from .schemas import DOCUMENT_SCHEMA, HOLDING_SCHEMA, ITEM_SCHEMA, \
+    CachedValidator, ValidatedBatch, schema_url, validate_batch
+from .sync import HoldingsItemsSync, delete_documents
+from .utils import IDENTIFIER_CLASSES, FlushPolicy, advance_sequence, \
+    canonical_json, chamo_holding_key, extract_records_id, \
+    get_max_record_pid, get_records_by_pids, has_items, holding_key, \
+    index_items, item_holding_key, map_item_type, map_locations
 
 
 @shared_task(ignore_result=True)
@@ -45,53 +58,118 @@ def process_bulk_queue(bulk_kwargs=None):
     Note: You can start multiple versions of this task.
     """
     ChamoRecordHarvester().process_bulk_queue(bulk_kwargs)
+    if marc21.profiler is not None:
+        current_app.logger.info('conversion rules profile:\n{report}'.format(
+            report=marc21.disable_profiling().report()))
 
 
 @shared_task(ignore_result=True)
-def queue_records_to_harvest(size=1000, next_id=None, modified_since=None,
-                             verbose=False):
-    """Queue records to harvest from Chamo Rest API."""
+def process_enrich_queue():
+    """Process the contribution MEF links queue.
+
+    Note: You can start multiple versions of this task.
+    """
+    ContributionLinkEnricher().process_bulk_queue()
+
+
+def bibs_uri(size=1000, next_id=None):
+    """Url of the first page of the Chamo bibs listing.
+
+    :param size: number of ids of each page of the Chamo Rest API.
+    :param next_id: first bib id.
+    """
     uri = '{base_url}/{route}?all=true&batchSize={size}'.format(
         base_url=current_app.config['CHAMO_HARVESTER_CHAMO_BASE_URL'],
         route='bibs',
         size=size)
     if next_id:
         uri += '&next={next_id}'.format(next_id=next_id)
-    if verbose:
-        click.echo('Get records from {uri}'.format(uri=uri))
+    return uri
 
-    try:
-        count = 0
-        request = requests.get(uri, auth=(
-            current_app.config['CHAMO_HARVESTER_CHAMO_USER'],
-            current_app.config['CHAMO_HARVESTER_CHAMO_PASSWORD']))
+
+def chamo_bib_pages(size=1000, next_id=None, verbose=False):
+    """Iterate the ids of all Chamo bibs, page by page.
+
+    :param size: number of ids of each page of the Chamo Rest API.
+    :param next_id: first bib id.
+    :param verbose: display the url of each page.
+    :returns: iterator of lists of bib ids.
+    :raises ChamoApiError: if a page is not a list of bib links.
+    """
+    uri = bibs_uri(size, next_id)
+    auth = (current_app.config['CHAMO_HARVESTER_CHAMO_USER'],
+            current_app.config['CHAMO_HARVESTER_CHAMO_PASSWORD'])
+    while uri:
+        if verbose:
+            click.echo('Get records from {uri}'.format(uri=uri))
+        request = requests.get(uri, auth=auth)
+        request.raise_for_status()
         data = request.json()
+        if not isinstance(data, dict) or \
+                not isinstance(data.get('links'), list):
+            raise ChamoApiError(
+                'Unexpected bibs page {uri}: {data}'.format(
+                    uri=uri, data=str(data)[:200]))
+        yield extract_records_id(data)
+        uri = data.get('next')
+
 
-        next = data.get('next', {})
-        while next:
-            records = extract_records_id(data)
+@shared_task(ignore_result=True)
+def queue_records_to_harvest(size=1000, next_id=None, modified_since=None,
+                             verbose=False):
+    """Queue records to harvest from Chamo Rest API."""
+    try:
+        count = 0
+        for records in chamo_bib_pages(size, next_id, verbose):
             if verbose:
                 click.echo('List records :  {records}'.format(records=records))
             ChamoRecordHarvester().bulk_to_harvest(records)
             count += len(records)
-
-            request = requests.get(next, auth=(
-                current_app.config['CHAMO_HARVESTER_CHAMO_USER'],
-                current_app.config['CHAMO_HARVESTER_CHAMO_PASSWORD']))
-            data = request.json()
-            next = data.get('next', None)
-        records = extract_records_id(data)
-        if verbose:
-            click.echo('List records :  {records}'.format(records=records))
-        ChamoRecordHarvester().bulk_to_harvest(records)
-        count += len(records)
         return count
     except Exception as e:
         click.secho(
             'Harvesting API Error: {e}'.format(e=e),
             fg='red'
         )
-        return 0, uri, []
+        return 0, bibs_uri(size, next_id), []
+
+
+@shared_task(ignore_result=True)
+def queue_records_to_delete(size=1000, verbose=False, max_ratio=None):
+    """Queue the harvested records no longer listed by Chamo.
+
+    The bibs harvested so far, known by their digest, are compared with
+    all the bibs of the Chamo Rest API. Masked bibs are deleted when they
+    are harvested.
+
+    :param size: number of ids of each page of the Chamo Rest API.
+    :param verbose: display the records to delete.
+    :param max_ratio: maximum fraction of the harvested records to delete,
+        ``CHAMO_HARVESTER_DELETE_MAX_RATIO`` by default.
+    :returns: number of queued records.
+    :raises TooManyDeletionsError: if more records would be deleted.
+    """
+    if max_ratio is None:
+        max_ratio = current_app.config['CHAMO_HARVESTER_DELETE_MAX_RATIO']
+    chamo_ids = set(
+        str(bib_id).strip()
+        for records in chamo_bib_pages(size) for bib_id in records
+    )
+    if not chamo_ids:
+        # an empty list is an API failure, not a deleted catalogue
+        return 0
+    total = 0
+    records = []
+    for bib_id in ChamoRecordDigest.get_bib_ids():
+        total += 1
+        if bib_id not in chamo_ids:
+            records.append(bib_id)
+    if len(records) > max_ratio * total:
+        raise TooManyDeletionsError(len(records), total, max_ratio)
+    if verbose:
+        click.echo('Deleted records :  {records}'.format(records=records))
+    ChamoRecordHarvester().bulk_to_delete(records)
+    return len(records)
 
 
 @shared_task(ignore_result=True)
@@ -118,14 +196,31 @@ def bulk_records(records, bulk_kwargs=None):
     bulk_size = current_app.config['CHAMO_HARVESTER_BULK_SIZE']
     initial_import = bulk_kwargs.pop('initial_load')
     bulk_index = bulk_kwargs.pop('bulk_index')
+    with_resync = bulk_kwargs.pop('resync_sequences', True)
+    on_commit = bulk_kwargs.pop('on_commit', None)
+    deferred_validation = current_app.config[
+        'CHAMO_HARVESTER_DEFERRED_VALIDATION']
+    bounded_memory = bulk_kwargs.pop('bounded_memory', False) or \
+        current_app.config['CHAMO_HARVESTER_BOUNDED_MEMORY']
+    document_validator = ValidatedBatch if deferred_validation \
+        else CachedValidator
+    loader = None
+    if initial_import and bulk_kwargs.pop('bulk_load', False):
+        loader = BulkRecordLoader(validate_documents=not deferred_validation)
+    holdings_items_sync = None if initial_import else HoldingsItemsSync()
     current_app.logger.info('harverster bulk size : {size}'.format(
         size=bulk_size))
     n_updated = 0
     n_rejected = 0
     n_created = 0
-    record_schema = current_jsonschemas.path_to_url('documents/document-v0.0.1.json')
-    item_schema = current_jsonschemas.path_to_url('items/item-v0.0.1.json')
-    holding_schema = current_jsonschemas.path_to_url('holdings/holding-v0.0.1.json')
+    n_skipped = 0
+    n_deleted = 0
+    n_unchanged = 0
+    n_deleted_documents = 0
+    n_processed = 0
+    record_schema = schema_url(DOCUMENT_SCHEMA)
+    item_schema = schema_url(ITEM_SCHEMA)
+    holding_schema = schema_url(HOLDING_SCHEMA)
     host_url = current_app.config.get('RERO_ILS_APP_URL')
     url_api = '{host}/api/{doc_type}/{pid}'
     required = ['pid', 'type', 'title', 'language']
@@ -134,52 +229,177 @@ def bulk_records(records, bulk_kwargs=None):
     record_id_iterator = []
     item_id_iterator = []
     holding_id_iterator = []
-    indexer = IlsRecordsIndexer()
+    documents_links = []
+    digests = {}
+    deletions = {}
+    blocked_deletions = []
+    unindex_entries = []
+    written_records = {}
+    indexing_worker = None
+    if bulk_index:
+        indexing_worker = IndexingWorker(
+            current_app._get_current_object(),
+            maxsize=1 if bounded_memory else
+            current_app.config['CHAMO_HARVESTER_INDEXING_QUEUE_SIZE'],
+            indexer_cls=MemoryIndexer
+            if current_app.config['CHAMO_HARVESTER_INDEX_FROM_MEMORY']
+            else RecordIdsIndexer
+        )
+        indexing_worker.start()
+    flush_policy = FlushPolicy(
+        max_records=bulk_size,
+        max_bytes=current_app.config['CHAMO_HARVESTER_FLUSH_BYTES'],
+        max_interval=current_app.config['CHAMO_HARVESTER_FLUSH_INTERVAL']
+    )
+
+    def flush():
+        """Commit the written records, then queue their indexing."""
+        nonlocal n_created, n_rejected, n_deleted_documents, n_processed
+        start = time.time()
+        if loader is not None and len(loader):
+            record_ids = loader.flush()
+            record_id_iterator.extend(record_ids['doc'])
+            holding_id_iterator.extend(record_ids['hold'])
+            item_id_iterator.extend(record_ids['item'])
+            rejected_pids = set()
+            for key, pid in loader.rejected:
+                digests.pop(key, None)
+                rejected_pids.add(pid)
+            documents_links[:] = [
+                link for link in documents_links
+                if link[0] not in rejected_pids
+            ]
+            n_created -= len(loader.rejected)
+            n_rejected += len(loader.rejected)
+        unindex = list(unindex_entries)
+        unindex_entries.clear()
+        if deletions:
+            n_documents, kept, entries = delete_documents(
+                list(deletions.values()))
+            unindex.extend(entries)
+            kept = set(kept)
+            for bib_id, pid in deletions.items():
+                if pid in kept:
+                    blocked_deletions.append(bib_id)
+            ChamoRecordDigest.delete_digests([
+                bib_id for bib_id, pid in deletions.items()
+                if pid not in kept])
+            n_deleted_documents += n_documents
+            deletions.clear()
+        ChamoRecordDigest.set_digests(digests)
+        digests.clear()
+        entries = indexing_entries(indexing_worker, holding_id_iterator,
+                                   item_id_iterator, record_id_iterator,
+                                   loader, written_records)
+        written_records.clear()
+        db.session.commit()
+        if on_commit is not None:
+            on_commit(n_processed)
+        n_processed = 0
+        unindex_records(unindex)
+        if documents_links:
+            ContributionLinkEnricher().bulk_to_enrich(documents_links)
+            documents_links.clear()
+        if indexing_worker is not None:
+            indexing_worker.submit(entries)
+        record_id_iterator.clear()
+        holding_id_iterator.clear()
+        item_id_iterator.clear()
+        if bounded_memory:
+            # nothing refers to the committed records any more
+            db.session.expunge_all()
+        current_app.logger.info(
+            'flushed {records} records ({size} bytes) in {duration:.3f}s, '
+            'peak RSS: {rss:.0f} MB'.format(
+                records=flush_policy.records, size=flush_policy.bytes,
+                duration=time.time() - start, rss=peak_rss() or 0))
+        flush_policy.reset()
+
+    def keep(written_record):
+        """Keep a written record until it is indexed from memory."""
+        if indexing_worker is not None and indexing_worker.from_memory:
+            written_records[written_record.id] = written_record
+
+    def before_batch():
+        """Flush between two conversion batches in bounded memory mode."""
+        if flush_policy.due():
+            flush()
+
     start_time = datetime.now()
-    for record in records:
+    for record, rec in with_existing_documents(
+            records, initial_import, holdings_items_sync,
+            deferred_validation,
+            before_batch=before_batch if bounded_memory else None):
+        if not bounded_memory and flush_policy.due():
+            flush()
+        flush_policy.add(record.get('size', 0))
+        n_processed += 1
+        if record.get('_op_type') == 'skip':
+            # same MARC, items and holdings as the last harvest
+            n_skipped += 1
+            continue
+        if record.get('_op_type') == 'delete':
+            # deleted or masked in Chamo, deleted by the next flush
+            deletions[record.get('_id')] = record.get('pid')
+            continue
+        if record.get('frbr'):
+            continue
+            # raise Exception('FRBR record cannot be processed')
+        # a failing record rolls back to its savepoint only
+        written = (len(record_id_iterator), len(holding_id_iterator),
+                   len(item_id_iterator), len(documents_links),
+                   len(unindex_entries))
+        savepoint = db.session.begin_nested()
         try:
-            if record.get('frbr'):
-                continue
-                # raise Exception('FRBR record cannot be processed')
-            # TODO: check chamo:2033646 => record is masked
-            if record.get('masked'):
-                continue
-                # raise Exception('masked record will be not processed')
             document = record.get('document', {})
             if not all(elem in document.keys() for elem in required):
                 raise Exception('missing required {f} properties for record'
                                 .format(f=required))
+            if record.get('invalid') is not None:
+                raise record['invalid']
 
-            # TODO: create task to update records
-            if not initial_import:
-                # check if already in Rero-ILS
-                rec = Document.get_record_by_pid(document.get('pid'))
-
-                if rec:
-                    # UPDATE DOCUMENT
-                    # doc_pid = rec.get('pid')
-                    # for ite_obj in Item.get_items_pid_by_document_pid(doc_pid):
-                    #     try:
-                    #         item_pid = ite_obj.get('value')
-                    #         item = Item.get_record_by_pid(item_pid)
-                    #         if item:
-                    #             item.delete(force=True, dbcommit=True, delindex=True)
-                    #         else :
-                    #             # TODO: delete by id
-                    #             pass
-                    #     except Exception as e:
-                    #         print('ERROR deleting item:', e)
-                    #         pass
-
-                    # update document
-                    document['$schema'] = record_schema
+            if rec is not None:
+                # UPDATE DOCUMENT, HOLDINGS AND ITEMS
+                document['$schema'] = record_schema
+                if canonical_json(rec) == canonical_json(document):
+                    # same JSON as stored: no new revision, no reindex
+                    n_unchanged += 1
+                else:
                     current_app.logger.info('update document')
-                    document = rec.replace(
+                    rec = rec.replace(
                         document,
                         dbcommit=False,
                         reindex=False
                     )
-                    record_id_iterator.append(document.id)
+                    record_id_iterator.append(rec.id)
+                    keep(rec)
+                changes = holdings_items_sync.sync(
+                    document.get('pid'),
+                    record.get('holdings') or [],
+                    record.get('items') or []
+                )
+                holding_id_iterator.extend(changes['hold'])
+                item_id_iterator.extend(changes['item'])
+                for written_record in changes['records']:
+                    keep(written_record)
+                n_deleted += changes['deleted']
+                unindex_entries.extend(changes['unindex'])
+                if record.get('links'):
+                    documents_links.append(
+                        (document.get('pid'), record.get('links')))
+                if record.get('digest'):
+                    digests[record.get('_id')] = record.get('digest')
+                n_updated += 1
+            elif loader is not None:
+                # NEW DOCUMENT, written by the next bulk insert
+                loader.add(document, record.get('holdings') or [],
+                           record.get('items') or [], key=record.get('_id'))
+                if record.get('links'):
+                    documents_links.append(
+                        (document.get('pid'), record.get('links')))
+                if record.get('digest'):
+                    digests[record.get('_id')] = record.get('digest')
+                n_created += 1
             else:
                 # NEW DOCUMENT
                 document['$schema'] = record_schema
@@ -187,16 +407,22 @@ def bulk_records(records, bulk_kwargs=None):
                 document = Document.create(
                     document,
                     dbcommit=False,
-                    reindex=False
+                    reindex=False,
+                    validator=document_validator
                 )
                 db.session.add(DocumentIdentifier(recid=document.get('pid')))
                 record_id_iterator.append(document.id)
+                keep(document)
+                if record.get('links'):
+                    documents_links.append(
+                        (document.get('pid'), record.get('links')))
                 uri_documents = url_api.format(host=host_url,
                                             doc_type='documents',
                                             pid=document.get('pid'))
 
                 # HOLDINGS
                 map_holdings = {}
+                holding_keys = {}
                 items = record.get('items', [])
                 for holding in record.get('holdings'):
                     new_holding = deepcopy(holding)
@@ -212,21 +438,22 @@ def bulk_records(records, bulk_kwargs=None):
                     new_holding['location'] = {
                         '$ref': map_locations(str(holding.get('location')))
                     }
-                    holding_map = '{location}#{cica}'.format(
-                                location=holding.get('location'),
-                                cica=holding.get('circulation_category'))
-
                     result = Holding.create(
                         new_holding,
                         dbcommit=False,
-                        reindex=False
+                        reindex=False,
+                        validator=CachedValidator
                     )
 
-                    map_holdings.update({
-                            holding_map: result.get('pid')
-                        }
-                    )
+                    holding_keys[result.get('pid')] = \
+                        chamo_holding_key(holding)
+                    map_holdings[holding_key(holding)] = url_api.format(
+                        host=host_url,
+                        doc_type='holdings',
+                        pid=result.get('pid'))
                     holding_id_iterator.append(result.id)
+                    keep(result)
+                ChamoHoldingKey.set_keys(holding_keys)
 
                 # ITEMS
                 for item in items:
@@ -242,11 +469,8 @@ def bulk_records(records, bulk_kwargs=None):
                         '$ref': map_locations(str(item.get('location')))
                         }
 
-                    holding_pid = map_holdings.get(
-                        '{location}#{cica}'.format(
-                            location=item.get('location'),
-                            cica=item.get('item_type')))
-                    if holding_pid is None:
+                    holding_ref = map_holdings.get(item_holding_key(item))
+                    if holding_ref is None:
                         click.secho('holding pid is None for record : {id} '.format(
                             id=document.pid
                         ), fg='red')
@@ -255,22 +479,37 @@ def bulk_records(records, bulk_kwargs=None):
                         click.secho('item to map : {location}#{cica}'.format(
                             location=item.get('location'),
                             cica=item.get('item_type')), fg='yellow')
-                    new_item['holding'] = {
-                        '$ref': url_api.format(
+                        holding_ref = url_api.format(
                             host=host_url,
                             doc_type='holdings',
-                            pid=holding_pid)
+                            pid=None)
+                    new_item['holding'] = {
+                        '$ref': holding_ref
                         }
                     result = Item.create(
                         new_item,
                         dbcommit=False,
-                        reindex=False
+                        reindex=False,
+                        validator=CachedValidator
                     )
                     db.session.add(
                         ItemIdentifier(recid=result.get('pid')))
                     item_id_iterator.append(result.id)
+                    keep(result)
+                if record.get('digest'):
+                    digests[record.get('_id')] = record.get('digest')
                 n_created += 1
+            savepoint.commit()
         except Exception as e:
+            savepoint.rollback()
+            del record_id_iterator[written[0]:]
+            del holding_id_iterator[written[1]:]
+            del item_id_iterator[written[2]:]
+            del documents_links[written[3]:]
+            del unindex_entries[written[4]:]
+            digests.pop(record.get('_id'), None)
+            # its message is rejected instead of acknowledged
+            record['rejected'] = True
             n_rejected += 1
             traceback.print_exc()
             current_app.logger.error(
@@ -279,51 +518,247 @@ def bulk_records(records, bulk_kwargs=None):
                     e=str(e)
                 ), exc_info=True
             )
-        # db.session.flush()
-        if n_created % bulk_size == 0:
-            db.session.commit()
-            if bulk_index:
-                # HOLDINGS
-                indexer.bulk_index(holding_id_iterator, doc_type='hold')
-                indexer.process_bulk_queue()
-                # ITEMS
-                indexer.bulk_index(item_id_iterator, doc_type='item')
-                indexer.process_bulk_queue()
-                # DOCUMENTS
-                indexer.bulk_index(record_id_iterator, doc_type='doc')
-                indexer.process_bulk_queue()
-
-            record_id_iterator.clear()
-            holding_id_iterator.clear()
-            item_id_iterator.clear()
 
     try:
-        db.session.commit()
-
-        if bulk_index:
-            indexer.bulk_index(holding_id_iterator, doc_type='hold')
-            indexer.process_bulk_queue()
-            indexer.bulk_index(item_id_iterator, doc_type='item')
-            indexer.process_bulk_queue()
-            indexer.bulk_index(record_id_iterator, doc_type='doc')
-            indexer.process_bulk_queue()
+        flush()
     except Exception as e:
         current_app.logger.error(e)
+    if indexing_worker is not None:
+        indexing_worker.close()
+    if blocked_deletions:
+        # deleted by a next harvest, once RERO ILS allows it
+        ChamoRecordHarvester().bulk_to_delete(blocked_deletions)
+
+    if with_resync:
+        resync_sequences()
+    current_app.logger.info(
+        'harvester records created: {created}, updated: {updated} '
+        '(documents unchanged: {unchanged}), unchanged: {skipped}, '
+        'rejected: {rejected}, documents deleted: {deleted_documents}, '
+        'documents not deleted: {blocked}, '
+        'holdings and items deleted: {deleted}, '
+        'peak RSS: {rss:.0f} MB'.format(
+            created=n_created,
+            updated=n_updated,
+            unchanged=n_unchanged,
+            skipped=n_skipped,
+            rejected=n_rejected,
+            deleted_documents=n_deleted_documents,
+            blocked=len(blocked_deletions),
+            deleted=n_deleted,
+            rss=peak_rss() or 0
+        ))
+    return n_created + n_updated
+
+
+def resync_sequences():
+    """Move the identifier sequences after the highest record pids.
+
+    Document and item pids come from Chamo and bypass the sequences. The
+    sequences only move forward, other harvesting tasks may be using them.
+    """
+    for pid_type, identifier_cls in IDENTIFIER_CLASSES.items():
+        max_recid = get_max_record_pid(pid_type)
+        if max_recid:
+            advance_sequence(identifier_cls, max_recid)
+    db.session.commit()
+
 
-    max_recid = get_max_record_pid('doc')
-    DocumentIdentifier._set_sequence(max_recid)
-    max_recid = get_max_record_pid('item')
-    ItemIdentifier._set_sequence(max_recid)
+def indexing_entries(indexing_worker, holding_ids, item_ids, record_ids,
+                     loader=None, records=None):
+    """Build the indexing entries of the records written since last commit.
+
+    :param indexing_worker: the :class:`IndexingWorker` or ``None``.
+    :param holding_ids: uuids of the written holdings.
+    :param item_ids: uuids of the written items.
+    :param record_ids: uuids of the written documents.
+    :param loader: the :class:`BulkRecordLoader` or ``None``.
+    :param records: dictionary of the records written through the record
+        API by uuid, see :func:`snapshot_entries`.
+    :returns: list of entries, ``None`` without indexing.
+    """
+    if indexing_worker is None:
+        return None
+    entries = batch_entries(holding_ids, item_ids, record_ids)
+    if indexing_worker.from_memory:
+        db.session.flush()
+        snapshot_entries(entries, loader.written if loader else None,
+                         records)
+    return entries
+
+
+def with_existing_documents(records, initial_import=False,
+                            holdings_items_sync=None,
+                            deferred_validation=False, before_batch=None):
+    """Iterate bulk actions with the existing document of each one.
+
+    The pids of a batch of actions are looked up with a single query,
+    which splits the batch into documents to create and to replace.
+
+    :param records: iterator of bulk actions.
+    :param initial_import: no document exists, nothing is looked up.
+    :param holdings_items_sync: a :class:`HoldingsItemsSync` loading the
+        holdings and items of the existing documents of each batch.
+    :param deferred_validation: validate the documents of each batch at
+        once, see :func:`validate_documents`.
+    :param before_batch: function called before a batch is looked up, when
+        the actions of the previous batches have been processed.
+    :returns: iterator of (action, existing document or ``None``).
+    """
+    size = current_app.config['CHAMO_HARVESTER_CONVERSION_BATCH_SIZE']
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= size:
+            if before_batch is not None:
+                before_batch()
+            for item in _with_existing_documents(batch, initial_import,
+                                                 holdings_items_sync,
+                                                 deferred_validation):
+                yield item
+            batch = []
+    if before_batch is not None:
+        before_batch()
+    for item in _with_existing_documents(batch, initial_import,
+                                         holdings_items_sync,
+                                         deferred_validation):
+        yield item
+
+
+def validate_documents(batch):
+    """Validate the documents of a batch of actions at once.
+
+    The validation error of an invalid document is stored in the
+    ``invalid`` key of its action.
+
+    :param batch: list of bulk actions.
+    """
+    harvested = [
+        record for record in batch
+        if record.get('_op_type') == 'harvest' and record.get('document')
+    ]
+    for record in harvested:
+        record['document']['$schema'] = schema_url(DOCUMENT_SCHEMA)
+    errors = validate_batch([record['document'] for record in harvested])
+    for record, error in zip(harvested, errors):
+        if error is not None:
+            record['invalid'] = error
+
+
+def _with_existing_documents(batch, initial_import, holdings_items_sync,
+                             deferred_validation=False):
+    """Pair the actions of a batch with their existing document."""
+    if deferred_validation:
+        validate_documents(batch)
+    existing = {}
+    if not initial_import:
+        existing = get_records_by_pids(Document, 'doc', [
+            record['document']['pid'] for record in batch
+            if (record.get('document') or {}).get('pid')
+        ])
+    if holdings_items_sync is not None and existing:
+        holdings_items_sync.prefetch(list(existing))
+    for record in batch:
+        pid = (record.get('document') or {}).get('pid')
+        yield record, existing.get(str(pid)) if pid else None
+
+
+def bulk_enrich_documents(messages):
+    """Add the deferred MEF links to the contributions of documents.
+
+    The VIAF pids of all messages are resolved together. Documents whose
+    links can not be resolved yet are published again at the end of the
+    queue, up to ``CHAMO_HARVESTER_ENRICH_MAX_RETRIES`` times. Each
+    document is patched in its own savepoint.
+
+    :param messages: list of enrichment messages.
+    :returns: number of enriched documents.
+    """
+    if not messages:
+        return 0
+    mef_cache = current_chamo_harvester.mef_cache
+    payloads = [message.decode() for message in messages]
+    try:
+        resolve_person_links(
+            [link['viaf_pid'] for payload in payloads
+             for link in payload.get('links', [])],
+            mef_cache,
+            current_app.config['CHAMO_HARVESTER_MEF_BATCH_SIZE']
+        )
+    except Exception as e:
+        current_app.logger.error('MEF batch resolution failed: {e}'.format(
+            e=str(e)))
+    record_id_iterator = []
+    processed = []
+    for message, payload in zip(messages, payloads):
+        written = len(record_id_iterator)
+        savepoint = db.session.begin_nested()
+        try:
+            unresolved = False
+            document = Document.get_record_by_pid(payload['id'])
+            if document:
+                data = document.dumps()
+                changed = False
+                for link in payload.get('links', []):
+                    ref = mef_cache.get(link['viaf_pid'])
+                    if ref is MISSING:
+                        unresolved = True
+                        continue
+                    for contribution in data.get('contribution', []):
+                        if ref and contribution.get('agent') == link['agent']:
+                            contribution['agent'] = {'$ref': ref}
+                            changed = True
+                if changed:
+                    document = document.replace(
+                        data,
+                        dbcommit=False,
+                        reindex=False
+                    )
+                    record_id_iterator.append(document.id)
+            savepoint.commit()
+            processed.append((message, payload, unresolved))
+        except Exception as e:
+            savepoint.rollback()
+            del record_id_iterator[written:]
+            message.reject()
+            current_app.logger.error(
+                'Error enriching document [{id}] : {e}'.format(
+                    id=payload.get('id'),
+                    e=str(e)
+                ), exc_info=True
+            )
     db.session.commit()
-    return n_created
+    max_retries = current_app.config['CHAMO_HARVESTER_ENRICH_MAX_RETRIES']
+    retries = {}
+    for message, payload, unresolved in processed:
+        if not unresolved:
+            continue
+        count = payload.get('retries', 0) + 1
+        if count > max_retries:
+            current_app.logger.warning(
+                'Giving up MEF links of document {id} after {count} '
+                'retries'.format(id=payload.get('id'), count=max_retries))
+            continue
+        retries.setdefault(count, []).append(
+            (payload['id'], payload.get('links', [])))
+    for count, documents_links in retries.items():
+        ContributionLinkEnricher().bulk_to_enrich(documents_links,
+                                                  retries=count)
+    for message, _, _ in processed:
+        message.ack()
+    if record_id_iterator:
+        indexer = IlsRecordsIndexer()
+        indexer.bulk_index(record_id_iterator, doc_type='doc')
+        indexer.process_bulk_queue()
+    return len(record_id_iterator)
 
 
 @shared_task(ignore_result=True)
 def bulk_record(record):
     """Records creation."""
-    record_schema = current_jsonschemas.path_to_url('documents/document-v0.0.1.json')
-    item_schema = current_jsonschemas.path_to_url('items/item-v0.0.1.json')
-    holding_schema = current_jsonschemas.path_to_url('holdings/holding-v0.0.1.json')
+    record_schema = schema_url(DOCUMENT_SCHEMA)
+    item_schema = schema_url(ITEM_SCHEMA)
+    holding_schema = schema_url(HOLDING_SCHEMA)
     host_url = current_app.config.get('RERO_ILS_APP_URL')
     url_api = '{host}/api/{doc_type}/{pid}'
     required = ['pid', 'type', 'title', 'language']
@@ -345,6 +780,7 @@ def bulk_record(record):
                                         pid=document.get('pid'))
 
         document_type = document.get('type')
+        items_index = index_items(record.items)
         map_holdings = {}
         holdings = []
         for idx, holding in enumerate(record.holdings):
@@ -359,20 +795,13 @@ def bulk_record(record):
             new_holding['location'] = {
                 '$ref': map_locations(str(holding.get('location')))
                 }
-            holding_map = '{location}#{cica}'.format(
-                location=holding.get('location'),
-                cica=holding.get('circulation_category'))
-
             # holding without items must be serial
             holdings_type = 'serial' \
                 if document_type == 'journal' \
-                and not has_items(holding_map, record.items) else 'standard'
+                and not has_items(holding, items_index) else 'standard'
             new_holding['holdings_type'] = holdings_type
 
-            map_holdings.update({
-                    holding_map: idx
-                }
-            )
+            map_holdings[holding_key(holding)] = idx
             holdings.append(new_holding)
 
         items = []
@@ -391,10 +820,7 @@ def bulk_record(record):
             new_item['type'] = 'standard'
             # item['type'] = 'standard' if holdings_type == 'standard' \
             #     else 'issue'
-            holding_pid = map_holdings.get(
-                '{location}#{cica}'.format(
-                    location= item.get('location'),
-                    cica= item.get('item_type')))
+            holding_pid = map_holdings.get(item_holding_key(item))
             if holding_pid is None:
                 click.secho('holding pid is None for record : {id} '.format(
                     id=document.get('pid')
@@ -423,12 +849,3 @@ def bulk_record(record):
                 id=str(record.data.get('_id')).strip(),
                 e=str(e)))
         raise
-
-
-def has_items(holding, items):
-    """check if holding has items."""
-    # TODO: use filter
-    for item in items:
-        if holding == item.get('holding'):
-            return True
-    return False
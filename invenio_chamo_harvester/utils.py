@@ -8,10 +8,22 @@
 
 """Utility functions for data processing."""
 
+import json
+import time
+from copy import deepcopy
+
 import requests
-from flask import current_app
-from invenio_pidstore.models import PersistentIdentifier
-from sqlalchemy import text
+from invenio_db import db
+from invenio_pidstore.models import PersistentIdentifier, PIDStatus
+from invenio_records.models import RecordMetadata
+from rero_ils.modules.documents.models import DocumentIdentifier
+from rero_ils.modules.holdings.models import HoldingIdentifier
+from rero_ils.modules.items.models import ItemIdentifier
+from sqlalchemy import cast, func, text
+from sqlalchemy.dialects.postgresql import JSONB
+
+from .errors import UnknownCodeError
+from .proxies import current_chamo_harvester
 
 
 def extract_records_id(data):
@@ -24,134 +36,255 @@ def extract_records_id(data):
     return records
 
 
+class FlushPolicy(object):
+    """Decide when the written records are committed.
+
+    A flush is due after ``max_records`` processed records, ``max_bytes``
+    of record data or ``max_interval`` seconds since the last flush,
+    whichever comes first. A limit set to 0 is disabled.
+    """
+
+    def __init__(self, max_records=1000, max_bytes=0, max_interval=0):
+        """Initialize policy.
+
+        :param max_records: maximum number of processed records.
+        :param max_bytes: maximum size of the record data.
+        :param max_interval: maximum number of seconds between flushes.
+        """
+        self.max_records = max_records
+        self.max_bytes = max_bytes
+        self.max_interval = max_interval
+        self.reset()
+
+    def add(self, size=0):
+        """Count a processed record.
+
+        :param size: size of the record data in bytes.
+        """
+        self.records += 1
+        self.bytes += size
+
+    def due(self):
+        """Check if a flush is due."""
+        if not self.records:
+            return False
+        return bool(
+            self.max_records and self.records >= self.max_records or
+            self.max_bytes and self.bytes >= self.max_bytes or
+            self.max_interval and
+            time.time() - self.started >= self.max_interval
+        )
+
+    def reset(self):
+        """Start counting after a flush."""
+        self.records = 0
+        self.bytes = 0
+        self.started = time.time()
+
+
+def canonical_json(data):
+    """Serialize record data so that equal records give equal strings."""
+    return json.dumps(data, sort_keys=True, separators=(',', ':'))
+
+
+IDENTIFIER_CLASSES = {
+    'doc': DocumentIdentifier,
+    'hold': HoldingIdentifier,
+    'item': ItemIdentifier
+}
+"""Record identifier table of each pid type."""
+
+
 def get_max_record_pid(pid_type):
-    """Get max record PID."""
-    return PersistentIdentifier.query.filter_by(
-        pid_type=pid_type).order_by(text('pid_value desc')).first().id
+    """Get the highest pid of a record type.
+
+    The pids are read from the integer primary key of the record identifier
+    table, which gives a numeric maximum from the index.
+
+    :param pid_type: persistent identifier type, 'doc', 'hold' or 'item'.
+    :returns: the highest pid, ``None`` without records.
+    """
+    identifier_cls = IDENTIFIER_CLASSES[pid_type]
+    return db.session.query(func.max(identifier_cls.recid)).scalar()
+
+
+def advance_sequence(identifier_cls, value):
+    """Move the sequence of a record identifier table to a value at least.
+
+    The sequence never goes backwards: the identifiers it gave to other
+    transactions, not committed yet, are not given again.
+
+    :param identifier_cls: a :class:`RecordIdentifier` subclass.
+    :param value: the highest identifier in use.
+    """
+    if db.engine.dialect.name != 'postgresql':
+        identifier_cls._set_sequence(value)
+        return
+    sequence = '{table}_recid_seq'.format(
+        table=identifier_cls.__tablename__)
+    db.session.execute(
+        text('SELECT setval(:sequence, GREATEST(:value, last_value)) '
+             'FROM {sequence}'.format(sequence=sequence)),
+        {'sequence': sequence, 'value': value})
+
+
+def get_records_by_pids(record_cls, pid_type, pids):
+    """Get several records by pid with a single query.
+
+    :param record_cls: record class, for example :class:`Document`.
+    :param pid_type: persistent identifier type of the records.
+    :param pids: list of record pids.
+    :returns: dictionary of the existing records by pid.
+    """
+    if not pids:
+        return {}
+    query = db.session.query(
+        PersistentIdentifier.pid_value, RecordMetadata
+    ).join(
+        RecordMetadata,
+        RecordMetadata.id == PersistentIdentifier.object_uuid
+    ).filter(
+        PersistentIdentifier.pid_type == pid_type,
+        PersistentIdentifier.pid_value.in_([str(pid) for pid in pids]),
+        PersistentIdentifier.status == PIDStatus.REGISTERED
+    )
+    return {
+        pid_value: record_cls(model.json, model=model)
+        for pid_value, model in query
+    }
+
+
+def get_records_by_document_refs(record_cls, pid_type, document_refs):
+    """Get the records linked to several documents with a single query.
+
+    :param record_cls: record class, for example :class:`Item`.
+    :param pid_type: persistent identifier type of the records.
+    :param document_refs: list of document ``$ref`` urls.
+    :returns: dictionary of record lists by document ``$ref``.
+    """
+    if not document_refs:
+        return {}
+    document_ref = cast(RecordMetadata.json, JSONB)['document']['$ref'].astext
+    query = db.session.query(document_ref, RecordMetadata).join(
+        PersistentIdentifier,
+        RecordMetadata.id == PersistentIdentifier.object_uuid
+    ).filter(
+        PersistentIdentifier.pid_type == pid_type,
+        PersistentIdentifier.status == PIDStatus.REGISTERED,
+        document_ref.in_(document_refs)
+    )
+    records = {}
+    for ref, model in query:
+        records.setdefault(ref, []).append(
+            record_cls(model.json, model=model))
+    return records
+
+
+def build_holding(holding, document_ref, schema):
+    """Build a RERO ILS holding from a Chamo holding.
+
+    :param holding: Chamo holding.
+    :param document_ref: ``$ref`` url of the document.
+    :param schema: holding JSON schema url.
+    """
+    new_holding = deepcopy(holding)
+    new_holding['$schema'] = schema
+    new_holding['document'] = {'$ref': document_ref}
+    new_holding['circulation_category'] = {
+        '$ref': map_item_type(str(holding.get('circulation_category')))
+    }
+    new_holding['location'] = {
+        '$ref': map_locations(str(holding.get('location')))
+    }
+    return new_holding
+
+
+def build_item(item, document_ref, schema):
+    """Build a RERO ILS item, without its holding, from a Chamo item.
+
+    :param item: Chamo item.
+    :param document_ref: ``$ref`` url of the document.
+    :param schema: item JSON schema url.
+    """
+    new_item = deepcopy(item)
+    new_item['$schema'] = schema
+    new_item['document'] = {'$ref': document_ref}
+    new_item['item_type'] = {
+        '$ref': map_item_type(str(item.get('item_type')))
+    }
+    new_item['location'] = {
+        '$ref': map_locations(str(item.get('location')))
+    }
+    return new_item
+
+
+def holding_key(holding):
+    """Key of a Chamo holding: its location and circulation category."""
+    return (str(holding.get('location')),
+            str(holding.get('circulation_category')))
+
+
+def chamo_holding_key(holding):
+    """Chamo ``location#cica`` key of a holding, see :func:`holding_key`."""
+    return '#'.join(holding_key(holding))
+
+
+def item_holding_key(item):
+    """Key of the holding of a Chamo item, see :func:`holding_key`."""
+    return (str(item.get('location')), str(item.get('item_type')))
+
+
+def index_items(items):
+    """Index the items of a record by holding key.
+
+    :param items: list of Chamo items.
+    :returns: dictionary of item lists by :func:`holding_key`.
+    """
+    index = {}
+    for item in items:
+        index.setdefault(item_holding_key(item), []).append(item)
+    return index
+
+
+def has_items(holding, items_index):
+    """Check if holding has items.
+
+    :param holding: a Chamo holding.
+    :param items_index: items of the record, see :func:`index_items`.
+    """
+    return holding_key(holding) in items_index
+
+
+def build_ref_table(mapping, resource, host_url):
+    """Build a table of RERO ILS references.
+
+    :param mapping: dictionary of RERO ILS pids by Chamo code, or the path
+        of a JSON file holding it.
+    :param resource: RERO ILS resource, for example 'locations'.
+    :param host_url: RERO ILS application url.
+    :returns: dictionary of ``$ref`` urls by Chamo code.
+    """
+    if isinstance(mapping, str):
+        with open(mapping) as mapping_file:
+            mapping = json.load(mapping_file)
+    return {
+        str(code): '{host}/api/{resource}/{pid}'.format(
+            host=host_url, resource=resource, pid=pid)
+        for code, pid in mapping.items()
+    }
 
 
 def map_item_type(type):
     """Returns mapped type."""
-    host_url = current_app.config.get('RERO_ILS_APP_URL')
-    item_types = {
-        "1": "{host}/api/item_types/1",
-        "2": "{host}/api/item_types/2",
-        "3": "{host}/api/item_types/2",
-        "4": "{host}/api/item_types/4",
-        "5": "{host}/api/item_types/5",
-        "6": "{host}/api/item_types/6",
-        "101": "{host}/api/item_types/2",
-        "102": "{host}/api/item_types/8",
-        "103": "{host}/api/item_types/9",
-        "104": "{host}/api/item_types/2",
-        "105": "{host}/api/item_types/2",
-        "106": "{host}/api/item_types/2",
-        "110": "{host}/api/item_types/13",
-        "250": "{host}/api/item_types/17",
-        "251": "{host}/api/item_types/18",
-        "252": "{host}/api/item_types/19",
-        "253": "{host}/api/item_types/20",
-        "254": "{host}/api/item_types/21",
-        "255": "{host}/api/item_types/22",
-        "256": "{host}/api/item_types/22",
-        "257": "{host}/api/item_types/22",
-        "258": "{host}/api/item_types/22",
-        "259": "{host}/api/item_types/22",
-        "260": "{host}/api/item_types/27",
-        "261": "{host}/api/item_types/28",
-        "262": "{host}/api/item_types/29",
-        "300": "{host}/api/item_types/30",
-        "301": "{host}/api/item_types/15",
-        "303": "{host}/api/item_types/31",
-        "304": "{host}/api/item_types/32",
-        "305": "{host}/api/item_types/33",
-        "306": "{host}/api/item_types/34",
-        "308": "{host}/api/item_types/35",
-        "309": "{host}/api/item_types/36",
-        "310": "{host}/api/item_types/37",
-        "777": "{host}/api/item_types/14",
-        "999": "{host}/api/item_types/16"
-    }
-    return item_types.get(type).format(host=host_url)
+    try:
+        return current_chamo_harvester.item_type_refs[type]
+    except KeyError:
+        raise UnknownCodeError('item type', type)
 
 
 def map_locations(location):
     """Returns mapped location."""
-    host_url = current_app.config.get('RERO_ILS_APP_URL')
-    # location 200000 can be removed after production correction
-    locations = {
-        "100000": "{host}/api/locations/1",
-        "100001": "{host}/api/locations/2",
-        "100002": "{host}/api/locations/3",
-        "100003": "{host}/api/locations/4",
-        "200000": "{host}/api/locations/5",
-        "200002": "{host}/api/locations/5",
-        "200003": "{host}/api/locations/6",
-        "200004": "{host}/api/locations/7",
-        "200005": "{host}/api/locations/8",
-        "200006": "{host}/api/locations/9",
-        "200007": "{host}/api/locations/10",
-        "200008": "{host}/api/locations/11",
-        "200009": "{host}/api/locations/12",
-        "200010": "{host}/api/locations/13",
-        "300000": "{host}/api/locations/14",
-        "300001": "{host}/api/locations/15",
-        "300002": "{host}/api/locations/16",
-        "300003": "{host}/api/locations/17",
-        "400000": "{host}/api/locations/18",
-        "400001": "{host}/api/locations/19",
-        "400002": "{host}/api/locations/20",
-        "400003": "{host}/api/locations/21",
-        "400004": "{host}/api/locations/22",
-        "400005": "{host}/api/locations/23",
-        "410000": "{host}/api/locations/72",
-        "500000": "{host}/api/locations/24",
-        "500001": "{host}/api/locations/25",
-        "500002": "{host}/api/locations/26",
-        "500003": "{host}/api/locations/27",
-        "500004": "{host}/api/locations/28",
-        "600000": "{host}/api/locations/29",
-        "600009": "{host}/api/locations/30",
-        "600010": "{host}/api/locations/31",
-        "600014": "{host}/api/locations/33",
-        "600019": "{host}/api/locations/36",  # BST-ELIA
-        "600021": "{host}/api/locations/29",  # BST-MATH => UPDATE NEW LOC_PID
-        "700000": "{host}/api/locations/37",
-        "700009": "{host}/api/locations/38",
-        "700010": "{host}/api/locations/39",
-        "800000": "{host}/api/locations/41",
-        "900000": "{host}/api/locations/42",
-        "1020000": "{host}/api/locations/43",
-        "600020": "{host}/api/locations/44",  # BST-INGI
-        "1040000": "{host}/api/locations/45",
-        "1050000": "{host}/api/locations/46",
-        "1050001": "{host}/api/locations/46",
-        "1050002": "{host}/api/locations/47",
-        "1050003": "{host}/api/locations/48",
-        "1050004": "{host}/api/locations/49",
-        "1060000": "{host}/api/locations/50",
-        "1060002": "{host}/api/locations/52",
-        "11000000": "{host}/api/locations/53",
-        "20600000": "{host}/api/locations/54",
-        "20700001": "{host}/api/locations/55",
-        "20700002": "{host}/api/locations/56",
-        "20700003": "{host}/api/locations/57",
-        "20700004": "{host}/api/locations/58",
-        "21000000": "{host}/api/locations/59",
-        "21000001": "{host}/api/locations/59",
-        "21000002": "{host}/api/locations/60",
-        "21000003": "{host}/api/locations/61",
-        "21000004": "{host}/api/locations/62",
-        "21000006": "{host}/api/locations/63",
-        "21000008": "{host}/api/locations/64",
-        "21000009": "{host}/api/locations/65",
-        "30100000": "{host}/api/locations/66",
-        "30100001": "{host}/api/locations/67",
-        "30100002": "{host}/api/locations/68",
-        "30200000": "{host}/api/locations/69",
-        "30300000": "{host}/api/locations/70",
-        "30400000": "{host}/api/locations/71",
-        "410000": "{host}/api/locations/72",
-        "200011": "{host}/api/locations/73"
-    }
-    return locations.get(location).format(host=host_url)
+    try:
+        return current_chamo_harvester.location_refs[location]
+    except KeyError:
+        raise UnknownCodeError('location', location)
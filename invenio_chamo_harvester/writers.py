@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2019 UCLouvain.
+#
+# Invenio-Chamo-Harvester is free software; you can redistribute it and/or
+# modify it under the terms of the MIT License; see LICENSE file for more
+# details.
+
+"""Pool of database writers for the harvested records."""
+
+from __future__ import absolute_import, print_function
+
+import queue
+import threading
+import zlib
+
+from invenio_db import db
+
+
+def partition(action, count):
+    """Writer of a bulk action.
+
+    The actions of a Chamo record always go to the same writer, so that two
+    writers never update the same document.
+
+    :param action: bulk action, see ``ChamoRecordHarvester._actionsiter``.
+    :param count: number of writers.
+    :returns: the writer index.
+    """
+    key = str(action.get('_id')).encode('utf-8')
+    return zlib.crc32(key) % count
+
+
+class Writer(threading.Thread):
+    """Write a partition of the harvested records in a background thread.
+
+    Each writer runs in its own application context, so it has its own
+    database session and commits its own batches. The queue messages of
+    the actions are already acknowledged: when the writer fails, the
+    records it took since its last commit or still had in its queue are
+    published again.
+    """
+
+    def __init__(self, app, bulk_kwargs, maxsize=1000, name=None):
+        """Initialize writer.
+
+        :param app: the Flask application.
+        :param bulk_kwargs: arguments of ``bulk_records``.
+        :param maxsize: maximum number of bulk actions waiting to be written.
+        :param name: name of the thread.
+        """
+        super(Writer, self).__init__(name=name)
+        self.daemon = True
+        self.app = app
+        self.bulk_kwargs = bulk_kwargs
+        self.actions = queue.Queue(maxsize=maxsize)
+        self.count = 0
+        self.failed = False
+        self.taken = []
+        self._done = False
+
+    def submit(self, action):
+        """Queue a bulk action."""
+        self.actions.put(action)
+
+    def close(self):
+        """Wait for the queued actions to be written."""
+        self.actions.put(None)
+        self.join()
+
+    def _actionsiter(self):
+        """Iterate the queued actions until :meth:`close` is called."""
+        while True:
+            action = self.actions.get()
+            if action is None:
+                self._done = True
+                return
+            self.taken.append(
+                (action.get('_op_type'), action.get('_id')))
+            yield action
+
+    def _committed(self, count):
+        """Forget the first taken actions, committed by ``bulk_records``.
+
+        The actions are processed in the order they are taken.
+
+        :param count: number of actions processed since the last commit.
+        """
+        del self.taken[:count]
+
+    def run(self):
+        """Write the queued actions."""
+        from .tasks import bulk_records
+        with self.app.app_context():
+            try:
+                self.count = bulk_records(
+                    self._actionsiter(),
+                    dict(self.bulk_kwargs, on_commit=self._committed))
+            except Exception:
+                self.failed = True
+                self.app.logger.error(
+                    '{name} failed'.format(name=self.name), exc_info=True)
+            finally:
+                db.session.remove()
+            if self.failed:
+                # do not block the producer when the writer stopped early
+                if not self._done:
+                    for _ in self._actionsiter():
+                        pass
+                self.requeue(self.taken)
+            self.taken = []
+
+    def requeue(self, actions):
+        """Publish records to harvest or delete again.
+
+        :param actions: list of (operation, Chamo bib id).
+        """
+        from .api import ChamoRecordHarvester
+        deleted = [bib_id for op, bib_id in actions if op == 'delete']
+        harvested = [bib_id for op, bib_id in actions if op != 'delete']
+        try:
+            ChamoRecordHarvester().bulk_to_harvest(harvested)
+            ChamoRecordHarvester().bulk_to_delete(deleted)
+        except Exception:
+            self.app.logger.error(
+                '{name} could not queue {count} records again: {ids}'.format(
+                    name=self.name, count=len(actions),
+                    ids=[bib_id for _, bib_id in actions]), exc_info=True)
+            return
+        self.app.logger.warning(
+            '{name} queued {count} records again'.format(
+                name=self.name, count=len(actions)))
+
+
+class WriterPool(object):
+    """Partition the harvested records across several writers.
+
+    The records are fetched and converted by the caller, then written by
+    ``size`` writer threads. Each writer commits its own batches; the
+    identifier sequences are resynchronized once, when all writers are done.
+    """
+
+    def __init__(self, app, size, bulk_kwargs, maxsize=1000):
+        """Initialize pool.
+
+        :param app: the Flask application.
+        :param size: number of writers.
+        :param bulk_kwargs: arguments of ``bulk_records``.
+        :param maxsize: maximum number of bulk actions waiting per writer.
+        """
+        bulk_kwargs = dict(bulk_kwargs, resync_sequences=False)
+        self.writers = [
+            Writer(app, bulk_kwargs, maxsize=maxsize,
+                   name='chamo-harvester-writer-{idx}'.format(idx=idx))
+            for idx in range(size)
+        ]
+
+    def write(self, actions):
+        """Write bulk actions.
+
+        :param actions: iterator of bulk actions.
+        :returns: number of created and updated documents.
+        """
+        from .tasks import resync_sequences
+        for writer in self.writers:
+            writer.start()
+        try:
+            for action in actions:
+                self.writers[partition(action, len(self.writers))].submit(
+                    action)
+        finally:
+            for writer in self.writers:
+                writer.close()
+            resync_sequences()
+        return sum(writer.count for writer in self.writers)
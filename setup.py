@@ -89,6 +89,9 @@ setup(
         'invenio_config.module': [
             'invenio_chamo_harvester = invenio_chamo_harvester.config',
         ],
+        'invenio_db.models': [
+            'invenio_chamo_harvester = invenio_chamo_harvester.models',
+        ],
         # TODO: Edit these entry points to fit your needs.
         # 'invenio_access.actions': [],
         # 'invenio_admin.actions': [],
@@ -97,7 +100,6 @@ setup(
         # 'invenio_base.api_blueprints': [],
         # 'invenio_base.blueprints': [],
         # 'invenio_celery.tasks': [],
-        # 'invenio_db.models': [],
         # 'invenio_pidstore.minters': [],
         # 'invenio_records.jsonresolver': [],
     },
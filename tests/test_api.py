@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2019 UCLouvain.
+#
+# Invenio-Chamo-Harvester is free software; you can redistribute it and/or
+# modify it under the terms of the MIT License; see LICENSE file for more
+# details.
+
+"""Harvester API tests."""
+
+from __future__ import absolute_import, print_function
+
+import json
+from os.path import dirname, join
+
+from invenio_chamo_harvester import api
+from invenio_chamo_harvester.api import ChamoBibRecord, ChamoRecordHarvester
+
+
+class Message(object):
+    """Queue message."""
+
+    def __init__(self, payload):
+        """Initialize message."""
+        self.payload = payload
+        self.acked = False
+        self.rejected = False
+
+    def decode(self):
+        """Message body."""
+        return self.payload
+
+    def ack(self):
+        """Acknowledge message."""
+        self.acked = True
+
+    def reject(self):
+        """Reject message."""
+        self.rejected = True
+
+
+def test_skip_unchanged(appctx, monkeypatch):
+    """Test that unchanged bibs are skipped, unless harvest is forced."""
+    with open(join(dirname(__file__), 'data', 'chamo_bibs.json')) as corpus:
+        data = json.load(corpus)['records'][0]
+    record = ChamoBibRecord(data)
+    payload = {'id': data['_id'], 'uri': 'x/bib/{id}'.format(id=data['_id'])}
+    digests = {data['_id']: record.digest}
+    monkeypatch.setattr(ChamoBibRecord, 'get_record_by_uri',
+                        classmethod(lambda cls, uri: ChamoBibRecord(data)))
+    monkeypatch.setattr(api.ChamoRecordDigest, 'get_digests',
+                        classmethod(lambda cls, ids: dict(digests)))
+    monkeypatch.setattr(ChamoRecordHarvester, '_resolve_person_links',
+                        staticmethod(lambda records: None))
+    monkeypatch.setattr(ChamoRecordHarvester, '_prepare_record',
+                        staticmethod(lambda record: {'document': {}}))
+    harvester = ChamoRecordHarvester()
+
+    assert harvester._harvest_action(payload, record, record.digest) == {
+        '_op_type': 'skip', '_id': data['_id']}
+    assert harvester._harvest_action(
+        payload, record, 'other')['_op_type'] == 'harvest'
+    assert harvester._harvest_action(
+        payload, record, None)['_op_type'] == 'harvest'
+
+    def op_types(skip_unchanged):
+        message = Message(payload)
+        actions = list(harvester._batch_actionsiter(
+            [message], skip_unchanged=skip_unchanged))
+        assert message.acked
+        return [action['_op_type'] for action in actions]
+
+    assert op_types(True) == ['skip']
+    # --force harvests the bibs without reading their digest
+    assert op_types(False) == ['harvest']
+    digests[data['_id']] = 'other'
+    assert op_types(True) == ['harvest']
+
+
+def test_rejected_action(appctx):
+    """Test that the message of a rejected action is rejected."""
+    harvester = ChamoRecordHarvester()
+    messages = [Message({'op': 'delete', 'id': bib_id, 'uri': ''})
+                for bib_id in ('1', '2')]
+    for action in harvester._batch_actionsiter(messages):
+        if action['_id'] == '1':
+            action['rejected'] = True
+    assert [(message.acked, message.rejected) for message in messages] == [
+        (False, True), (True, False)]
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2019 UCLouvain.
+#
+# Invenio-Chamo-Harvester is free software; you can redistribute it and/or
+# modify it under the terms of the MIT License; see LICENSE file for more
+# details.
+
+"""Offline conversion benchmark.
+
+The thresholds of ``data/benchmark_thresholds.json`` can be replaced by the
+file given in the ``CHAMO_BENCHMARK_THRESHOLDS`` environment variable, and
+the baseline run of ``data/benchmark_baseline.json`` by the file given in
+``CHAMO_BENCHMARK_BASELINE``.
+"""
+
+from __future__ import absolute_import, print_function
+
+import io
+import json
+import os
+from os.path import dirname, exists, join
+
+import pytest
+
+from invenio_chamo_harvester.api import ChamoBibRecord, ChamoRecordHarvester
+from invenio_chamo_harvester.benchmark import check_regressions, \
+    compare_to_baseline, load_corpus, measure_rss, offline_mef, \
+    peak_allocated, percentile, run_benchmark, save_baseline
+
+DATA_DIR = join(dirname(__file__), 'data')
+
+
+@pytest.fixture(scope='module')
+def app_config(app_config):
+    """Offline conversion configuration."""
+    app_config['RERO_ILS_APP_URL'] = 'https://ils.rero.ch'
+    app_config['CHAMO_HARVESTER_MEF_CACHE_PATH'] = ''
+    return app_config
+
+
+@pytest.fixture(scope='module')
+def corpus():
+    """Synthetic Chamo bibs, see the description of the corpus."""
+    return load_corpus(join(DATA_DIR, 'chamo_bibs.json'))
+
+
+def test_prepare_record(appctx, corpus):
+    """Test the conversion of a bib."""
+    data = [record for record in corpus['records']
+            if record['_id'] == '27087'][0]
+    record = ChamoBibRecord(data)
+    assert record.viaf_pids == {'2617230', '76386373'}
+    with offline_mef(corpus['mef']):
+        prepared = ChamoRecordHarvester._prepare_record(record)
+    document = prepared['document']
+    assert document['pid'] == '27087'
+    assert document['type'] == 'book'
+    assert document['contribution'][0]['agent'] == {
+        '$ref': 'https://mef.rero.ch/api/idref/026926717'}
+    assert prepared['items'] == data['items']
+    assert prepared['holdings'] == data['holdings']
+    assert prepared['links'] == []
+
+
+def test_percentile():
+    """Test nearest-rank percentiles."""
+    assert percentile([], 50) == 0.0
+    assert percentile([3, 1, 2, 4], 50) == 2
+    assert percentile([3, 1, 2, 4], 99) == 4
+
+
+def test_peak_allocated():
+    """Test that only the allocations of the call are measured."""
+    kept = bytearray(4 * 1024 * 1024)
+    assert peak_allocated(bytearray, 2 * 1024 * 1024) >= 2
+    assert peak_allocated(len, kept) < 1
+
+
+def test_measure_rss():
+    """Test that the increase of the call is measured in a child."""
+    kept = bytearray(64 * 1024 * 1024)
+    peak, increase = measure_rss(lambda: bytearray(32 * 1024 * 1024))
+    if peak is None:
+        pytest.skip('resident set size can not be measured')
+    assert 32 <= increase < 64
+    assert peak >= increase
+    assert len(kept)
+
+
+def test_compare_to_baseline():
+    """Test the relative tolerance over a baseline run."""
+    stats = {'errors': 1, 'p50_ratio': 12.0, 'p99_ratio': 20.0,
+             'peak_alloc_mb': 2.0, 'rss_increase_mb': None}
+    baseline_file = io.StringIO()
+    save_baseline(dict(stats, p99_ratio=15.0), baseline_file)
+    baseline = json.loads(baseline_file.getvalue())
+    assert baseline == {'tolerance': 0.25, 'stats': {
+        'p50_ratio': 12.0, 'p99_ratio': 15.0, 'peak_alloc_mb': 2.0}}
+    assert compare_to_baseline(stats, baseline) == [
+        'p99_ratio: 20.00 (baseline 15.00 +25%)']
+    assert compare_to_baseline(stats, baseline, tolerance=0.5) == []
+
+
+def test_check_regressions():
+    """Test minimum and maximum bounds."""
+    stats = {'errors': 0, 'p99_ratio': 12.0, 'records_per_sec': 50.0}
+    assert check_regressions(stats, {
+        'max_errors': 0, 'max_p99_ratio': 20, 'min_records_per_sec': 10,
+        'max_unknown': 1}) == []
+    assert check_regressions(stats, {
+        'max_p99_ratio': 10, 'min_records_per_sec': 100}) == [
+        'p99_ratio: 12.00 (max 10)', 'records_per_sec: 50.00 (min 100)']
+
+
+def test_conversion_benchmark(appctx, corpus):
+    """Fail when the conversion regresses past the thresholds."""
+    path = os.environ.get('CHAMO_BENCHMARK_THRESHOLDS',
+                          join(DATA_DIR, 'benchmark_thresholds.json'))
+    with open(path) as thresholds_file:
+        thresholds = json.load(thresholds_file)
+    stats = run_benchmark(corpus, repeat=20)
+    assert stats['records'] == 20 * len(corpus['records'])
+    assert check_regressions(stats, thresholds) == []
+
+
+def test_conversion_baseline(appctx, corpus):
+    """Fail when the conversion regresses past the baseline run.
+
+    The baseline is saved on the same machine, before a change, with
+    ``invenio chamo benchmark tests/data/chamo_bibs.json -r 20 -s
+    tests/data/benchmark_baseline.json``.
+    """
+    path = os.environ.get('CHAMO_BENCHMARK_BASELINE',
+                          join(DATA_DIR, 'benchmark_baseline.json'))
+    if not exists(path):
+        pytest.skip('no baseline run in {path}'.format(path=path))
+    with open(path) as baseline_file:
+        baseline = json.load(baseline_file)
+    stats = run_benchmark(corpus, repeat=20)
+    assert compare_to_baseline(stats, baseline) == []
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2019 UCLouvain.
+#
+# Invenio-Chamo-Harvester is free software; you can redistribute it and/or
+# modify it under the terms of the MIT License; see LICENSE file for more
+# details.
+
+"""Streaming export tests."""
+
+from __future__ import absolute_import, print_function
+
+import gzip
+import io
+import json
+import os
+
+from invenio_chamo_harvester.export import open_export, write_records
+
+RECORDS = [{'pid': '1', 'title': 'a'}, {'pid': '2', 'title': 'b'}]
+
+
+def test_write_records():
+    """Test the JSON array and NDJSON exports."""
+    outfile = io.StringIO()
+    assert write_records(iter(RECORDS), outfile, 'json') == 2
+    assert json.loads(outfile.getvalue()) == RECORDS
+
+    outfile = io.StringIO()
+    assert write_records(iter([]), outfile, 'json') == 0
+    assert json.loads(outfile.getvalue()) == []
+
+    outfile = io.StringIO()
+    assert write_records(iter(RECORDS), outfile, 'ndjson') == 2
+    assert [json.loads(line) for line in
+            outfile.getvalue().splitlines()] == RECORDS
+
+
+def test_gzip_export(tmpdir):
+    """Test the compressed export."""
+    filename = os.path.join(str(tmpdir), 'doc.ndjson.gz')
+    with open_export(filename, compress=True) as outfile:
+        write_records(iter(RECORDS), outfile, 'ndjson')
+    with gzip.open(filename, 'rt') as infile:
+        assert [json.loads(line) for line in infile] == RECORDS
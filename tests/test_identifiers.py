@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2019 UCLouvain.
+#
+# Invenio-Chamo-Harvester is free software; you can redistribute it and/or
+# modify it under the terms of the MIT License; see LICENSE file for more
+# details.
+
+"""Identifier normalization tests."""
+
+from __future__ import absolute_import, print_function
+
+from invenio_chamo_harvester.identifiers import normalize_identifiers
+
+
+def test_normalize_identifiers():
+    """Test batch normalization of ISBN and EAN identifiers."""
+    documents = [
+        {'identifiedBy': [
+            {'type': 'bf:Isbn', 'value': '0-306-40615-2'},
+            {'type': 'bf:Ean', 'value': '9780306406157'},
+            {'type': 'bf:Issn', 'value': '0317-8471'}
+        ]},
+        {'identifiedBy': [
+            {'type': 'bf:Isbn', 'value': '0-306-40615-2',
+             'qualifier': 'broch.'},
+            {'type': 'bf:Isbn', 'value': '123',
+             'status': 'invalid or cancelled'},
+            {'type': 'bf:Isbn', 'value': '0-306-40615-2',
+             'status': 'invalid or cancelled'}
+        ]},
+        {}
+    ]
+    assert normalize_identifiers(documents) == 2
+    assert documents[0]['identifiedBy'] == [
+        {'type': 'bf:Isbn', 'value': '9780306406157'},
+        {'type': 'bf:Ean', 'value': '9780306406157'},
+        {'type': 'bf:Issn', 'value': '0317-8471'}
+    ]
+    assert documents[1]['identifiedBy'] == [
+        {'type': 'bf:Isbn', 'value': '9780306406157', 'qualifier': 'broch.'},
+        {'type': 'bf:Isbn', 'value': '123', 'status': 'invalid or cancelled'},
+        {'type': 'bf:Isbn', 'value': '0-306-40615-2',
+         'status': 'invalid or cancelled'}
+    ]
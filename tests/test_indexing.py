@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2019 UCLouvain.
+#
+# Invenio-Chamo-Harvester is free software; you can redistribute it and/or
+# modify it under the terms of the MIT License; see LICENSE file for more
+# details.
+
+"""Indexing tests."""
+
+from __future__ import absolute_import, print_function
+
+from datetime import datetime
+
+import pytest
+
+from invenio_chamo_harvester import indexing
+from invenio_chamo_harvester.errors import IndexingError
+from invenio_chamo_harvester.indexing import IndexingWorker, MemoryIndexer, \
+    batch_entries, snapshot_entries
+
+
+@pytest.fixture(scope='module')
+def app_config(app_config):
+    """Indexing configuration."""
+    app_config['RERO_ILS_APP_URL'] = 'https://ils.rero.ch'
+    return app_config
+
+
+def test_batch_entries():
+    """Test the indexing order of a batch."""
+    entries = batch_entries(['h1'], ['i1', 'i2'], ['d1'])
+    assert [(entry['doc_type'], entry['id']) for entry in entries] == [
+        ('hold', 'h1'), ('item', 'i1'), ('item', 'i2'), ('doc', 'd1')
+    ]
+
+
+def test_resolve_batch_refs(appctx):
+    """Test the resolution of references to records of the batch."""
+    indexer = MemoryIndexer()
+    batch_refs = {
+        'https://ils.rero.ch/api/documents/1': {'pid': '1'},
+        'https://ils.rero.ch/api/holdings/2': {'pid': '2'}
+    }
+    item = {
+        'pid': '3',
+        'document': {'$ref': 'https://ils.rero.ch/api/documents/1'},
+        'holding': {'$ref': 'https://ils.rero.ch/api/holdings/2'},
+        'notes': [{'content': 'a'}]
+    }
+    assert indexer.resolve_refs(item, batch_refs) == {
+        'pid': '3',
+        'document': {'pid': '1'},
+        'holding': {'pid': '2'},
+        'notes': [{'content': 'a'}]
+    }
+
+
+class Model(object):
+    """Record metadata."""
+
+    def __init__(self, json):
+        """Initialize model."""
+        self.json = json
+        self.version_id = 2
+        self.created = self.updated = datetime(2019, 1, 1)
+
+
+class Record(object):
+    """Record written through the record API."""
+
+    def __init__(self, json):
+        """Initialize record."""
+        self.model = Model(json)
+
+
+def test_snapshot_entries(appctx):
+    """Test that the data of the written records is kept."""
+    entries = batch_entries(['h1'], [], ['d1'])
+    snapshot_entries(entries, written={'h1': {'pid': '1'}},
+                     records={'d1': Record({'pid': '2'})})
+    assert entries == [
+        {'doc_type': 'hold', 'id': 'h1', 'revision': 0,
+         'created': entries[0]['created'], 'updated': entries[0]['updated'],
+         'data': {'pid': '1'}},
+        {'doc_type': 'doc', 'id': 'd1', 'revision': 1,
+         'created': datetime(2019, 1, 1), 'updated': datetime(2019, 1, 1),
+         'data': {'pid': '2'}}
+    ]
+
+
+def test_index_without_data(appctx, monkeypatch):
+    """Test that the entries without data are indexed from the database."""
+    indexed = []
+
+    class Indexer(object):
+        """Indexer reading the records from the database."""
+
+        def index(self, entries):
+            """Index a batch of entries."""
+            indexed.extend(entries)
+
+    monkeypatch.setattr(indexing, 'RecordIdsIndexer', Indexer)
+    MemoryIndexer().index([{'doc_type': 'doc', 'id': 'd1'}])
+    assert indexed == [{'doc_type': 'doc', 'id': 'd1'}]
+
+
+def test_indexing_worker_start_failure(base_app):
+    """Test that a worker whose indexer fails does not block the harvest."""
+    def indexer_cls():
+        raise IOError('no Elasticsearch')
+
+    worker = IndexingWorker(base_app, maxsize=1, indexer_cls=indexer_cls)
+    worker.start()
+    worker.join()
+    assert isinstance(worker.failed, IOError)
+    with pytest.raises(IndexingError):
+        worker.submit(batch_entries([], [], ['d1']))
+    with pytest.raises(IndexingError):
+        worker.close()
@@ -31,3 +31,33 @@ def test_init():
     assert 'invenio-chamo-harvester' not in app.extensions
     ext.init_app(app)
     assert 'invenio-chamo-harvester' in app.extensions
+
+
+def test_ref_tables():
+    """Test the item type and location reference tables."""
+    import pytest
+    from invenio_chamo_harvester.errors import UnknownCodeError
+    from invenio_chamo_harvester.utils import map_item_type, map_locations
+
+    app = Flask('testapp')
+    app.config.update(
+        RERO_ILS_APP_URL='https://ils.test',
+        CHAMO_HARVESTER_ITEM_TYPES={'1': '1', '3': '2'},
+        CHAMO_HARVESTER_LOCATIONS={'100000': '1'}
+    )
+    InvenioChamoHarvester(app)
+    with app.app_context():
+        assert map_item_type('3') == 'https://ils.test/api/item_types/2'
+        assert map_locations('100000') == 'https://ils.test/api/locations/1'
+        with pytest.raises(UnknownCodeError):
+            map_locations('None')
+
+
+def test_delete_action():
+    """Test the bulk action of a deleted Chamo bib."""
+    from invenio_chamo_harvester.api import ChamoRecordHarvester
+    assert ChamoRecordHarvester._delete_action({'id': ' 0012345\n'}) == {
+        '_op_type': 'delete',
+        '_id': '0012345',
+        'pid': '12345'
+    }
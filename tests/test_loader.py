@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2019 UCLouvain.
+#
+# Invenio-Chamo-Harvester is free software; you can redistribute it and/or
+# modify it under the terms of the MIT License; see LICENSE file for more
+# details.
+
+"""Bulk loader tests."""
+
+from __future__ import absolute_import, print_function
+
+import itertools
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import Column, Integer, MetaData, Table
+
+from invenio_chamo_harvester import loader, utils
+from invenio_chamo_harvester.loader import BulkRecordLoader, mint_pids
+
+metadata = MetaData()
+
+
+@pytest.fixture(scope='module')
+def app_config(app_config):
+    """Loader configuration."""
+    app_config['RERO_ILS_APP_URL'] = 'https://ils.rero.ch'
+    return app_config
+
+
+def identifier_class(table_name):
+    """Record identifier model of a table."""
+    table = Table(table_name, metadata, Column('recid', Integer))
+    return type(str(table_name), (object,), {
+        '__table__': table, '__tablename__': table_name,
+        'recid': table.c.recid})
+
+
+class Query(object):
+    """Database query."""
+
+    def __init__(self, value):
+        """Initialize query."""
+        self.value = value
+
+    def scalar(self):
+        """Query result."""
+        return self.value
+
+
+class Session(object):
+    """Database session keeping the inserted rows by table."""
+
+    def __init__(self, max_recid=None, sequence=None):
+        """Initialize session."""
+        self.rows = {}
+        self.max_recid = max_recid
+        self.sequence = sequence
+        self.queries = []
+
+    @contextmanager
+    def begin_nested(self):
+        """Savepoint, rolling back the rows inserted in it on failure."""
+        rows = {table: list(values) for table, values in self.rows.items()}
+        try:
+            yield
+        except Exception:
+            self.rows = rows
+            raise
+
+    def execute(self, statement, params):
+        """Insert rows, or read a sequence."""
+        if self.sequence is not None:
+            self.queries.append(params)
+            return [(next(self.sequence),) for _ in range(params['count'])]
+        self.rows.setdefault(statement.table.name, []).extend(params)
+
+    def query(self, column):
+        """Highest identifier."""
+        return Query(self.max_recid)
+
+
+class Dialect(object):
+    """Database dialect."""
+
+    def __init__(self, name):
+        """Initialize dialect."""
+        self.name = name
+
+
+class Engine(object):
+    """Database engine."""
+
+    def __init__(self, name):
+        """Initialize engine."""
+        self.dialect = Dialect(name)
+
+
+class Database(object):
+    """Database."""
+
+    def __init__(self, name, session):
+        """Initialize database."""
+        self.engine = Engine(name)
+        self.session = session
+
+
+DocumentIdentifier = identifier_class('document_id')
+HoldingIdentifier = identifier_class('holding_id')
+ItemIdentifier = identifier_class('item_id')
+
+
+def test_mint_pids(monkeypatch):
+    """Test the identifiers reserved on PostgreSQL and other databases."""
+    monkeypatch.setattr(loader, 'db', Database('sqlite', Session(41)))
+    assert mint_pids(HoldingIdentifier, 0) == []
+    assert mint_pids(HoldingIdentifier, 3) == [42, 43, 44]
+    monkeypatch.setattr(loader, 'db', Database('sqlite', Session()))
+    assert mint_pids(HoldingIdentifier, 2) == [1, 2]
+
+    session = Session(sequence=itertools.count(7))
+    monkeypatch.setattr(loader, 'db', Database('postgresql', session))
+    assert mint_pids(HoldingIdentifier, 2) == [7, 8]
+    assert session.queries == [{'sequence': 'holding_id_recid_seq',
+                                'count': 2}]
+
+
+def test_flush_rejected(appctx, monkeypatch):
+    """Test that a failing record is isolated and the others inserted."""
+    session = Session()
+    holding_pids = itertools.count(100)
+    monkeypatch.setattr(loader, 'db', Database('sqlite', session))
+    monkeypatch.setattr(loader, 'DocumentIdentifier', DocumentIdentifier)
+    monkeypatch.setattr(loader, 'HoldingIdentifier', HoldingIdentifier)
+    monkeypatch.setattr(loader, 'ItemIdentifier', ItemIdentifier)
+    monkeypatch.setattr(loader, 'schema_url', lambda path: path)
+    monkeypatch.setattr(loader, 'validate_record', lambda data: None)
+    monkeypatch.setattr(loader, 'mint_pids', lambda cls, count: [
+        next(holding_pids) for _ in range(count)])
+    monkeypatch.setattr(utils, 'map_item_type', lambda code: code)
+    monkeypatch.setattr(utils, 'map_locations', lambda code: code)
+
+    bulk_loader = BulkRecordLoader(validate_documents=False)
+    for pid in ('1', '2', '3', '4'):
+        # the item pid of the second record is not a number
+        bulk_loader.add(
+            {'pid': pid},
+            [{'location': 1, 'circulation_category': 2}],
+            [{'pid': 'x2' if pid == '2' else '1{0}'.format(pid),
+              'location': 1, 'item_type': 2}],
+            key='bib-{pid}'.format(pid=pid))
+    assert len(bulk_loader) == 4
+
+    record_ids = bulk_loader.flush()
+    assert len(bulk_loader) == 0
+    assert bulk_loader.rejected == [('bib-2', '2')]
+    assert [len(ids) for ids in (
+        record_ids['doc'], record_ids['hold'], record_ids['item'])] == [
+        3, 3, 3]
+    # the holding pids minted by the failed inserts are not reused
+    assert sorted(data['pid'] for data in bulk_loader.written.values()) == [
+        '1', '106', '108', '109', '11', '13', '14', '3', '4']
+    # the rows of the rejected record are rolled back
+    assert [row['recid'] for row in session.rows['document_id']] == [
+        1, 3, 4]
+    assert [row['recid'] for row in session.rows['item_id']] == [11, 13, 14]
+    assert [row['key'] for row in session.rows[
+        'chamo_harvester_holding']] == ['1#2', '1#2', '1#2']
+    assert len(session.rows['records_metadata']) == 9
+    assert sorted(row['pid_value'] for row in session.rows[
+        'pidstore_pid']) == ['1', '106', '108', '109', '11', '13', '14',
+                             '3', '4']
+    items = [data for data in bulk_loader.written.values()
+             if data['pid'] == '13']
+    assert items[0]['holding'] == {
+        '$ref': 'https://ils.rero.ch/api/holdings/108'}
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2019 UCLouvain.
+#
+# Invenio-Chamo-Harvester is free software; you can redistribute it and/or
+# modify it under the terms of the MIT License; see LICENSE file for more
+# details.
+
+"""MEF link cache tests."""
+
+from __future__ import absolute_import, print_function
+
+import os
+import re
+
+from invenio_chamo_harvester import mef
+from invenio_chamo_harvester.mef import MISSING, MefLinkCache, \
+    mef_link_from_hit, resolve_person_links
+
+
+def test_mef_cache_memory():
+    """Test in-memory tier with hits, misses and LRU eviction."""
+    cache = MefLinkCache(size=2)
+    assert cache.get('1') is MISSING
+    cache.set('1', 'https://mef.rero.ch/api/idref/1')
+    cache.set('2', None)
+    assert cache.get('1') == 'https://mef.rero.ch/api/idref/1'
+    assert cache.get('2') is None
+    cache.set('3', 'https://mef.rero.ch/api/gnd/3')
+    # '1' is the least recently used entry
+    assert cache.get('1') is MISSING
+    assert cache.get('2') is None
+
+
+def test_mef_cache_persistent(tmpdir):
+    """Test persistent tier and time to live."""
+    path = os.path.join(str(tmpdir), 'mef.db')
+    cache = MefLinkCache(path=path)
+    cache.set_many({'1': 'https://mef.rero.ch/api/rero/1', '2': None})
+
+    other = MefLinkCache(path=path)
+    assert other.get('1') == 'https://mef.rero.ch/api/rero/1'
+    assert other.get('2') is None
+
+    expired = MefLinkCache(path=path, ttl=-1, miss_ttl=-1)
+    expired.set('3', None)
+    assert MefLinkCache(path=path).get('3') is MISSING
+
+
+def test_mef_link_from_hit():
+    """Test MEF link building."""
+    url = 'https://mef.rero.ch/api/'
+    hit = {'metadata': {'gnd': {'pid': '12'}, 'rero': {'pid': 'A1'}}}
+    assert mef_link_from_hit(hit, url) == 'https://mef.rero.ch/api/gnd/12'
+    assert mef_link_from_hit({'metadata': {}}, url) is None
+
+
+class Response(object):
+    """Response of the MEF API."""
+
+    def __init__(self, data, status_code=200):
+        """Initialize response."""
+        self.data = data
+        self.status_code = status_code
+
+    def json(self):
+        """Response data."""
+        return self.data
+
+
+def test_resolve_person_links(monkeypatch):
+    """Test batched MEF lookups of hits, misses and failed requests."""
+    urls = []
+
+    def get(url):
+        urls.append(url)
+        pids = re.search(r'viaf_pid:\((.*)\)', url).group(1).split(' OR ')
+        if '5' in pids:
+            return Response({}, 500)
+        hits = [{'metadata': {'viaf_pid': pid, 'idref': {'pid': 'i' + pid}}}
+                for pid in pids if pid in ('1', '3')]
+        return Response({'hits': {'hits': hits}})
+
+    monkeypatch.setattr(mef.requests, 'get', get)
+    cache = MefLinkCache()
+    cache.set('4', 'https://mef.rero.ch/api/gnd/4')
+
+    assert resolve_person_links(['1', '2', '3', '4', '5', 1], cache,
+                                batch_size=2) == 2
+    # one OR query per batch, cached pids are not requested
+    assert urls == [
+        'https://mef.test.rero.ch/api/mef/?q=viaf_pid:(1 OR 2)&size=2',
+        'https://mef.test.rero.ch/api/mef/?q=viaf_pid:(3 OR 5)&size=2'
+    ]
+    # hits are stored with the MEF link host
+    assert cache.get('1') == 'https://mef.rero.ch/api/idref/i1'
+    # a pid without hit in a successful request is a cached miss
+    assert cache.get('2') is None
+    # the pids of a failed request stay unknown
+    assert cache.get('3') is MISSING
+    assert cache.get('5') is MISSING
+    assert cache.get('4') == 'https://mef.rero.ch/api/gnd/4'
+
+    del urls[:]
+    assert resolve_person_links(['1', '2', '4'], cache) == 0
+    assert urls == []
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2019 UCLouvain.
+#
+# Invenio-Chamo-Harvester is free software; you can redistribute it and/or
+# modify it under the terms of the MIT License; see LICENSE file for more
+# details.
+
+"""Conversion rules profiling tests."""
+
+from __future__ import absolute_import, print_function
+
+import time
+
+import pytest
+from dojson.errors import IgnoreKey
+
+from invenio_chamo_harvester.dojson.utils import ProfiledIndex, RuleProfiler
+
+
+def marc21_to_title(output, key, value):
+    """Slow rule."""
+    time.sleep(0.01)
+    return value
+
+
+def marc21_to_note(output, key, value):
+    """Rule ignoring or failing on some values."""
+    if value == 'ignored':
+        raise IgnoreKey(key)
+    if value == 'bad':
+        raise ValueError(value)
+    return value
+
+
+class Index(object):
+    """Rules index."""
+
+    rules = {'245': marc21_to_title, '500': marc21_to_note}
+
+    def query(self, key):
+        """Get the rule matching a key."""
+        creator = self.rules.get(key[:3])
+        return (creator.__name__, creator) if creator else None
+
+
+def test_rule_profiler():
+    """Test the calls, time and errors counted for each rule and tag."""
+    profiler = RuleProfiler()
+    index = ProfiledIndex(Index(), profiler)
+    assert index.query('999__') is None
+    name, title = index.query('245__')
+    assert name == 'marc21_to_title'
+    assert index.query('24500')[1] is title
+
+    assert title({}, '245__', 'a') == 'a'
+    assert title({}, '24500', 'b') == 'b'
+    note = index.query('500__')[1]
+    assert note({}, '500__', 'c') == 'c'
+    with pytest.raises(IgnoreKey):
+        note({}, '500__', 'ignored')
+    with pytest.raises(ValueError):
+        note({}, '500__', 'bad')
+    profiler.add_record(0.5)
+
+    calls, total, errors = profiler.rules['marc21_to_title']
+    assert (calls, errors) == (2, 0)
+    assert total >= 0.02
+    calls, total, errors = profiler.rules['marc21_to_note']
+    assert (calls, errors) == (3, 1)
+    assert total < profiler.rules['marc21_to_title'][1]
+    assert profiler.tags['245'][0] == 2
+    assert profiler.tags['500'][0] == 3
+    assert (profiler.records, profiler.total_time) == (1, 0.5)
+
+    report = profiler.report(limit=1).splitlines()
+    assert report[0] == '1 records converted in 0.500s'
+    assert report[2].startswith('marc21_to_title ')
+    assert report[4].startswith('245 ')
+    assert len(report) == 5
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2019 UCLouvain.
+#
+# Invenio-Chamo-Harvester is free software; you can redistribute it and/or
+# modify it under the terms of the MIT License; see LICENSE file for more
+# details.
+
+"""Cached validators tests."""
+
+from __future__ import absolute_import, print_function
+
+from jsonschema import Draft4Validator
+
+from invenio_chamo_harvester import schemas
+from invenio_chamo_harvester.schemas import CachedValidator, \
+    ValidatedBatch, validate_batch
+
+SCHEMA = {
+    '$schema': 'http://json-schema.org/draft-04/schema#',
+    'type': 'object',
+    'required': ['pid'],
+    'properties': {'pid': {'type': 'string'}}
+}
+
+
+def test_cached_validators(monkeypatch):
+    """Test the validation with the compiled validators."""
+    monkeypatch.setattr(schemas, 'get_validator',
+                        lambda url: Draft4Validator(SCHEMA))
+    url = 'https://ils.rero.ch/schemas/documents/document-v0.0.1.json'
+    errors = validate_batch([
+        {'$schema': url, 'pid': '1'},
+        {'$schema': url, 'pid': 1}
+    ])
+    assert errors[0] is None
+    assert errors[1].validator == 'type'
+
+    validator = CachedValidator({'$ref': url})
+    assert not list(validator.iter_errors({'pid': '1'}))
+    assert list(validator.iter_errors({}))
+    assert not list(ValidatedBatch({'$ref': url}).iter_errors({}))
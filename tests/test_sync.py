@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2019 UCLouvain.
+#
+# Invenio-Chamo-Harvester is free software; you can redistribute it and/or
+# modify it under the terms of the MIT License; see LICENSE file for more
+# details.
+
+"""Holdings and items synchronization tests."""
+
+from __future__ import absolute_import, print_function
+
+from contextlib import contextmanager
+
+from invenio_chamo_harvester import sync
+from invenio_chamo_harvester.sync import HoldingsItemsSync, \
+    delete_documents, has_changed, item_key, record_key
+
+
+def test_record_key():
+    """Test the key of RERO ILS holdings."""
+    holding = {
+        'pid': '1',
+        'location': {'$ref': 'https://ils.test/api/locations/1'},
+        'circulation_category': {'$ref': 'https://ils.test/api/item_types/2'}
+    }
+    assert record_key(holding) == ('https://ils.test/api/locations/1',
+                                   'https://ils.test/api/item_types/2')
+
+
+def test_has_changed():
+    """Test the comparison of records with harvested data."""
+    item = {'pid': '1', 'barcode': '123', 'status': 'on_loan',
+            'call_number': 'A 1'}
+    assert not has_changed(item, {'barcode': '123', 'call_number': 'A 1'})
+    assert has_changed(item, {'barcode': '123', 'call_number': 'A 2'})
+
+
+def test_item_key():
+    """Test the key of items without barcode."""
+    assert item_key({'pid': '1', 'barcode': '123'}) == '123'
+    assert item_key({'pid': '1'}) != item_key({'pid': '2'})
+    assert item_key({'pid': 1, 'barcode': ''}) == item_key({'pid': 1})
+
+
+class Provider(object):
+    """Persistent identifier provider of fake records."""
+
+    def __init__(self, pid_type):
+        """Initialize provider."""
+        self.pid_type = pid_type
+
+
+class FakeRecord(dict):
+    """RERO ILS record recording its creations, updates and deletions."""
+
+    pid_type = None
+    log = []
+
+    def __init__(self, data):
+        """Initialize record."""
+        super(FakeRecord, self).__init__(data)
+        self.id = '{type}-{pid}'.format(type=self.pid_type,
+                                        pid=data.get('pid'))
+        self.provider = Provider(self.pid_type)
+        self.reasons = {}
+
+    @classmethod
+    def create(cls, data, **kwargs):
+        """Create a record."""
+        cls.log.append(('create', cls.pid_type))
+        return cls(dict(data, pid='new'))
+
+    def replace(self, data, **kwargs):
+        """Replace a record."""
+        self.log.append(('replace', self.pid_type, self.get('pid')))
+        return type(self)(data)
+
+    def reasons_not_to_delete(self):
+        """Reasons not to delete the record."""
+        return self.reasons
+
+    def delete(self, **kwargs):
+        """Delete a record."""
+        self.log.append(('delete', self.pid_type, self.get('pid')))
+
+
+class FakeDocument(FakeRecord):
+    """Document."""
+
+    pid_type = 'doc'
+
+
+class FakeHolding(FakeRecord):
+    """Holding."""
+
+    pid_type = 'hold'
+
+
+class FakeItem(FakeRecord):
+    """Item."""
+
+    pid_type = 'item'
+
+
+def test_sync_mapped_holdings(appctx, monkeypatch):
+    """Test holdings whose Chamo codes are mapped to the same RERO ones."""
+    keys = {}
+    monkeypatch.setattr(sync, 'schema_url', lambda path: path)
+    monkeypatch.setattr(sync, 'Holding', FakeHolding)
+    monkeypatch.setattr(sync, 'Item', FakeItem)
+    monkeypatch.setattr(sync, 'current_record_to_index',
+                        lambda record: ('index', record.pid_type))
+    monkeypatch.setattr(sync.ChamoHoldingKey, 'get_keys', classmethod(
+        lambda cls, pids: {pid: keys[pid] for pid in pids if pid in keys}))
+    monkeypatch.setattr(sync.ChamoHoldingKey, 'set_keys', classmethod(
+        lambda cls, new_keys: keys.update(new_keys)))
+    monkeypatch.setattr(sync.ChamoHoldingKey, 'delete_keys', classmethod(
+        lambda cls, pids: [keys.pop(pid, None) for pid in pids]))
+    del FakeRecord.log[:]
+    # both are mapped to location 5 and item type 2
+    holdings = [{'location': 200000, 'circulation_category': 101},
+                {'location': 200002, 'circulation_category': 2}]
+    items = [{'pid': '10', 'barcode': 'A10', 'location': 200000,
+              'item_type': 101},
+             {'pid': '11', 'barcode': 'A11', 'location': 200002,
+              'item_type': 2}]
+
+    holdings_items_sync = HoldingsItemsSync()
+    document_ref = holdings_items_sync.document_ref('1')
+    stored = {'hold': [], 'item': []}
+    for pid, holding in zip(('1', '2'), holdings):
+        stored['hold'].append(FakeHolding(dict(sync.build_holding(
+            holding, document_ref, sync.HOLDING_SCHEMA), pid=pid)))
+        keys[pid] = '{location}#{circulation_category}'.format(**holding)
+    for holding_pid, item in zip(('1', '2'), items):
+        data = sync.build_item(item, document_ref, sync.ITEM_SCHEMA)
+        data['holding'] = {'$ref': holdings_items_sync.url_api.format(
+            doc_type='holdings', pid=holding_pid)}
+        stored['item'].append(FakeItem(data))
+    assert record_key(stored['hold'][0]) == \
+        record_key(stored['hold'][1])
+    monkeypatch.setattr(
+        sync, 'get_records_by_document_refs',
+        lambda record_cls, pid_type, refs: {document_ref: list(
+            stored[pid_type])})
+
+    holdings_items_sync.prefetch(['1'])
+    changes = holdings_items_sync.sync('1', holdings, items)
+    assert changes == {'hold': [], 'item': [], 'records': [], 'deleted': 0,
+                       'unindex': []}
+    assert FakeRecord.log == []
+    assert keys == {'1': '200000#101', '2': '200002#2'}
+
+    # holdings harvested before their key was stored
+    keys.clear()
+    holdings_items_sync.prefetch(['1'])
+    changes = holdings_items_sync.sync('1', holdings, items)
+    assert changes['deleted'] == 0
+    assert FakeRecord.log == []
+    assert keys == {'1': '200000#101', '2': '200002#2'}
+
+    # a holding removed from Chamo is deleted
+    holdings_items_sync.prefetch(['1'])
+    changes = holdings_items_sync.sync('1', holdings[1:], items[1:])
+    assert FakeRecord.log == [('delete', 'item', '10'),
+                              ('delete', 'hold', '1')]
+    assert keys == {'2': '200002#2'}
+
+
+class Session(object):
+    """Database session."""
+
+    @contextmanager
+    def begin_nested(self):
+        """Savepoint."""
+        yield
+
+
+def test_delete_documents(appctx, monkeypatch):
+    """Test that a document with a loaned item is not deleted."""
+    documents = {'1': FakeDocument({'pid': '1'}),
+                 '2': FakeDocument({'pid': '2'})}
+    # the links of a document to its holdings and items are deleted too
+    documents['1'].reasons = {'links': {'items': 1}}
+    linked = {
+        '1': {'hold': [FakeHolding({'pid': '10'})],
+              'item': [FakeItem({'pid': '100'})]},
+        '2': {'hold': [FakeHolding({'pid': '20'})],
+              'item': [FakeItem({'pid': '200'})]}
+    }
+    linked['2']['item'][0].reasons = {'links': {'loans': 1}}
+    deleted_keys = []
+    monkeypatch.setattr(sync.db, 'session', Session())
+    monkeypatch.setattr(sync, 'current_record_to_index',
+                        lambda record: ('index', record.pid_type))
+    monkeypatch.setattr(
+        sync, 'get_records_by_pids',
+        lambda record_cls, pid_type, pids: {
+            pid: documents[pid] for pid in pids if pid in documents})
+    monkeypatch.setattr(
+        sync, 'get_records_by_document_refs',
+        lambda record_cls, pid_type, refs: {
+            ref: linked[ref.split('/')[-1]][pid_type] for ref in refs})
+    monkeypatch.setattr(sync.ChamoHoldingKey, 'delete_keys', classmethod(
+        lambda cls, pids: deleted_keys.extend(pids)))
+    del FakeRecord.log[:]
+
+    n_deleted, kept, entries = delete_documents(['1', '2', '3'])
+    assert (n_deleted, kept) == (1, ['2'])
+    assert FakeRecord.log == [('delete', 'item', '100'),
+                              ('delete', 'hold', '10'),
+                              ('delete', 'doc', '1')]
+    assert entries == [('index', 'item', 'item-100'),
+                       ('index', 'hold', 'hold-10'),
+                       ('index', 'doc', 'doc-1')]
+    assert deleted_keys == ['10']
+    assert delete_documents(['3']) == (0, [], [])
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2019 UCLouvain.
+#
+# Invenio-Chamo-Harvester is free software; you can redistribute it and/or
+# modify it under the terms of the MIT License; see LICENSE file for more
+# details.
+
+"""Harvesting tasks tests."""
+
+from __future__ import absolute_import, print_function
+
+import pytest
+
+from invenio_chamo_harvester import tasks
+from invenio_chamo_harvester.errors import ChamoApiError, \
+    TooManyDeletionsError
+
+
+class Savepoint(object):
+    """Database savepoint."""
+
+    def __init__(self, session):
+        """Initialize savepoint."""
+        self.session = session
+
+    def commit(self):
+        """Release savepoint."""
+        self.session.savepoints.append('commit')
+
+    def rollback(self):
+        """Roll back to savepoint."""
+        self.session.savepoints.append('rollback')
+
+
+class Session(object):
+    """Database session."""
+
+    def __init__(self):
+        """Initialize session."""
+        self.savepoints = []
+        self.commits = 0
+
+    def begin_nested(self):
+        """Start a savepoint."""
+        return Savepoint(self)
+
+    def add(self, model):
+        """Add a model."""
+
+    def commit(self):
+        """Commit transaction."""
+        self.commits += 1
+
+
+class FakeRecord(dict):
+    """Record written through the record API."""
+
+    @classmethod
+    def create(cls, data, dbcommit=False, reindex=False, validator=None):
+        """Create a record."""
+        if data.get('location') == {'$ref': 'locations/0'}:
+            raise ValueError('unknown location')
+        record = cls(data)
+        if 'pid' not in record:
+            # holding minted with the pid of its document
+            record['pid'] = 'hold-{pid}'.format(
+                pid=data['document']['$ref'].split('/')[-1])
+        record.id = 'uuid-{pid}'.format(pid=record['pid'])
+        return record
+
+
+class Response(object):
+    """Response of the Chamo Rest API."""
+
+    def __init__(self, data, status_code=200):
+        """Initialize response."""
+        self.data = data
+        self.status_code = status_code
+
+    def raise_for_status(self):
+        """Raise on HTTP errors."""
+        if self.status_code >= 400:
+            raise IOError('HTTP {code}'.format(code=self.status_code))
+
+    def json(self):
+        """Response data."""
+        return self.data
+
+
+def test_chamo_bib_pages(appctx, monkeypatch):
+    """Test the guards of the listing of the Chamo bibs."""
+    pages = {
+        'first': {'links': ['x/bib/1', 'x/bib/2'], 'next': 'second'},
+        'second': {'links': ['x/bib/3']}
+    }
+    monkeypatch.setattr(
+        tasks.requests, 'get',
+        lambda uri, auth: Response(pages['second' if uri == 'second'
+                                         else 'first']))
+    assert list(tasks.chamo_bib_pages()) == [['1', '2'], ['3']]
+
+    pages['second'] = {'error': 'timeout'}
+    with pytest.raises(ChamoApiError):
+        list(tasks.chamo_bib_pages())
+
+    monkeypatch.setattr(tasks.requests, 'get',
+                        lambda uri, auth: Response({}, 500))
+    with pytest.raises(IOError):
+        list(tasks.chamo_bib_pages())
+    # the queueing task reports the failure with the first page url
+    assert tasks.queue_records_to_harvest(size=10, next_id='5') == (
+        0, 'http://localhost:8080/rest/bibs?all=true&batchSize=10&next=5',
+        [])
+
+
+def test_queue_records_to_delete(appctx, monkeypatch):
+    """Test the maximum ratio of deleted records."""
+    queued = []
+    monkeypatch.setattr(tasks, 'chamo_bib_pages',
+                        lambda size: iter([['1', '2', '3']]))
+    monkeypatch.setattr(tasks.ChamoRecordDigest, 'get_bib_ids',
+                        lambda: iter(['1', '2', '3', '4']))
+    monkeypatch.setattr(tasks.ChamoRecordHarvester, 'bulk_to_delete',
+                        lambda self, records: queued.extend(records))
+    with pytest.raises(TooManyDeletionsError):
+        tasks.queue_records_to_delete(max_ratio=0.1)
+    assert not queued
+    assert tasks.queue_records_to_delete(max_ratio=0.25) == 1
+    assert queued == ['4']
+
+
+def test_bulk_records_rejected(appctx, monkeypatch):
+    """Test that a failing record only rolls back its own savepoint."""
+    session = Session()
+    written = {}
+    monkeypatch.setattr(tasks.db, 'session', session)
+    monkeypatch.setattr(tasks, 'schema_url', lambda path: path)
+    monkeypatch.setattr(tasks, 'Document', FakeRecord)
+    monkeypatch.setattr(tasks, 'Holding', FakeRecord)
+    monkeypatch.setattr(tasks, 'DocumentIdentifier', dict)
+    monkeypatch.setattr(tasks, 'map_item_type', lambda code: 'item_types/1')
+    monkeypatch.setattr(tasks, 'map_locations',
+                        lambda code: 'locations/{code}'.format(code=code))
+    monkeypatch.setattr(tasks.ChamoHoldingKey, 'set_keys',
+                        classmethod(lambda cls, keys: None))
+    monkeypatch.setattr(tasks.ChamoRecordDigest, 'set_digests',
+                        classmethod(lambda cls, digests: written.update(
+                            digests=dict(digests))))
+
+    def indexing_entries(indexing_worker, holding_ids, item_ids,
+                         record_ids, loader=None, records=None):
+        written.update(holding_ids=list(holding_ids),
+                       record_ids=list(record_ids))
+
+    monkeypatch.setattr(tasks, 'indexing_entries', indexing_entries)
+    actions = [{
+        '_op_type': 'harvest',
+        '_id': bib_id,
+        'digest': 'digest-{id}'.format(id=bib_id),
+        'document': {'pid': bib_id, 'type': 'book', 'title': [],
+                     'language': []},
+        'holdings': [{'location': location, 'circulation_category': 1}],
+        'items': []
+    } for bib_id, location in (('1', 1), ('2', 0), ('3', 1))]
+
+    assert tasks.bulk_records(iter(actions), {
+        'initial_load': True, 'bulk_index': False,
+        'resync_sequences': False}) == 2
+    # the holding of the second record fails after its document is written
+    assert session.savepoints == ['commit', 'rollback', 'commit']
+    assert session.commits == 1
+    assert written == {
+        'digests': {'1': 'digest-1', '3': 'digest-3'},
+        'holding_ids': ['uuid-hold-1', 'uuid-hold-3'],
+        'record_ids': ['uuid-1', 'uuid-3']
+    }
+    assert [action.get('rejected') for action in actions] == [
+        None, True, None]
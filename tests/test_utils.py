@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2019 UCLouvain.
+#
+# Invenio-Chamo-Harvester is free software; you can redistribute it and/or
+# modify it under the terms of the MIT License; see LICENSE file for more
+# details.
+
+"""Utility functions tests."""
+
+from __future__ import absolute_import, print_function
+
+from invenio_chamo_harvester.utils import FlushPolicy, canonical_json, \
+    has_items, index_items
+
+
+def test_index_items():
+    """Test the association of items with holdings."""
+    items = [
+        {'barcode': '1', 'location': 100000, 'item_type': 1},
+        {'barcode': '2', 'location': 100000, 'item_type': 1},
+        {'barcode': '3', 'location': 200002, 'item_type': 4}
+    ]
+    index = index_items(items)
+    assert [item['barcode'] for item in index[('100000', '1')]] == ['1', '2']
+    assert has_items(
+        {'location': '200002', 'circulation_category': '4'}, index)
+    assert not has_items(
+        {'location': '200002', 'circulation_category': '1'}, index)
+
+
+def test_canonical_json():
+    """Test the canonical serialization of records."""
+    assert canonical_json({'pid': '1', 'title': ('a', 'b')}) == \
+        canonical_json({'title': ['a', 'b'], 'pid': '1'})
+    assert canonical_json({'pid': '1'}) != canonical_json({'pid': 1})
+
+
+def test_flush_policy():
+    """Test the record count and size limits of the flush policy."""
+    policy = FlushPolicy(max_records=3, max_bytes=100)
+    assert not policy.due()
+    policy.add(10)
+    policy.add(10)
+    assert not policy.due()
+    policy.add(10)
+    assert policy.due()
+    policy.reset()
+    assert not policy.due()
+    policy.add(200)
+    assert policy.due()
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2019 UCLouvain.
+#
+# Invenio-Chamo-Harvester is free software; you can redistribute it and/or
+# modify it under the terms of the MIT License; see LICENSE file for more
+# details.
+
+"""Conversion warnings tests."""
+
+from __future__ import absolute_import, print_function
+
+from invenio_chamo_harvester.dojson.utils import ConversionWarnings
+
+
+def test_conversion_warnings(tmpdir):
+    """Test buffering, counts and flush of the conversion warnings."""
+    path = str(tmpdir.join('warnings.log'))
+    warnings = ConversionWarnings(path=path, buffer_size=3)
+    warnings.warn('WARNING ISSUANCE', 337, 'rdami:1001', 'article')
+    warnings.warn('WARNING CONTRIBUTION ROLE SCE', 337, None, 'sce --> aus')
+    assert not tmpdir.join('warnings.log').exists()
+    warnings.warn('WARNING CONTRIBUTION ROLE SCE', 348, None, 'sce --> aus')
+    assert tmpdir.join('warnings.log').read().splitlines() == [
+        'WARNING ISSUANCE: 337 rdami:1001 article',
+        'WARNING CONTRIBUTION ROLE SCE: 337 None sce --> aus',
+        'WARNING CONTRIBUTION ROLE SCE: 348 None sce --> aus'
+    ]
+    warnings.warn('ERROR BAD FIELD FORMAT', 71123, None, 'missing $a')
+    warnings.flush()
+    assert len(tmpdir.join('warnings.log').read().splitlines()) == 4
+    assert warnings.summary() == '\n'.join([
+        'ERROR BAD FIELD FORMAT: 1',
+        'WARNING CONTRIBUTION ROLE SCE: 2',
+        'WARNING ISSUANCE: 1'
+    ])
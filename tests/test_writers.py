@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2019 UCLouvain.
+#
+# Invenio-Chamo-Harvester is free software; you can redistribute it and/or
+# modify it under the terms of the MIT License; see LICENSE file for more
+# details.
+
+"""Writer pool tests."""
+
+from __future__ import absolute_import, print_function
+
+from invenio_chamo_harvester import api, tasks, writers
+from invenio_chamo_harvester.writers import Writer, partition
+
+
+def test_partition():
+    """Test the partition of the bulk actions across writers."""
+    actions = [{'_id': str(bibid)} for bibid in range(1000)]
+    writers = [partition(action, 4) for action in actions]
+    assert set(writers) == {0, 1, 2, 3}
+    # the actions of a record always go to the same writer
+    assert writers == [partition(action, 4) for action in actions]
+    assert partition({'_id': '12'}, 4) == partition({'_id': 12}, 4)
+    assert all(partition(action, 1) == 0 for action in actions)
+
+
+class Session(object):
+    """Database session."""
+
+    def remove(self):
+        """Close session."""
+
+
+def test_failing_writer(base_app, monkeypatch):
+    """Test that a failing writer queues its uncommitted records again."""
+    queued = {}
+
+    def bulk_records(actions, bulk_kwargs):
+        for idx, action in enumerate(actions):
+            if idx == 1:
+                # first action committed
+                bulk_kwargs['on_commit'](1)
+            if idx == 3:
+                raise IOError('database is gone')
+        return idx
+
+    monkeypatch.setattr(tasks, 'bulk_records', bulk_records)
+    monkeypatch.setattr(writers.db, 'session', Session())
+    for op in ('harvest', 'delete'):
+        monkeypatch.setattr(
+            api.ChamoRecordHarvester, 'bulk_to_{op}'.format(op=op),
+            lambda self, ids, op=op: queued.setdefault(op, []).extend(ids))
+
+    writer = Writer(base_app, {}, maxsize=2)
+    writer.start()
+    for bib_id, op in (('1', 'harvest'), ('2', 'delete'), ('3', 'harvest'),
+                       ('4', 'harvest'), ('5', 'harvest'), ('6', 'delete')):
+        writer.submit({'_op_type': op, '_id': bib_id})
+    writer.close()
+    assert writer.failed
+    assert queued == {'harvest': ['3', '4', '5'], 'delete': ['2', '6']}
+    assert writer.taken == []